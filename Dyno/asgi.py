@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Serve the project through this entry point (e.g. ``uvicorn Dyno.asgi:application``)
+to get live order tracking: /orders/events/ then stays open as a Server-Sent Events
+stream. Under WSGI the same URL degrades to a short poll.
 """
 
 import os
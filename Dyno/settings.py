@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # First so its counts include session/auth queries made by the middleware below
+    "accounts.querystats.QueryStatsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -90,6 +92,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The home listing cache and its catalog version counter live here. Use a shared backend
+# (Redis/Memcached) when running several workers so a version bump reaches all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dyno-default',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -132,6 +147,26 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Worker processes that generate resized/WebP copies of uploaded food images
+FOOD_IMAGE_WORKERS = 2
+
+# Fan-out for live order tracking (accounts.tracking). The in-process broker only reaches
+# streams served by the same process; point this at a shared broker when running several workers.
+ORDER_EVENTS_BROKER = 'accounts.tracking.InProcessBroker'
+
+# 'sync' writes orders inside the request. 'queue' only appends them to OrderIngest and lets
+# `manage.py flush_order_ingest --interval 2` write them in batches, which keeps checkout fast
+# at peak hours. Above ORDER_INGEST_MAX_PENDING queued orders, requests write synchronously again.
+ORDER_INGEST_MODE = 'sync'
+ORDER_INGEST_MAX_PENDING = 5000
+
+# Order statuses move on in `manage.py advance_order_status --interval 30`. Without that job,
+# leave this True so the orders pages and the tracking stream's heartbeats advance them.
+ORDER_STATUS_ON_REQUEST = True
+
+# Trained order price model (train_order_ai writes it, accounts.model_registry loads it)
+ORDER_MODEL_PATH = os.path.join(BASE_DIR, 'order_predictor_model.pkl')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
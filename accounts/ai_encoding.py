@@ -0,0 +1,211 @@
+# ai_encoding.py
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+# Model inputs, in order: (source column, encoded feature column). Quantity goes in as is.
+CATEGORICAL_FEATURES = [('username', 'user_encoded'), ('city', 'city_encoded'), ('item_name', 'item_encoded')]
+FEATURE_COLUMNS = [feature for _, feature in CATEGORICAL_FEATURES] + ['quantity']
+TARGET_COLUMN = 'price'
+# Encoders of models trained before vocabularies, by source column
+LEGACY_ENCODER_KEYS = {'username': 'user_encoder', 'city': 'city_encoder', 'item_name': 'item_encoder'}
+# Bump when the features or the saved training state change: older models are then rebuilt in full
+TRAINING_STATE_VERSION = 1
+# Incremental training lets a vocabulary grow to VOCABULARY_HEADROOM times its size at the last
+# full rebuild (and at least MIN_VOCABULARY_LIMIT values); past that it rebuilds in full, which
+# drops values no longer in any order (renamed foods, deleted users).
+VOCABULARY_HEADROOM = 2
+MIN_VOCABULARY_LIMIT = 10_000
+
+
+class Vocabulary:
+    """
+    Value -> index mapping for one categorical column, applied to whole columns at once.
+    Values not seen in training map to `unknown_index`; models trained by fit_price_model
+    reserve index 0 for them and number the known values from 1.
+    """
+    UNKNOWN = 0
+
+    def __init__(self, values, offset=1, unknown_index=UNKNOWN):
+        self.values = list(values)
+        self.offset = offset
+        self.index = {value: i + offset for i, value in enumerate(self.values)}
+        self.unknown_index = unknown_index
+
+    @classmethod
+    def from_label_encoder(cls, encoder):
+        """Vocabulary of an older LabelEncoder model: codes from 0, unknown values coded 0 as before."""
+        return cls(encoder.classes_, offset=0, unknown_index=0)
+
+    def __len__(self):
+        return len(self.values)
+
+    def copy(self):
+        return Vocabulary(self.values, offset=self.offset, unknown_index=self.unknown_index)
+
+    def extend(self, values):
+        """Append values not seen yet. Append-only: the index of every known value stays the same."""
+        for value in values:
+            if value not in self.index:
+                self.index[value] = self.offset + len(self.values)
+                self.values.append(value)
+
+    def encode(self, column):
+        """Encode a pandas Series in one pass; returns (codes as int64 array, mask of unknown values)."""
+        codes = column.map(self.index)
+        unknown = codes.isna().to_numpy()
+        return codes.fillna(self.unknown_index).to_numpy(dtype=np.int64), unknown
+
+
+def vocabularies(bundle):
+    """{source column: Vocabulary} for a model bundle of either format."""
+    if 'vocabularies' in bundle:
+        return bundle['vocabularies']
+    return {column: Vocabulary.from_label_encoder(bundle[key]) for column, key in LEGACY_ENCODER_KEYS.items()}
+
+
+def encode_features(df, vocabs):
+    """
+    Feature frame (FEATURE_COLUMNS) for the rows of `df`, plus a boolean array marking rows
+    with at least one value outside the vocabularies. Column-wise: no per-row Python calls.
+    """
+    features = {}
+    unknown = np.zeros(len(df), dtype=bool)
+    for column, feature in CATEGORICAL_FEATURES:
+        features[feature], missing = vocabs[column].encode(df[column])
+        unknown |= missing
+    features['quantity'] = df['quantity'].to_numpy(dtype=np.float64)
+    return pd.DataFrame(features, columns=FEATURE_COLUMNS, index=df.index), unknown
+
+
+def clean_training_rows(df):
+    if df.empty:
+        return df
+    return df.dropna(subset=[column for column, _ in CATEGORICAL_FEATURES] + ['quantity', TARGET_COLUMN])
+
+
+class LinearStats:
+    """
+    Sufficient statistics for least squares: row count, feature/target means and centered
+    cross-products, merged chunk by chunk (Chan et al.), so the fit over all rows seen so far
+    can be solved without seeing those rows again. solve() gives the same coefficients as
+    LinearRegression().fit() on all the rows at once.
+    """
+
+    def __init__(self, n_features):
+        self.n = 0
+        self.mean_x = np.zeros(n_features)
+        self.mean_y = 0.0
+        self.cxx = np.zeros((n_features, n_features))
+        self.cxy = np.zeros(n_features)
+
+    def copy(self):
+        other = LinearStats(len(self.mean_x))
+        other.n, other.mean_y = self.n, self.mean_y
+        other.mean_x, other.cxx, other.cxy = self.mean_x.copy(), self.cxx.copy(), self.cxy.copy()
+        return other
+
+    def add(self, X, y):
+        """Fold in the rows of a feature matrix X and target vector y."""
+        n = len(y)
+        if not n:
+            return
+        mean_x, mean_y = X.mean(axis=0), y.mean()
+        Xc, yc = X - mean_x, y - mean_y
+        total = self.n + n
+        dx, dy = mean_x - self.mean_x, mean_y - self.mean_y
+        weight = self.n * n / total
+        self.cxx += Xc.T @ Xc + weight * np.outer(dx, dx)
+        self.cxy += Xc.T @ yc + weight * dx * dy
+        self.mean_x += dx * n / total
+        self.mean_y += dy * n / total
+        self.n = total
+
+    def solve(self):
+        """A fitted LinearRegression over FEATURE_COLUMNS (minimum-norm solution if rank-deficient)."""
+        coef = np.linalg.lstsq(self.cxx, self.cxy, rcond=None)[0]
+        model = LinearRegression()
+        model.coef_ = coef
+        model.intercept_ = float(self.mean_y - self.mean_x @ coef)
+        model.n_features_in_ = len(coef)
+        model.feature_names_in_ = np.asarray(FEATURE_COLUMNS, dtype=object)
+        return model
+
+
+def full_rebuild_reason(bundle):
+    """Why `bundle` cannot be trained further incrementally, or None if it can."""
+    if bundle is None:
+        return "no model yet"
+    state = bundle.get('training')
+    if state is None:
+        return "model has no incremental training state"
+    if state['version'] != TRAINING_STATE_VERSION or bundle.get('features') != FEATURE_COLUMNS:
+        return "feature schema changed"
+    for column, _ in CATEGORICAL_FEATURES:
+        if len(bundle['vocabularies'][column]) > state['vocabulary_limits'][column]:
+            return f"{column} vocabulary overflow"
+    return None
+
+
+class PriceModelTrainer:
+    """
+    Trains the price model from get_order_data() rows fed in id order, a chunk at a time.
+    Started from a bundle it carries on from that bundle's watermark (the last OrderLine id it
+    saw), extending copies of its vocabularies and statistics, so the result is the exact
+    least-squares fit over old and new rows; started from None it is a full rebuild.
+    The bundle passed in is never modified.
+    """
+
+    def __init__(self, bundle=None):
+        self.full = bundle is None
+        if self.full:
+            self.vocabularies = {column: Vocabulary([]) for column, _ in CATEGORICAL_FEATURES}
+            self.stats = LinearStats(len(FEATURE_COLUMNS))
+            self.watermark = 0
+            self.vocabulary_limits = None
+        else:
+            state = bundle['training']
+            self.vocabularies = {column: vocab.copy() for column, vocab in bundle['vocabularies'].items()}
+            self.stats = state['stats'].copy()
+            self.watermark = state['watermark']
+            self.vocabulary_limits = state['vocabulary_limits']
+        self.rows = 0
+
+    def add(self, df):
+        """Fold in a chunk of rows with ids above the watermark."""
+        if df.empty:
+            return
+        self.watermark = max(self.watermark, int(df['id'].max()))
+        df = clean_training_rows(df)
+        for column, _ in CATEGORICAL_FEATURES:
+            self.vocabularies[column].extend(df[column].unique())
+        X, _ = encode_features(df, self.vocabularies)
+        self.stats.add(X.to_numpy(), df[TARGET_COLUMN].to_numpy(dtype=np.float64))
+        self.rows += len(df)
+
+    def bundle(self):
+        """The model bundle to save, with its training state; None if no rows were ever added."""
+        if not self.stats.n:
+            return None
+        limits = self.vocabulary_limits
+        if self.full:
+            limits = {column: max(MIN_VOCABULARY_LIMIT, VOCABULARY_HEADROOM * len(vocab))
+                      for column, vocab in self.vocabularies.items()}
+        return {
+            'model': self.stats.solve(),
+            'vocabularies': self.vocabularies,
+            'features': FEATURE_COLUMNS,
+            'training': {
+                'version': TRAINING_STATE_VERSION,
+                'watermark': self.watermark,
+                'stats': self.stats,
+                'vocabulary_limits': limits,
+            },
+        }
+
+
+def fit_price_model(df):
+    """Fit the price model on get_order_data() rows from scratch; returns the bundle to save, or None without data."""
+    trainer = PriceModelTrainer()
+    trainer.add(df)
+    return trainer.bundle()
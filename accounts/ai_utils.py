@@ -1,131 +1,176 @@
 # ai_utils.py
 import pandas as pd
-import pickle
-import os
-from django.conf import settings
-from accounts.models import Order,FoodItem
-from django.db.models import Count
-
-MODEL_PATH = os.path.join(settings.BASE_DIR, 'order_predictor_model.pkl')
+from accounts.models import CityFoodCount, CityOrderCount, OrderLine, FoodItem, UserOrderCount
+from accounts.rollups import ALL_CITIES, city_key
+from accounts.ai_encoding import PriceModelTrainer, encode_features, full_rebuild_reason, vocabularies
+from accounts.model_registry import registry
+from django.db.models import F, Max, OuterRef, Subquery
 
 def state_food_stats():
-    # group by city + food
-    raw_data = (
-        Order.objects.values("city", "food_item__name")
-        .annotate(total=Count("id"))
-        .order_by("city", "-total")
+    """
+    Top food per city, {city: {"food", "orders"}}, from the rollups: one query over
+    CityOrderCount with an indexed lookup into CityFoodCount per city.
+    """
+    top = (
+        CityFoodCount.objects.filter(city=OuterRef("city"), order_count__gt=0)
+        .order_by("-order_count", "food_item_id")
     )
-
-    # pick top food per city
-    city_food = {}
-    for row in raw_data:
-        city = row["city"] or "Unknown"
-        food = row["food_item__name"]
-        orders = row["total"]
-
-        if city not in city_food:  # first (largest) row per city
-            city_food[city] = {"food": food, "orders": orders}
-
-    return city_food
+    cities = (
+        CityOrderCount.objects.exclude(city=ALL_CITIES).filter(order_count__gt=0)
+        .annotate(food=Subquery(top.values("food_item__name")[:1]), orders=Subquery(top.values("order_count")[:1]))
+        .order_by("city")
+    )
+    return {
+        city.label or "Unknown": {"food": city.food, "orders": city.orders}
+        for city in cities if city.food is not None
+    }
 
 def suggest_top_food_for_state(state_name: str, limit: int = 5):
     """
     Suggest the top food items for a given state (city/state stored in Order.city).
     Returns Food objects (with images, price, etc.) instead of just names.
     Falls back to global top foods if no orders exist for that state.
+    Reads the materialized CityFoodCount rollup, so each lookup is one indexed range scan.
     """
-    # First fetch IDs as a list (MySQL-safe)
-    top_food_ids = list(
-        Order.objects.filter(city__iexact=state_name)
-        .values("food_item")  
-        .annotate(count=Count("food_item"))
-        .order_by("-count")
-        .values_list("food_item", flat=True)[:limit]
+    top_foods = _top_foods(city_key(state_name), limit)
+    if top_foods:
+        return top_foods
+
+    # Fallback → global top foods
+    return _top_foods(ALL_CITIES, limit)
+
+
+def _top_foods(key, limit):
+    return list(
+        FoodItem.objects.filter(city_counts__city=key, city_counts__order_count__gt=0)
+        .order_by("-city_counts__order_count", "id")[:limit]
     )
 
-    if top_food_ids:
-        return FoodItem.objects.filter(id__in=top_food_ids)
 
-    # Fallback → global top foods
-    global_top_food_ids = list(
-        Order.objects.values("food_item")
-        .annotate(count=Count("food_item"))
-        .order_by("-count")
-        .values_list("food_item", flat=True)[:limit]
+# Rows per query and per model.predict() call when scoring many orders
+PREDICT_CHUNK_SIZE = 50000
+
+
+def get_order_data(lines=None):
+    """
+    One row per ordered item (OrderLine), with its order's user and city and the food name.
+    `lines` narrows it to an OrderLine queryset (filtered, ordered or sliced).
+    """
+    lines = OrderLine.objects.all() if lines is None else lines
+    rows = lines.values(
+        "id", "order_id", "quantity",
+        username=F("order__user__username"), city=F("order__city"),
+        item_name=F("food_item__name"), price=F("unit_price"),
     )
+    return pd.DataFrame(list(rows))
 
-    return FoodItem.objects.filter(id__in=global_top_food_ids)
 
+def iter_order_data(chunk_size=PREDICT_CHUNK_SIZE, after_id=0):
+    """get_order_data() in id order, `chunk_size` rows per query (keyset on id), so memory stays flat."""
+    while True:
+        df = get_order_data(OrderLine.objects.filter(id__gt=after_id).order_by("id")[:chunk_size])
+        if df.empty:
+            return
+        yield df
+        after_id = int(df["id"].iloc[-1])
 
-def get_order_data():
-    orders = Order.objects.all().values("id", "user__username", "city", "item_name", "quantity", "price")
-    return pd.DataFrame(list(orders))
 
+def train_price_model(full=False, chunk_size=PREDICT_CHUNK_SIZE):
+    """
+    Bring the price model up to date; returns (bundle to save or None if nothing changed, summary).
+
+    Incrementally by default: only order lines past the current model's watermark are read,
+    so the cost follows the number of new lines, not the whole history. A full rebuild
+    happens with full=True, without a usable model (none yet, older format, changed
+    features), when a vocabulary outgrows its limit, or when the watermark is past the
+    newest line (the table was reset). Lines edited or deleted below the watermark, or
+    committed late with a lower id, are only picked up by a full rebuild.
+    """
+    data = None if full else registry.get()
+    bundle = data.bundle if data is not None else None
+    reason = "requested" if full else full_rebuild_reason(bundle)
+    if reason is None:
+        newest = OrderLine.objects.aggregate(newest=Max("id"))["newest"] or 0
+        if bundle["training"]["watermark"] > newest:
+            reason = "order lines were removed past the watermark"
+
+    trainer = PriceModelTrainer(None if reason else bundle)
+    for df in iter_order_data(chunk_size, after_id=trainer.watermark):
+        trainer.add(df)
+    new_bundle = trainer.bundle()
+    if reason is None:
+        reason = full_rebuild_reason(new_bundle)  # new values pushed a vocabulary past its limit
+        if reason is not None:
+            trainer = PriceModelTrainer()
+            for df in iter_order_data(chunk_size):
+                trainer.add(df)
+            new_bundle = trainer.bundle()
+
+    summary = {"mode": "full" if trainer.full else "incremental", "reason": reason,
+               "rows": trainer.rows, "watermark": trainer.watermark}
+    if not trainer.full and not trainer.rows:
+        new_bundle = None  # nothing new; keep the saved model (and its version) as it is
+    return new_bundle, summary
+
+
+def predict_prices(df, bundle):
+    """
+    get_order_data()-shaped rows plus `predicted_price` and `unknown` (some value was not in
+    the training vocabularies). Encodes whole columns and calls model.predict() once.
+    """
+    X, unknown = encode_features(df, vocabularies(bundle))
+    return df.assign(predicted_price=bundle["model"].predict(X), unknown=unknown)
 
-def get_ai_predictions(limit: int = 10):
+
+def score_orders(chunk_size=PREDICT_CHUNK_SIZE):
     """
-    Load trained model + encoders and generate predictions for recent orders.
-    Returns a list of dicts with actual vs predicted price.
+    Predicted prices for every order line, yielded as one DataFrame per chunk. The model is
+    taken once, so a model swapped in mid-run does not mix versions. Yields nothing without a model.
     """
-    if not os.path.exists(MODEL_PATH):
-        return []
+    data = registry.get()
+    if data is None:
+        return
+    for df in iter_order_data(chunk_size):
+        yield predict_prices(df, data.bundle)
 
-    with open(MODEL_PATH, "rb") as f:
-        data = pickle.load(f)
 
-    model = data['model']
-    user_encoder = data['user_encoder']
-    city_encoder = data['city_encoder']
-    item_encoder = data['item_encoder']
+def get_ai_predictions(limit: int = 10):
+    """
+    Predicted vs actual price for the `limit` most recent ordered items.
+    Returns a list of dicts; empty when no model has been trained yet.
+    """
+    data = registry.get()  # unpickled once per process, reloaded when the file changes
+    if data is None:
+        return []
 
-    df = get_order_data().sort_values("id", ascending=False).head(limit)  # last N orders
+    df = get_order_data(OrderLine.objects.order_by("-id")[:limit])  # last N ordered items
     if df.empty:
         return []
 
-    # Encode with same encoders
-    df['user_encoded'] = df['user__username'].map(
-        lambda x: user_encoder.transform([x])[0] if x in user_encoder.classes_ else 0
-    )
-    df['city_encoded'] = df['city'].map(
-        lambda x: city_encoder.transform([x])[0] if x in city_encoder.classes_ else 0
-    )
-    df['item_encoded'] = df['item_name'].map(
-        lambda x: item_encoder.transform([x])[0] if x in item_encoder.classes_ else 0
-    )
-
-    X = df[['user_encoded', 'city_encoded', 'item_encoded', 'quantity']]
-    df['predicted_price'] = model.predict(X)
-
-    return df[['id', 'user__username', 'city', 'item_name', 'quantity', 'price', 'predicted_price']].to_dict(orient="records")
+    df = predict_prices(df, data.bundle)
+    return df[['order_id', 'username', 'city', 'item_name', 'quantity', 'price', 'predicted_price']].to_dict(orient="records")
 
 
 def overall_stats():
     """
-    Existing stats + AI predictions
+    Existing stats + AI predictions. Counts come from the rollup tables (accounts.rollups),
+    so the cost follows the number of cities, not the number of orders.
     """
-    from django.db.models import Count
-    from django.contrib.auth.models import User
-
     # Orders by city
-    state_orders = (
-        Order.objects.values('city').annotate(count=Count('id')).order_by('-count')
-    )
-    orders_by_state_labels = [s['city'] or 'Unknown' for s in state_orders]
-    orders_by_state_counts = [s['count'] for s in state_orders]
+    state_orders = CityOrderCount.objects.exclude(city=ALL_CITIES).filter(order_count__gt=0).order_by("-order_count")
+    orders_by_state_labels = [s.label or 'Unknown' for s in state_orders]
+    orders_by_state_counts = [s.order_count for s in state_orders]
     most_ordered_state = orders_by_state_labels[0] if orders_by_state_labels else 'N/A'
 
     # Top users
-    user_orders = (
-        Order.objects.values('user__username')
-        .annotate(count=Count('id')).order_by('-count')[:5]
-    )
-    top_users = [(u['user__username'], u['count']) for u in user_orders]
+    user_orders = UserOrderCount.objects.filter(order_count__gt=0).select_related('user').order_by('-order_count')[:5]
+    top_users = [(u.user.username, u.order_count) for u in user_orders]
 
-    total_orders = Order.objects.count()
-    total_users = User.objects.filter(order__isnull=False).distinct().count()
+    total = CityOrderCount.objects.filter(city=ALL_CITIES).values_list('order_count', flat=True).first()
+    total_orders = total or 0
+    total_users = UserOrderCount.objects.filter(order_count__gt=0).count()
 
     # Food stats per city
-    from .ai_utils import state_food_stats
     city_food = state_food_stats()
 
     # AI predictions
@@ -0,0 +1,124 @@
+# analytics.py
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from .models import BucketGranularity, CityOrderBucket, CityOrderCount, FoodItem, FoodOrderBucket
+from .rollups import ALL_CITIES, bucket_start
+
+RANGE_PRESETS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+    '90d': timedelta(days=90),
+}
+DEFAULT_RANGE = '7d'
+# Ranges up to this long default to hourly buckets, longer ones to daily
+HOURLY_DEFAULT_SPAN = timedelta(days=2)
+# Caps an hourly series at 31 * 24 buckets
+MAX_HOURLY_SPAN = timedelta(days=31)
+TOP_FOODS = 5
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"'{name}' must be a date like 2024-01-31") from None
+
+
+def parse_range(params):
+    """
+    (start, end, granularity) from request parameters: either range=24h|7d|30d|90d or
+    from=YYYY-MM-DD&to=YYYY-MM-DD (whole days in TIME_ZONE, `to` included), plus an optional
+    granularity=hour|day. `start` is floored to its bucket; `end` is exclusive.
+    Raises ValueError with a message fit for the user on bad input.
+    """
+    if params.get('from') or params.get('to'):
+        today = timezone.localdate()
+        first = _parse_date(params['from'], 'from') if params.get('from') else today
+        last = _parse_date(params['to'], 'to') if params.get('to') else today
+        if last < first:
+            raise ValueError("'to' is before 'from'")
+        tz = timezone.get_current_timezone()
+        start = timezone.make_aware(datetime.combine(first, time.min), tz)
+        end = timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min), tz)
+    else:
+        preset = params.get('range') or DEFAULT_RANGE
+        if preset not in RANGE_PRESETS:
+            raise ValueError(f"'range' must be one of {', '.join(RANGE_PRESETS)}")
+        end = timezone.now()
+        start = end - RANGE_PRESETS[preset]
+
+    granularity = params.get('granularity') or (
+        BucketGranularity.HOUR if end - start <= HOURLY_DEFAULT_SPAN else BucketGranularity.DAY
+    )
+    if granularity not in BucketGranularity.values:
+        raise ValueError(f"'granularity' must be one of {', '.join(BucketGranularity.values)}")
+    if granularity == BucketGranularity.HOUR and end - start > MAX_HOURLY_SPAN:
+        raise ValueError(f"Hourly buckets are limited to {MAX_HOURLY_SPAN.days} days; use granularity=day")
+    return bucket_start(start, granularity), end, granularity
+
+
+def _bucket_starts(start, end, granularity):
+    """Every bucket start in [start, end), stepping in UTC so DST changes do not skip or repeat buckets."""
+    # 26 hours always lands inside the next day, whether the day has 23, 24 or 25 hours
+    step = timedelta(hours=1) if granularity == BucketGranularity.HOUR else timedelta(hours=26)
+    starts, current = [], start
+    while current < end:
+        starts.append(current)
+        current = bucket_start(current.astimezone(dt_timezone.utc) + step, granularity)
+    return starts
+
+
+def _slots(starts):
+    """
+    bucket start -> index in `starts`. Rows stored under another TIME_ZONE have starts off
+    this grid (e.g. on the half hour); they are counted in the bucket they fall inside.
+    """
+    position = {bucket: i for i, bucket in enumerate(starts)}
+
+    def slot(bucket):
+        index = position.get(bucket)
+        return bisect_right(starts, bucket) - 1 if index is None else index
+    return slot
+
+
+def order_series(start, end, granularity, top_foods=TOP_FOODS):
+    """
+    Order volume in [start, end) per bucket: in total, per city and for the `top_foods` most
+    ordered foods. Reads only the buckets in range (accounts.rollups), never Order itself.
+    """
+    starts = _bucket_starts(start, end, granularity)
+    slot = _slots(starts)
+
+    city_series = defaultdict(lambda: [0] * len(starts))
+    city_rows = CityOrderBucket.objects.filter(granularity=granularity, start__gte=start, start__lt=end)
+    for bucket, city, count in city_rows.values_list('start', 'city', 'order_count'):
+        city_series[city][slot(bucket)] += count
+    total = city_series.pop(ALL_CITIES, [0] * len(starts))
+    labels = dict(CityOrderCount.objects.filter(city__in=list(city_series)).values_list('city', 'label'))
+
+    food_series = defaultdict(lambda: [0] * len(starts))
+    food_rows = FoodOrderBucket.objects.filter(granularity=granularity, start__gte=start, start__lt=end)
+    for bucket, food_id, count in food_rows.values_list('start', 'food_item_id', 'order_count'):
+        food_series[food_id][slot(bucket)] += count
+    top = sorted(food_series, key=lambda food_id: (-sum(food_series[food_id]), food_id))[:top_foods]
+    names = dict(FoodItem.objects.filter(id__in=top).values_list('id', 'name'))
+
+    cities = [
+        {'city': labels.get(city) or city or 'Unknown', 'total': sum(counts), 'counts': counts}
+        for city, counts in city_series.items()
+    ]
+    return {
+        'granularity': granularity,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'buckets': [bucket.isoformat() for bucket in starts],
+        'total': total,
+        'cities': sorted(cities, key=lambda row: (-row['total'], row['city'])),
+        'foods': [{'food': names.get(food_id, food_id), 'total': sum(food_series[food_id]),
+                   'counts': food_series[food_id]} for food_id in top],
+    }
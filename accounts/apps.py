@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        # Connect model signal receivers that keep derived data in sync.
+        from . import cart, catalog_cache, images, ratings, rollups, search  # noqa: F401
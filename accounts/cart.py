@@ -0,0 +1,189 @@
+# cart.py
+from decimal import Decimal
+
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.dispatch import receiver
+
+from .catalog_cache import catalog_version
+from .models import CartItem, FoodItem
+
+# Anonymous visitors keep {"<food_id>": {"name": ..., "quantity": n}} here until they sign in.
+SESSION_CART_KEY = 'cart'
+
+# Prices are cached per catalog version, so any FoodItem change invalidates them at once;
+# the timeout only bounds how long an unused entry lingers.
+PRICE_CACHE_TIMEOUT = 60
+
+
+class CartLine:
+    """One priced cart line. `food` is only loaded by price_cart(fresh=True)."""
+
+    def __init__(self, food_id, name, price, image, quantity, food=None):
+        self.id = food_id
+        self.name = name
+        self.price = price
+        self.image = image
+        self.quantity = quantity
+        self.food = food
+
+    @property
+    def total(self):
+        return self.price * self.quantity
+
+
+class PricedCart:
+    """Priced lines of a cart plus the lines that could not be priced, as (food_id, reason)."""
+
+    def __init__(self, lines, rejected):
+        self.lines = lines
+        self.rejected = rejected
+
+    @property
+    def total(self):
+        return sum((line.total for line in self.lines), Decimal('0.00'))
+
+    def line(self, food_id):
+        return next((line for line in self.lines if line.id == food_id), None)
+
+
+def parse_cart(cart):
+    """
+    Turn a cart mapping ({food_id: quantity}, or the session form {"<food_id>": {"quantity": n}})
+    into ({food_id: quantity}, rejected).
+    """
+    quantities, rejected = {}, []
+    for food_id_str, item in cart.items():
+        quantity = item.get('quantity') if isinstance(item, dict) else item
+        try:
+            food_id, quantity = int(food_id_str), int(quantity)
+        except (TypeError, ValueError):
+            rejected.append((food_id_str, "invalid cart line"))
+            continue
+        if quantity < 1:
+            rejected.append((food_id, "quantity must be at least 1"))
+            continue
+        quantities[food_id] = quantity
+    return quantities, rejected
+
+
+def _price_key(version, food_id):
+    return f"cart:price:{version}:{food_id}"
+
+
+def _cached_prices(food_ids):
+    """{food_id: {'name', 'price', 'image'}} from the price cache, filling misses with one query."""
+    version = catalog_version()
+    keys = {_price_key(version, food_id): food_id for food_id in food_ids}
+    prices = {keys[key]: entry for key, entry in cache.get_many(list(keys)).items()}
+
+    missing = [food_id for food_id in food_ids if food_id not in prices]
+    if missing:
+        fetched = {}
+        for food in FoodItem.objects.filter(id__in=missing).only('id', 'name', 'price', 'image'):
+            prices[food.id] = fetched[_price_key(version, food.id)] = {
+                'name': food.name,
+                'price': food.price,
+                'image': food.image.url if food.image else '',
+            }
+        cache.set_many(fetched, PRICE_CACHE_TIMEOUT)
+    return prices
+
+
+def price_cart(cart, fresh=False):
+    """
+    Price every cart line in Decimal from the current catalog with at most one query.
+    Display paths read through the price cache; fresh=True (checkout) skips it and
+    attaches the FoodItem to each line.
+    """
+    quantities, rejected = parse_cart(cart)
+    if fresh:
+        foods = FoodItem.objects.in_bulk(list(quantities))
+        prices = {food_id: {'name': food.name, 'price': food.price,
+                            'image': food.image.url if food.image else '', 'food': food}
+                  for food_id, food in foods.items()}
+    else:
+        prices = _cached_prices(list(quantities))
+
+    lines = []
+    for food_id, quantity in quantities.items():
+        entry = prices.get(food_id)
+        if entry is None:
+            rejected.append((food_id, "no longer on the menu"))
+            continue
+        lines.append(CartLine(food_id, entry['name'], entry['price'], entry['image'], quantity, entry.get('food')))
+    return PricedCart(lines, rejected)
+
+
+def cart_quantities(user):
+    """{food_id: quantity} for the user's stored cart, in one indexed query."""
+    return dict(CartItem.objects.filter(user=user).values_list('food_item_id', 'quantity'))
+
+
+def add_item(user, food_id, quantity=1):
+    """Upsert `quantity` onto the user's cart line: one UPDATE, or one INSERT the first time."""
+    if CartItem.objects.filter(user=user, food_item_id=food_id).update(quantity=F('quantity') + quantity):
+        return
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(user=user, food_item_id=food_id, quantity=quantity)
+    except IntegrityError:
+        # Added from another tab or device at the same moment
+        CartItem.objects.filter(user=user, food_item_id=food_id).update(quantity=F('quantity') + quantity)
+
+
+def change_quantity(user, food_id, delta):
+    """Add `delta` to a cart line without letting it drop below 1. Returns False if nothing changed."""
+    lines = CartItem.objects.filter(user=user, food_item_id=food_id)
+    if delta < 0:
+        lines = lines.filter(quantity__gt=-delta)
+    return bool(lines.update(quantity=F('quantity') + delta))
+
+
+def remove_item(user, food_id):
+    CartItem.objects.filter(user=user, food_item_id=food_id).delete()
+
+
+def lock_cart(user):
+    """
+    ({food_id: quantity}, line ids) for the user's stored cart, with its rows locked until the
+    surrounding transaction ends. Must be called inside transaction.atomic().
+    """
+    rows = CartItem.objects.select_for_update().filter(user=user).values_list('id', 'food_item_id', 'quantity')
+    quantities, line_ids = {}, []
+    for line_id, food_id, quantity in rows:
+        quantities[food_id] = quantity
+        line_ids.append(line_id)
+    return quantities, line_ids
+
+
+def remove_lines(line_ids):
+    CartItem.objects.filter(id__in=line_ids).delete()
+
+
+def add_to_session_cart(session, food):
+    """Anonymous add-to-cart; merged into the stored cart by merge_session_cart on login."""
+    cart = session.get(SESSION_CART_KEY, {})
+    line = cart.setdefault(str(food.id), {'name': food.name, 'quantity': 0})
+    line['quantity'] += 1
+    session[SESSION_CART_KEY] = cart
+
+
+@receiver(user_logged_in)
+def merge_session_cart(sender, request, user, **kwargs):
+    """
+    Fold the session cart (anonymous adds, or a cart from before carts were stored)
+    into the user's stored cart. Quantities add up, so carts from several devices combine.
+    """
+    if request is None or not hasattr(request, 'session'):
+        return
+    quantities, _ = parse_cart(request.session.pop(SESSION_CART_KEY, {}))
+    if not quantities:
+        return
+    existing = set(FoodItem.objects.filter(id__in=list(quantities)).values_list('id', flat=True))
+    with transaction.atomic():
+        for food_id, quantity in quantities.items():
+            if food_id in existing:
+                add_item(user, food_id, quantity)
@@ -0,0 +1,106 @@
+# catalog_cache.py
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .feed import SORT_KEYS
+from .models import Cuisine, FoodItem
+
+CATALOG_VERSION_KEY = 'catalog:version'
+# Upper bound on staleness if a bump is ever missed (e.g. queryset.update()).
+LISTING_CACHE_TIMEOUT = 300
+
+
+def catalog_version():
+    """
+    Current catalog version. Seeded from the clock so a cache flush never
+    brings back a version number that old fragments were stored under.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, int(time.time()), None)
+        version = cache.get(CATALOG_VERSION_KEY, 0)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached listing by moving to a new version."""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, int(time.time()), None)
+
+
+def listing_params(request, cursor=None):
+    """
+    The filter/sort inputs that decide the listing, normalized so equivalent
+    URLs (case, whitespace, unknown values, veg+nonveg) share one cache entry.
+    """
+    get = request.GET
+    veg, nonveg = bool(get.get('veg')), bool(get.get('nonveg'))
+    cuisine = get.get('cuisine', '')
+    sort = get.get('sort') or ''
+    return {
+        'q': ' '.join(get.get('q', '').lower().split()),
+        'cuisine': cuisine if cuisine in Cuisine.values else '',
+        'diet': 'veg' if veg and not nonveg else 'nonveg' if nonveg and not veg else '',
+        'tag': get.get('tag', '').strip().lower(),
+        'sort': sort if sort in SORT_KEYS else '',
+        'cursor': cursor or '',
+    }
+
+
+def listing_cache_key(params):
+    digest = hashlib.md5(urlencode(sorted(params.items())).encode()).hexdigest()
+    return f"catalog:listing:{catalog_version()}:{digest}"
+
+
+def cached_listing(request, cursor, build):
+    """
+    Return the listing for this request from cache, or call build(params) and cache its result.
+    `build` must derive the listing from `params` alone (the normalized inputs the key is made
+    of) and return something picklable that contains no per-user data.
+    """
+    params = listing_params(request, cursor)
+    key = listing_cache_key(params)
+    listing = cache.get(key)
+    if listing is None:
+        listing = build(params)
+        cache.set(key, listing, LISTING_CACHE_TIMEOUT)
+    return listing
+
+
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+def food_item_changed(sender, raw=False, **kwargs):
+    if not raw:
+        bump_catalog_version()
+
+
+def touch_food_items(ids):
+    """
+    Move updated_at forward for foods whose rendered detail changed without a save()
+    (tags, image derivatives), so food_detail_json's ETag changes with them.
+    """
+    FoodItem.objects.filter(id__in=list(ids)).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=FoodItem.tags.through)
+def food_item_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # After the clear there is no telling which foods the tag was on
+        instance._cleared_food_ids = list(instance.food_items.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        touch_food_items([instance.pk])
+    elif action == 'post_clear':
+        touch_food_items(getattr(instance, '_cleared_food_ids', []))
+    else:
+        touch_food_items(pk_set or [])
+    bump_catalog_version()
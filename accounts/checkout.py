@@ -0,0 +1,97 @@
+# checkout.py
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cart import lock_cart, price_cart, remove_lines
+from .history import record_orders
+from .models import Order, OrderLine
+from .rollups import record_lines
+from .tracking import publish_order_change
+
+DEFAULT_ADDRESS = "DYNO Default Address"
+DELIVERY_MINUTES = 30
+
+
+class CheckoutResult:
+    """
+    The Order (or queued OrderIngest) placed by checkout_cart, None if nothing was orderable,
+    and the refused lines, as (food_id, reason).
+    """
+
+    def __init__(self, order=None, rejected=()):
+        self.order = order
+        self.rejected = list(rejected)
+
+
+def _user_city(user):
+    profile = getattr(user, 'profile', None)
+    return profile.city if profile and profile.city else ''
+
+
+def new_order(user, items, address, payment_method, placed_at, city):
+    """Unsaved Order header for (food, quantity, unit_price) `items` placed at `placed_at`."""
+    return Order(
+        user=user,
+        address=address,
+        delivery_time=(placed_at + timedelta(minutes=DELIVERY_MINUTES)).time(),
+        payment_method=payment_method,
+        total_price=sum((unit_price * quantity for _, quantity, unit_price in items), Decimal('0.00')),
+        timestamp=placed_at,
+        estimated_delivery_minutes=DELIVERY_MINUTES,
+        delivery_due_at=placed_at + timedelta(minutes=DELIVERY_MINUTES),
+        city=city,
+    )
+
+
+def create_order(user, items, address=DEFAULT_ADDRESS, payment_method="Cash on Delivery"):
+    """
+    Write one Order with a line per (food, quantity, unit_price) in `items`: one INSERT for
+    the header, one bulk INSERT for the lines and one for its history entry, in a single transaction.
+    """
+    with transaction.atomic():
+        order = new_order(user, items, address, payment_method, placed_at=timezone.now(), city=_user_city(user))
+        order.save()
+        lines = [OrderLine(order=order, food_item=food, quantity=quantity, unit_price=unit_price)
+                 for food, quantity, unit_price in items]
+        OrderLine.objects.bulk_create(lines)
+        # bulk_create skips post_save, so feed the rollups and the history read model here
+        record_lines(lines)
+        record_orders([(order, lines)])
+        transaction.on_commit(lambda: publish_order_change([user.id]))
+    return order
+
+
+def submit_order(user, items, address=DEFAULT_ADDRESS, payment_method="Cash on Delivery"):
+    """
+    Place an order the way ORDER_INGEST_MODE asks: an Order written now, or in 'queue' mode an
+    OrderIngest (provisional order, written later by flush_order_ingest). Falls back to
+    writing the Order now while the queue is over ORDER_INGEST_MAX_PENDING.
+    """
+    from .ingest import enqueue_order, ingest_enabled  # ingest builds its Orders with new_order
+
+    if ingest_enabled():
+        entry = enqueue_order(user, items, address, payment_method, _user_city(user))
+        if entry is not None:
+            return entry
+    return create_order(user, items, address, payment_method)
+
+
+def checkout_cart(user):
+    """
+    Turn the user's cart into one order and empty the cart. All foods are priced with one
+    query (cart.price_cart) and the order is written in one transaction, so the cost no
+    longer grows with cart size and a failure leaves nothing half-placed.
+    The cart lines are read locked and only those lines are removed: a second checkout of
+    the same cart waits and then finds it empty, and items added meanwhile stay in the cart.
+    """
+    with transaction.atomic():
+        quantities, line_ids = lock_cart(user)
+        cart = price_cart(quantities, fresh=True)
+        result = CheckoutResult(rejected=cart.rejected)
+        if cart.lines:
+            result.order = submit_order(user, [(line.food, line.quantity, line.price) for line in cart.lines])
+        remove_lines(line_ids)
+    return result
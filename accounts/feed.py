@@ -0,0 +1,121 @@
+# feed.py
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+FEED_PAGE_SIZE = 12
+
+# Sort mode -> keyset ordering. The last key must be unique so cursors are stable.
+SORT_KEYS = {
+    'price_low': ['price', 'id'],
+    'price_high': ['-price', '-id'],
+    'rating': ['-rating_avg', '-rating_count', '-id'],
+}
+DEFAULT_KEYS = ['id']
+SEARCH_KEYS = ['search_rank', 'id']
+
+
+def order_for_feed(queryset, sort=None):
+    """
+    Apply the keyset ordering for `sort` to a FoodItem queryset.
+    Unsorted searches keep relevance order (the `search_rank` annotation from accounts.search).
+    """
+    if sort in SORT_KEYS:
+        keys = SORT_KEYS[sort]
+    elif 'search_rank' in queryset.query.annotations:
+        keys = SEARCH_KEYS
+    else:
+        keys = DEFAULT_KEYS
+    return queryset.order_by(*keys)
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=_json_default, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the key values stored in `cursor`, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _cursor_values(queryset, keys, values):
+    """
+    The cursor's values converted to the types of the ordering fields (or annotations), or
+    None if the cursor does not fit the ordering -- e.g. it was tampered with or belongs to
+    another sort. Never lets a bad value reach the query.
+    """
+    if values is None or len(values) != len(keys):
+        return None
+    converted = []
+    for key, value in zip(keys, values):
+        name = key.lstrip('-')
+        try:
+            if name in queryset.query.annotations:
+                field = queryset.query.annotations[name].output_field
+            else:
+                field = queryset.model._meta.get_field(name)
+            if isinstance(value, (list, dict)):
+                raise TypeError(f"Cursor value for {name} is not a scalar")
+            value = field.to_python(value)
+        except (FieldDoesNotExist, ValidationError, ValueError, TypeError):
+            return None
+        if value is None:  # keyset fields are non-null
+            return None
+        converted.append(value)
+    return converted
+
+
+def _keyset_filter(keys, values):
+    """
+    Build "row comes after `values`" for the ordering `keys`, i.e.
+    (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... with < for descending keys.
+    """
+    condition = Q()
+    for i, key in enumerate(keys):
+        field = key.lstrip('-')
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        step = Q(**{f"{field}__{lookup}": values[i]})
+        for prev_key, prev_value in zip(keys[:i], values[:i]):
+            step &= Q(**{prev_key.lstrip('-'): prev_value})
+        condition |= step
+    return condition
+
+
+def paginate(queryset, cursor=None, page_size=FEED_PAGE_SIZE):
+    """
+    Keyset-paginate an ordered queryset.
+    The queryset must be ordered by plain, non-null fields ending in a unique one
+    (see order_for_feed). Returns (items, next_cursor); next_cursor is None on the last page.
+    """
+    keys = [str(k) for k in queryset.query.order_by]
+    # A cursor that does not decode or fit the ordering starts over at the first page
+    values = _cursor_values(queryset, keys, decode_cursor(cursor))
+    if values is not None:
+        queryset = queryset.filter(_keyset_filter(keys, values))
+
+    items = list(queryset[:page_size + 1])
+    if len(items) <= page_size:
+        return items, None
+    items = items[:page_size]
+    last = items[-1]
+    return items, encode_cursor([getattr(last, key.lstrip('-')) for key in keys])
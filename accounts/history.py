@@ -0,0 +1,44 @@
+# history.py
+from django.db.models import Prefetch
+
+from .models import Order, OrderHistoryEntry, OrderLine
+
+REBUILD_CHUNK = 1000
+
+
+def history_entry(order, lines):
+    """Unsaved OrderHistoryEntry for `order` and its `lines` (OrderLines with food_item loaded)."""
+    first_food = lines[0].food_item if lines else None
+    return OrderHistoryEntry(
+        order=order,
+        user_id=order.user_id,
+        status=order.status,
+        placed_at=order.timestamp,
+        delivery_due_at=order.delivery_due_at,
+        delivered_at=order.delivered_at,
+        total_price=order.total_price or 0,
+        image=first_food.image.name if first_food and first_food.image else '',
+        lines=[{'name': line.food_item.name, 'quantity': line.quantity, 'unit_price': str(line.unit_price)}
+               for line in lines],
+    )
+
+
+def record_orders(orders_with_lines):
+    """Project freshly written orders, given as (order, lines) pairs, with one bulk INSERT."""
+    OrderHistoryEntry.objects.bulk_create([history_entry(order, lines) for order, lines in orders_with_lines])
+
+
+def rebuild():
+    """Recreate the read model from Order/OrderLine. Used by the rebuild_rollups command for repair."""
+    OrderHistoryEntry.objects.all().delete()
+    orders = Order.objects.order_by('id').prefetch_related(
+        Prefetch('lines', queryset=OrderLine.objects.select_related('food_item').order_by('id')),
+    )
+    count, last_id = 0, 0
+    while True:
+        chunk = list(orders.filter(id__gt=last_id)[:REBUILD_CHUNK])
+        if not chunk:
+            return {'order_history_entries': count}
+        record_orders((order, list(order.lines.all())) for order in chunk)
+        count += len(chunk)
+        last_id = chunk[-1].id
@@ -0,0 +1,156 @@
+# images.py
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .catalog_cache import bump_catalog_version, touch_food_items
+from .models import FoodItem
+
+logger = logging.getLogger(__name__)
+
+# Widths (px) generated for every food image, each as JPEG and WebP.
+DERIVATIVE_WIDTHS = (160, 320, 640)
+DERIVATIVE_FORMATS = {'jpg': ('JPEG', {'quality': 82, 'progressive': True, 'optimize': True}),
+                      'webp': ('WEBP', {'quality': 80, 'method': 4})}
+DERIVED_DIR = 'derived'
+
+_executor = None
+_executor_lock = threading.Lock()
+# Image name -> the job making its derivatives. Identical uploads share one content-addressed
+# name, so they share the job instead of rendering the same files twice at once.
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def derivative_name(name, width, ext):
+    """Storage name of the `width`px `ext` copy of `name`, e.g. derived/food_images/pizza_320w.webp."""
+    stem, _ = os.path.splitext(name)
+    return f"{DERIVED_DIR}/{stem}_{width}w.{ext}"
+
+
+def render_derivatives(media_root, name, force=False):
+    """
+    Write the resized JPEG/WebP copies of MEDIA_ROOT/`name`. Widths larger than the
+    original are skipped (never upscale). Runs in a worker process, so it only touches
+    the filesystem and Pillow. Returns the storage names written.
+    """
+    from PIL import Image, ImageOps
+
+    written = []
+    with Image.open(os.path.join(media_root, name)) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode != 'RGB':
+            source = source.convert('RGB')
+        for width in DERIVATIVE_WIDTHS:
+            if width > source.width:
+                continue
+            resized = None
+            for ext, (fmt, options) in DERIVATIVE_FORMATS.items():
+                target_name = derivative_name(name, width, ext)
+                target = os.path.join(media_root, target_name)
+                if not force and os.path.exists(target):
+                    continue
+                if resized is None:
+                    height = round(source.height * width / source.width)
+                    resized = source.resize((width, height), Image.LANCZOS)
+                directory = os.path.dirname(target)
+                os.makedirs(directory, exist_ok=True)
+                # Write to a temporary file of our own, then rename, so a request never sees a
+                # half-written file and two jobs for the same image never write into one file
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix=f'.{ext}.part')
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        resized.save(f, fmt, **options)
+                    os.chmod(tmp_path, 0o644)  # mkstemp creates it private
+                    os.replace(tmp_path, target)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+                written.append(target_name)
+    return written
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=getattr(settings, 'FOOD_IMAGE_WORKERS', 2))
+        return _executor
+
+
+def _derivatives_done(name, scheduled_on, future):
+    with _pending_lock:
+        _pending.pop(name, None)
+    try:
+        written = future.result()
+    except Exception:
+        logger.exception("Generating image derivatives failed")
+        return
+    if not written:
+        return
+    # A job that was already done when scheduled calls back on the scheduling (request) thread,
+    # whose connection belongs to the request. Only the pool's own thread manages its connection.
+    own_thread = threading.get_ident() != scheduled_on
+    if own_thread:
+        close_old_connections()
+    try:
+        # Cached listings and food_detail_json copies (ETag from updated_at) were made
+        # without these files; let them pick up the srcset
+        touch_food_items(FoodItem.objects.filter(image=name).values_list('id', flat=True))
+        bump_catalog_version()
+    finally:
+        if own_thread:
+            close_old_connections()
+
+
+def schedule_derivatives(name):
+    """Generate derivatives for `name` in the background process pool, once at a time per name."""
+    global _executor
+    with _pending_lock:
+        future = _pending.get(name)
+        if future is not None:
+            return future
+        try:
+            future = _get_executor().submit(render_derivatives, settings.MEDIA_ROOT, name)
+        except (BrokenProcessPool, RuntimeError):
+            with _executor_lock:
+                _executor = None
+            logger.warning("Image worker pool unavailable; derivatives for %s will be made by the backfill command",
+                           name)
+            return None
+        _pending[name] = future
+    # Outside the lock: a job that is already done runs the callback right here
+    future.add_done_callback(partial(_derivatives_done, name, threading.get_ident()))
+    return future
+
+
+def existing_derivatives(image, ext):
+    """(url, width) pairs of derivatives of `image` already on disk, smallest first."""
+    if not image or not image.name:
+        return []
+    storage = image.storage
+    return [
+        (storage.url(derivative_name(image.name, width, ext)), width)
+        for width in DERIVATIVE_WIDTHS
+        if storage.exists(derivative_name(image.name, width, ext))
+    ]
+
+
+@receiver(post_save, sender=FoodItem)
+def food_item_saved(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    name = instance.image.name
+    smallest = derivative_name(name, DERIVATIVE_WIDTHS[0], 'webp')
+    if not instance.image.storage.exists(smallest):
+        # Wait for commit so the worker never races an upload that gets rolled back
+        transaction.on_commit(lambda: schedule_derivatives(name))
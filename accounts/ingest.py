@@ -0,0 +1,150 @@
+# ingest.py
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Q, Value, When
+from django.utils import timezone
+
+from . import history, rollups
+from .checkout import new_order
+from .models import FoodItem, OrderIngest, OrderLine
+from .tracking import publish_order_change
+
+INGEST_MODE_SYNC = 'sync'
+INGEST_MODE_QUEUE = 'queue'
+
+FLUSH_BATCH_SIZE = 500
+# A flush run that has not finished its claim within this long is presumed dead and its
+# entries are claimed again; its own late commit is then refused (see flush()).
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+class StaleClaim(Exception):
+    """Another flush run took over the batch; this run's writes are rolled back."""
+
+
+def ingest_enabled():
+    return getattr(settings, 'ORDER_INGEST_MODE', INGEST_MODE_SYNC) == INGEST_MODE_QUEUE
+
+
+def pending():
+    return OrderIngest.objects.filter(order__isnull=True, error='')
+
+
+def queue_full():
+    """
+    Backpressure: True once ORDER_INGEST_MAX_PENDING entries wait. Probes for a row at that
+    offset (LIMIT 1 OFFSET n-1) instead of counting, and may be off by entries claimed meanwhile.
+    """
+    limit = getattr(settings, 'ORDER_INGEST_MAX_PENDING', 5000)
+    return pending()[limit - 1:limit].exists()
+
+
+def enqueue_order(user, items, address, payment_method, city):
+    """
+    Append an order to the ingest queue with a single INSERT and return the OrderIngest,
+    or None when the queue is full and the caller should write the order itself.
+    """
+    if queue_full():
+        return None
+    entry = OrderIngest.objects.create(user=user, payload={
+        'items': [{'food': food.id, 'quantity': quantity, 'unit_price': str(unit_price)}
+                  for food, quantity, unit_price in items],
+        'address': address,
+        'payment_method': payment_method,
+        'city': city,
+    })
+    transaction.on_commit(lambda: publish_order_change([user.id]))
+    return entry
+
+
+def pending_for_user(user):
+    """The user's queued orders, newest first, with `lines` resolved for display (two queries)."""
+    entries = list(pending().filter(user=user).order_by('-id'))
+    foods = FoodItem.objects.in_bulk({item['food'] for entry in entries for item in entry.payload['items']})
+    for entry in entries:
+        entry.lines = [
+            OrderLine(food_item=foods[item['food']], quantity=item['quantity'],
+                      unit_price=Decimal(item['unit_price']))
+            for item in entry.payload['items'] if item['food'] in foods
+        ]
+    return entries
+
+
+def _claimable(now):
+    return pending().filter(Q(batch__isnull=True) | Q(claimed_at__lt=now - CLAIM_TIMEOUT))
+
+
+def flush(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Turn up to `batch_size` queued entries into Orders; returns {'written': n, 'rejected': n}.
+
+    1. Claim: one conditional UPDATE stamps the oldest claimable entries with a fresh token,
+       so concurrent runs never pick the same entries (and crashed runs' claims expire).
+    2. Write: in one transaction, an INSERT per Order header (its post_save rollup update
+       deferred), one bulk INSERT for all lines, the rollups and history entries once for the
+       whole batch, and one UPDATE linking every entry to its Order -- guarded on the token
+       and on `order` still being empty. If that UPDATE does not match every entry, another
+       run took over a stale claim and the whole transaction is rolled back.
+
+    Entries and Orders are linked in the transaction that creates the Orders, and `order` is
+    unique, so each entry is materialized exactly once however often a flush crashes or runs.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    ids = list(_claimable(now).order_by('id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return {'written': 0, 'rejected': 0}
+    _claimable(now).filter(id__in=ids).update(batch=token, claimed_at=now)
+    entries = list(pending().filter(batch=token).select_related('user').order_by('id'))
+    foods = FoodItem.objects.in_bulk({item['food'] for entry in entries for item in entry.payload['items']})
+
+    orders, lines, written, rejected = {}, [], [], []
+    with transaction.atomic():
+        for entry in entries:
+            items = [(foods[item['food']], item['quantity'], Decimal(item['unit_price']))
+                     for item in entry.payload['items'] if item['food'] in foods]
+            if not items:
+                rejected.append(entry.id)
+                continue
+            order = new_order(entry.user, items, entry.payload['address'], entry.payload['payment_method'],
+                              placed_at=entry.created_at, city=entry.payload['city'])
+            order.rollups_deferred = True  # counted below, with the whole batch
+            order.save()
+            orders[entry.id] = order
+            order_lines = [OrderLine(order=order, food_item=food, quantity=quantity, unit_price=unit_price)
+                           for food, quantity, unit_price in items]
+            lines += order_lines
+            written.append((order, order_lines))
+        OrderLine.objects.bulk_create(lines)
+        rollups.record_orders(list(orders.values()))
+        rollups.record_lines(lines)
+        history.record_orders(written)
+
+        claimed = OrderIngest.objects.filter(batch=token, order__isnull=True)
+        if orders:
+            linked = claimed.filter(id__in=list(orders)).update(
+                order_id=Case(*[When(id=entry_id, then=Value(order.id)) for entry_id, order in orders.items()]),
+            )
+            if linked != len(orders):
+                raise StaleClaim(f"flush {token} lost {len(orders) - linked} of its entries to another run")
+        if rejected:
+            claimed.filter(id__in=rejected).update(error="none of the items are on the menu any more")
+        user_ids = [entry.user_id for entry in entries]
+        transaction.on_commit(lambda: publish_order_change(user_ids))
+    return {'written': len(orders), 'rejected': len(rejected)}
+
+
+def flush_all(batch_size=FLUSH_BATCH_SIZE):
+    """Flush until the queue is empty; returns the summed counts."""
+    totals = {'written': 0, 'rejected': 0}
+    while True:
+        counts = flush(batch_size)
+        if not any(counts.values()):
+            return totals
+        for key, value in counts.items():
+            totals[key] += value
+
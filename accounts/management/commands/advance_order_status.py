@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.delivery import advance_orders
+
+
+class Command(BaseCommand):
+    help = 'Advances orders through placed -> dispatched -> delivered. Run from cron, or with --interval as a worker.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running, advancing every N seconds (default: run once).')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            counts = advance_orders()
+            if counts['dispatched'] or counts['delivered'] or not interval:
+                self.stdout.write(f"✅ Dispatched {counts['dispatched']}, delivered {counts['delivered']} orders.")
+            if not interval:
+                return
+            time.sleep(interval)
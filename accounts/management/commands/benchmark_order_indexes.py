@@ -0,0 +1,163 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from accounts import history
+from accounts.models import ACTIVE_ORDER_STATUSES, FoodItem, Order, OrderHistoryEntry, OrderLine, OrderStatus
+
+# Indexes behind the queries that run per request or per job tick (migrations 0022, 0023
+# and 0025), dropped for the "before" run. Staff statistics read the rollup tables instead.
+BENCHMARKED_INDEXES = [
+    (Order, 'order_user_status_time_idx'),
+    (Order, 'order_user_time_idx'),
+    (Order, 'order_status_due_idx'),
+    (OrderLine, 'orderline_food_order_idx'),
+    (OrderHistoryEntry, 'orderhistory_user_idx'),
+]
+# The "before" baseline: what the foreign keys alone give us. MySQL also needs these to
+# exist before an index backing a foreign key can be dropped.
+BASELINE_INDEXES = [
+    (Order, models.Index(fields=['user'], name='bench_order_user_idx')),
+    (OrderLine, models.Index(fields=['food_item'], name='bench_orderline_food_idx')),
+    (OrderHistoryEntry, models.Index(fields=['user'], name='bench_history_user_idx')),
+]
+CITIES = ['Raipur', 'Bhopal', 'Chennai', 'Delhi', 'Mathura', 'Mumbai', 'Kolkata', 'Hyderabad', 'Pune', 'Bangalore']
+
+
+class Command(BaseCommand):
+    help = ('Seeds a throwaway test database with a large order table and reports timings and '
+            'EXPLAIN plans of the hot order queries without and with the composite indexes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=20000, help='Orders to seed (default 20000).')
+        parser.add_argument('--users', type=int, default=500, help='Users to spread them over (default 500).')
+        parser.add_argument('--foods', type=int, default=60, help='Food items (default 60).')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query; the median is reported.')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database afterwards.')
+
+    def handle(self, *args, **options):
+        # Never touches the configured database: everything happens in test_<NAME>.
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'], aliases={'default'})
+        try:
+            self.stdout.write(f"Database: {connection.vendor} ({connection.settings_dict['NAME']})")
+            user, food = self.seed(options['orders'], options['users'], options['foods'])
+            queries = self.queries(user, food)
+
+            with connection.schema_editor() as editor:
+                for model, index in BASELINE_INDEXES:
+                    editor.add_index(model, index)
+                for model, name in BENCHMARKED_INDEXES:
+                    editor.remove_index(model, self.index(model, name))
+            self.analyze()
+            before = {name: self.measure(queryset, options['repeat']) for name, queryset, _ in queries}
+
+            with connection.schema_editor() as editor:
+                for model, name in BENCHMARKED_INDEXES:
+                    editor.add_index(model, self.index(model, name))
+                for model, index in BASELINE_INDEXES:
+                    editor.remove_index(model, index)
+            self.analyze()
+            after = {name: self.measure(queryset, options['repeat']) for name, queryset, _ in queries}
+
+            for name, _, expected in queries:
+                self.report(name, before[name], after[name], expected)
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+
+    def seed(self, order_count, user_count, food_count):
+        """Bulk-insert users, foods, orders and lines; returns the heaviest user and a popular food."""
+        rng = random.Random(42)
+        now = timezone.now()
+        User.objects.bulk_create([User(username=f'bench{i}', password='!') for i in range(user_count)])
+        users = list(User.objects.order_by('id').values_list('id', flat=True))
+        FoodItem.objects.bulk_create([
+            FoodItem(name=f'Bench food {i}', description='', price=Decimal(rng.randint(50, 500)),
+                     image='food_images/bench.jpg', added_by_id=users[0])
+            for i in range(food_count)
+        ])
+        foods = list(FoodItem.objects.order_by('id').values_list('id', 'price'))
+
+        orders = []
+        for i in range(order_count):
+            # A few heavy users, like real order histories; about 1% still on their way
+            user_id = users[0] if i % 20 == 0 else rng.choice(users)
+            recent = rng.random() < 0.01
+            placed = now - timedelta(minutes=rng.randint(0, 60 if recent else 365 * 24 * 60))
+            due = placed + timedelta(minutes=30)
+            orders.append(Order(
+                user_id=user_id, address='Bench', city=rng.choice(CITIES), timestamp=placed,
+                delivery_due_at=due, status=OrderStatus.DISPATCHED if recent else OrderStatus.DELIVERED,
+            ))
+        Order.objects.bulk_create(orders, batch_size=2000)
+
+        lines = []
+        for order_id in Order.objects.order_by('id').values_list('id', flat=True):
+            for food_id, price in rng.sample(foods, rng.randint(1, 3)):
+                lines.append(OrderLine(order_id=order_id, food_item_id=food_id, quantity=rng.randint(1, 3), unit_price=price))
+        OrderLine.objects.bulk_create(lines, batch_size=2000)
+        history.rebuild()
+        self.stdout.write(f"Seeded {order_count} orders with {len(lines)} lines for {user_count} users.")
+        return User.objects.get(id=users[0]), FoodItem.objects.get(id=foods[0][0])
+
+    def queries(self, user, food):
+        """(name, queryset, indexes expected in the plan) for each hot path."""
+        now = timezone.now()
+        return [
+            ('tracking snapshot active orders', Order.objects.filter(user=user, status__in=ACTIVE_ORDER_STATUSES)
+                .order_by('-timestamp'), ['order_user_status_time_idx', 'order_user_time_idx']),
+            ('advance_orders due orders of a user', Order.objects.filter(
+                user=user, status__in=ACTIVE_ORDER_STATUSES, delivery_due_at__lte=now),
+                ['order_user_status_time_idx']),
+            ('advance_order_status due orders', Order.objects.filter(
+                status__in=ACTIVE_ORDER_STATUSES, delivery_due_at__lte=now), ['order_status_due_idx']),
+            ('order_now latest order of food', Order.objects.filter(user=user, lines__food_item=food)
+                .order_by('-timestamp')[:1], ['order_user_time_idx', 'orderline_food_order_idx']),
+            ('orders_view history page', OrderHistoryEntry.objects.filter(user=user, status=OrderStatus.DELIVERED)
+                .order_by('-placed_at', '-order_id')[:11], ['orderhistory_user_idx']),
+            ('orders_view active orders', OrderHistoryEntry.objects.filter(
+                user=user, status__in=ACTIVE_ORDER_STATUSES).order_by('-placed_at', '-order_id'),
+                ['orderhistory_user_idx']),
+        ]
+
+    def analyze(self):
+        """Refresh planner statistics so both runs are planned from the real data distribution."""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(f"ANALYZE TABLE {Order._meta.db_table}, {OrderLine._meta.db_table}, "
+                               f"{OrderHistoryEntry._meta.db_table}")
+                cursor.fetchall()
+            else:
+                cursor.execute("ANALYZE")
+
+    def index(self, model, name):
+        return next(index for index in model._meta.indexes if index.name == name)
+
+    def measure(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - start) * 1000)
+        return {'ms': statistics.median(timings), 'plan': queryset.explain()}
+
+    def report(self, name, before, after, expected):
+        speedup = before['ms'] / after['ms'] if after['ms'] else float('inf')
+        used = [index for index in expected if index in after['plan']]
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{name}"))
+        self.stdout.write(f"  before {before['ms']:.2f} ms -> after {after['ms']:.2f} ms ({speedup:.1f}x)")
+        if used:
+            self.stdout.write(self.style.SUCCESS(f"  ✅ plan uses {', '.join(used)}"))
+        else:
+            self.stdout.write(self.style.WARNING(f"  ⚠️ plan uses none of {', '.join(expected)}"))
+        for label, result in (('before', before), ('after', after)):
+            self.stdout.write(f"  EXPLAIN ({label}):")
+            for line in result['plan'].splitlines():
+                self.stdout.write(f"    {line}")
@@ -0,0 +1,81 @@
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from accounts.catalog_cache import bump_catalog_version
+from accounts.images import DERIVATIVE_FORMATS, DERIVATIVE_WIDTHS, derivative_name
+from accounts.models import FoodItem, OrderHistoryEntry
+from accounts.storage import content_digest, content_name, is_content_addressed
+
+MEDIA_DIRS = ('food_images',)
+
+
+class Command(BaseCommand):
+    help = 'Renames media files to their content hash, merging duplicates and rewriting FoodItem references.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without touching anything.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        root = settings.MEDIA_ROOT
+
+        names = set(FoodItem.objects.exclude(image='').values_list('image', flat=True))
+        for directory in MEDIA_DIRS:
+            path = os.path.join(root, directory)
+            if os.path.isdir(path):
+                names.update(f"{directory}/{entry}" for entry in os.listdir(path)
+                             if os.path.isfile(os.path.join(path, entry)))
+
+        renamed = merged = rewritten = 0
+        freed = 0
+        targets = set()
+        for name in sorted(names):
+            source = os.path.join(root, name)
+            if is_content_addressed(name) or not os.path.isfile(source):
+                continue
+            with open(source, 'rb') as f:
+                target_name = content_name(name, content_digest(File(f)))
+            target = os.path.join(root, target_name)
+            duplicate = target_name in targets or os.path.exists(target)
+            targets.add(target_name)
+            if duplicate:
+                merged += 1
+                freed += os.path.getsize(source)
+            else:
+                renamed += 1
+
+            if dry_run:
+                self.stdout.write(f"{name} -> {target_name}{' (duplicate)' if duplicate else ''}")
+                continue
+
+            if duplicate:
+                os.remove(source)
+            else:
+                os.replace(source, target)
+            self._move_derivatives(name, target_name)
+            rewritten += FoodItem.objects.filter(image=name).update(image=target_name)
+            OrderHistoryEntry.objects.filter(image=name).update(image=target_name)
+
+        if not dry_run and (renamed or merged):
+            # update() skips signals; make cached listings re-render with the new URLs
+            bump_catalog_version()
+        self.stdout.write(
+            f"{'Would rename' if dry_run else '✅ Renamed'} {renamed} files, merged {merged} duplicates "
+            f"({freed / 1024:.0f} KiB freed), rewrote {rewritten} references."
+        )
+
+    def _move_derivatives(self, old_name, new_name):
+        root = settings.MEDIA_ROOT
+        for width in DERIVATIVE_WIDTHS:
+            for ext in DERIVATIVE_FORMATS:
+                old = os.path.join(root, derivative_name(old_name, width, ext))
+                if not os.path.exists(old):
+                    continue
+                new = os.path.join(root, derivative_name(new_name, width, ext))
+                if os.path.exists(new):
+                    os.remove(old)
+                else:
+                    os.replace(old, new)
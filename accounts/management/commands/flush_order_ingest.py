@@ -0,0 +1,34 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.ingest import FLUSH_BATCH_SIZE, StaleClaim, flush_all
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Writes orders queued while ORDER_INGEST_MODE is "queue" to Order in batches. '
+            'Run from cron, or with --interval as a worker. Safe to run several at once.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, flushing every N seconds (default: run once).')
+        parser.add_argument('--batch-size', type=int, default=FLUSH_BATCH_SIZE,
+                            help=f'Entries written per transaction (default {FLUSH_BATCH_SIZE}).')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            try:
+                counts = flush_all(options['batch_size'])
+            except StaleClaim as exc:
+                # Rolled back; the run that took over the entries writes them
+                logger.warning("%s", exc)
+                counts = {'written': 0, 'rejected': 0}
+            if counts['written'] or counts['rejected'] or not interval:
+                self.stdout.write(f"✅ Wrote {counts['written']} queued orders, rejected {counts['rejected']}.")
+            if not interval:
+                return
+            time.sleep(interval)
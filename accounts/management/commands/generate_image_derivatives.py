@@ -0,0 +1,48 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.catalog_cache import bump_catalog_version, touch_food_items
+from accounts.images import DERIVED_DIR, render_derivatives
+from accounts.models import FoodItem
+
+
+class Command(BaseCommand):
+    help = 'Generates resized JPEG/WebP derivatives for existing food images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that already exist.')
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'FOOD_IMAGE_WORKERS', 2))
+
+    def handle(self, *args, **options):
+        names = set(FoodItem.objects.exclude(image='').values_list('image', flat=True))
+        # Also pick up files in media/food_images that no FoodItem references (yet)
+        image_dir = os.path.join(settings.MEDIA_ROOT, 'food_images')
+        if os.path.isdir(image_dir):
+            names.update(f"food_images/{entry}" for entry in os.listdir(image_dir)
+                         if os.path.isfile(os.path.join(image_dir, entry)))
+        names = sorted(n for n in names if not n.startswith(f"{DERIVED_DIR}/")
+                       and os.path.exists(os.path.join(settings.MEDIA_ROOT, n)))
+
+        written = failed = 0
+        changed = []
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {pool.submit(render_derivatives, settings.MEDIA_ROOT, name, options['force']): name
+                       for name in names}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"⚠️ {futures[future]}: {exc}")
+                    continue
+                written += len(result)
+                if result:
+                    changed.append(futures[future])
+        if changed:
+            # Same as after an upload: cached listings and food detail ETags must see the new srcsets
+            touch_food_items(FoodItem.objects.filter(image__in=changed).values_list('id', flat=True))
+            bump_catalog_version()
+        self.stdout.write(f"✅ Processed {len(names)} images, wrote {written} derivatives ({failed} failed).")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from accounts import history, rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the materialized order rollup tables and the order history read model from Order/OrderLine.'
+
+    def handle(self, *args, **kwargs):
+        counts = {**rollups.rebuild(), **history.rebuild()}
+        summary = ', '.join(f"{name}={count}" for name, count in counts.items())
+        self.stdout.write(f"✅ Rollups rebuilt ({summary}).")
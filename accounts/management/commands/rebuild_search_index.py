@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the FoodItem full-text search index (SQLite FTS5; MySQL maintains FULLTEXT itself).'
+
+    def handle(self, *args, **kwargs):
+        indexed = search.rebuild_index()
+        if indexed is None:
+            self.stdout.write("Nothing to rebuild: the database maintains its FULLTEXT index.")
+            return
+        self.stdout.write(f"✅ Indexed {indexed} food items.")
@@ -0,0 +1,48 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.ai_utils import PREDICT_CHUNK_SIZE, score_orders
+from accounts.model_registry import registry
+
+OUTPUT_COLUMNS = ['id', 'order_id', 'username', 'city', 'item_name', 'quantity', 'price', 'predicted_price', 'unknown']
+
+
+class Command(BaseCommand):
+    help = 'Predicts the price of every ordered item with the current model, in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=PREDICT_CHUNK_SIZE,
+                            help=f'Rows per query and per prediction call (default {PREDICT_CHUNK_SIZE}).')
+        parser.add_argument('--output', help='Also write every prediction to this CSV file.')
+
+    def handle(self, *args, **options):
+        if registry.get() is None:
+            self.stdout.write("No model available; run train_order_ai first.")
+            return
+
+        start = time.perf_counter()
+        rows = unknown = 0
+        abs_error = 0.0
+        output = open(options['output'], 'w', newline='') if options['output'] else None
+        try:
+            writer = csv.writer(output) if output else None
+            if writer:
+                writer.writerow(OUTPUT_COLUMNS)
+            for df in score_orders(options['chunk_size']):
+                rows += len(df)
+                unknown += int(df['unknown'].sum())
+                abs_error += float((df['price'].astype(float) - df['predicted_price']).abs().sum())
+                if writer:
+                    writer.writerows(df[OUTPUT_COLUMNS].itertuples(index=False, name=None))
+        finally:
+            if output:
+                output.close()
+
+        elapsed = time.perf_counter() - start
+        mae = abs_error / rows if rows else 0.0
+        self.stdout.write(
+            f"✅ Scored {rows} ordered items in {elapsed:.2f}s "
+            f"({rows / elapsed if elapsed else 0:.0f}/s), {unknown} with unseen values, MAE ₹{mae:.2f}."
+        )
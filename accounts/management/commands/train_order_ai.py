@@ -1,45 +1,48 @@
-import os
-import pandas as pd
+import time
+
 from django.core.management.base import BaseCommand
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import LabelEncoder
-import pickle
-from accounts.models import Order
+from accounts.ai_utils import PREDICT_CHUNK_SIZE, train_price_model
+from accounts.model_registry import registry
 
 class Command(BaseCommand):
-    help = 'Trains and saves the order prediction AI model.'
-
-    def handle(self, *args, **kwargs):
-        orders = Order.objects.all().values('username', 'city', 'item_name', 'quantity', 'price')
-        df = pd.DataFrame(orders)
-        df.dropna(subset=["username", "city", "item_name", "quantity", "price"], inplace=True)
-
-        if df.empty:
-            self.stdout.write("No data to train the model.")
+    help = ('Trains and saves the order prediction AI model. Incremental by default: only order '
+            'lines added since the last run are read. Web processes pick the new model up '
+            'without retraining; run from cron, or with --interval to retrain on a schedule. '
+            'Run with --full now and then to account for edited or deleted orders.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, retraining every N seconds (default: train once).')
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild the model and its vocabularies from every order line.')
+        parser.add_argument('--chunk-size', type=int, default=PREDICT_CHUNK_SIZE,
+                            help=f'Order lines read per query (default {PREDICT_CHUNK_SIZE}).')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        full = options['full']
+        while True:
+            self.train(full, options['chunk_size'])
+            if not interval:
+                return
+            full = False  # later rounds carry on from the model just saved
+            time.sleep(interval)
+
+    def train(self, full, chunk_size):
+        start = time.perf_counter()
+        bundle, summary = train_price_model(full=full, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - start
+        if bundle is None:
+            if summary['mode'] == 'full':
+                self.stdout.write("No data to train the model.")
+            else:
+                self.stdout.write(f"No new order lines since {summary['watermark']}; model unchanged.")
             return
 
-        user_encoder = LabelEncoder()
-        city_encoder = LabelEncoder()
-        item_encoder = LabelEncoder()
-
-        df['user_encoded'] = user_encoder.fit_transform(df['username'])
-        df['city_encoded'] = city_encoder.fit_transform(df['city'])
-        df['item_encoded'] = item_encoder.fit_transform(df['item_name'])
-
-        X = df[['user_encoded', 'city_encoded', 'item_encoded', 'quantity']]
-        y = df['price']
-
-        model = LinearRegression()
-        model.fit(X, y)
-
-        # Save model and encoders
-        project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        model_path = os.path.join(project_root, 'order_predictor_model.pkl')
-        with open(model_path, 'wb') as f:
-            pickle.dump({
-                'model': model,
-                'user_encoder': user_encoder,
-                'city_encoder': city_encoder,
-                'item_encoder': item_encoder
-            }, f)
-        self.stdout.write(f"✅ Model trained and saved to {model_path}.")
\ No newline at end of file
+        # Save model and vocabularies where the registry (and every web process) loads them from
+        model_path = registry.save(bundle)
+        how = f"in full ({summary['reason']})" if summary['mode'] == 'full' else "incrementally"
+        self.stdout.write(
+            f"✅ Model trained {how} on {summary['rows']} order lines in {elapsed:.2f}s, "
+            f"up to line {summary['watermark']}, and saved to {model_path}."
+        )
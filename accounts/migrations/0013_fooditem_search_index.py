@@ -0,0 +1,58 @@
+# Generated by Django 4.2.23 on 2026-10-17 10:12
+
+from django.db import migrations, DatabaseError
+
+# Same as accounts.search.FTS_TABLE when this migration was written.
+FTS_TABLE = "accounts_fooditem_fts"
+MYSQL_NAME_INDEX = "accounts_fooditem_ft_name"
+MYSQL_TEXT_INDEX = "accounts_fooditem_ft_text"
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                    f"USING fts5(name, description, tokenize='unicode61 remove_diacritics 2')"
+                )
+            elif connection.vendor == "mysql":
+                cursor.execute(
+                    f"CREATE FULLTEXT INDEX {MYSQL_NAME_INDEX} ON accounts_fooditem (name)"
+                )
+                cursor.execute(
+                    f"CREATE FULLTEXT INDEX {MYSQL_TEXT_INDEX} ON accounts_fooditem (name, description)"
+                )
+    except DatabaseError:
+        # SQLite builds without FTS5 keep working through the LIKE fallback.
+        if connection.vendor == "mysql":
+            raise
+        return
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+                f"SELECT id, name, COALESCE(description, '') FROM accounts_fooditem"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        elif connection.vendor == "mysql":
+            cursor.execute(f"DROP INDEX {MYSQL_NAME_INDEX} ON accounts_fooditem")
+            cursor.execute(f"DROP INDEX {MYSQL_TEXT_INDEX} ON accounts_fooditem")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0012_order_total_price"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
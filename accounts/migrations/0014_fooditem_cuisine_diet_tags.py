@@ -0,0 +1,70 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0013_fooditem_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="fooditem",
+            name="cuisine",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("Indian", "Indian"),
+                    ("Chinese", "Chinese"),
+                    ("Italian", "Italian"),
+                    ("Continental", "Continental"),
+                    ("Thai", "Thai"),
+                    ("South Indian", "South Indian"),
+                    ("North Indian", "North Indian"),
+                ],
+                default="",
+                max_length=30,
+            ),
+        ),
+        migrations.AddField(
+            model_name="fooditem",
+            name="diet",
+            field=models.CharField(
+                blank=True,
+                choices=[("veg", "Vegetarian"), ("nonveg", "Non-Vegetarian")],
+                db_index=True,
+                default="",
+                max_length=10,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="fooditem",
+            index=models.Index(
+                fields=["cuisine", "diet"], name="fooditem_cuisine_diet_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="fooditem",
+            name="tags",
+            field=models.ManyToManyField(
+                blank=True, related_name="food_items", to="accounts.tag"
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:24
+
+import re
+
+from django.db import migrations
+
+# Frozen copy of the inference rules at the time of this migration.
+CUISINES = [
+    "South Indian",
+    "North Indian",
+    "Continental",
+    "Italian",
+    "Chinese",
+    "Indian",
+    "Thai",
+]
+NONVEG_RE = re.compile(r"\bnon[\s-]?veg", re.IGNORECASE)
+VEG_RE = re.compile(r"\bveg(etarian|gie|an)?\b", re.IGNORECASE)
+
+
+def backfill(apps, schema_editor):
+    FoodItem = apps.get_model("accounts", "FoodItem")
+    changed = []
+    for food in FoodItem.objects.only("id", "name", "description"):
+        text = f"{food.name} {food.description or ''}"
+        lowered = text.lower()
+        food.cuisine = next((c for c in CUISINES if c.lower() in lowered), "")
+        if NONVEG_RE.search(text):
+            food.diet = "nonveg"
+        elif VEG_RE.search(text):
+            food.diet = "veg"
+        else:
+            food.diet = ""
+        changed.append(food)
+    FoodItem.objects.bulk_update(changed, ["cuisine", "diet"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0014_fooditem_cuisine_diet_tags"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:22
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def populate(apps, schema_editor):
+    Order = apps.get_model("accounts", "Order")
+    CityFoodCount = apps.get_model("accounts", "CityFoodCount")
+    counts = Counter()
+    rows = (
+        Order.objects.values("city", "food_item").annotate(total=Count("id")).order_by()
+    )
+    for row in rows:
+        counts[((row["city"] or "").strip().lower(), row["food_item"])] += row["total"]
+        counts[("*", row["food_item"])] += row["total"]
+    CityFoodCount.objects.bulk_create(
+        [
+            CityFoodCount(city=city, food_item_id=food_id, order_count=count)
+            for (city, food_id), count in counts.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0015_backfill_fooditem_cuisine_diet"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CityFoodCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("city", models.CharField(max_length=100)),
+                ("order_count", models.PositiveIntegerField(default=0)),
+                (
+                    "food_item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="city_counts",
+                        to="accounts.fooditem",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["city", "-order_count"], name="cityfood_city_count_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="cityfoodcount",
+            constraint=models.UniqueConstraint(
+                fields=("city", "food_item"), name="unique_city_food_count"
+            ),
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0016_cityfoodcount"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fooditem",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
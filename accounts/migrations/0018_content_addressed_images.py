@@ -0,0 +1,32 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:25
+
+import accounts.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0017_fooditem_updated_at"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="fooditem",
+            name="image",
+            field=models.ImageField(
+                storage=accounts.storage.ContentAddressedStorage(),
+                upload_to="food_images/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=accounts.storage.ContentAddressedStorage(),
+                upload_to="orders/",
+            ),
+        ),
+    ]
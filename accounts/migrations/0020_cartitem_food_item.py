@@ -0,0 +1,52 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def delete_legacy_cart_items(apps, schema_editor):
+    # Rows keyed by a static image name cannot be mapped to a FoodItem; nothing ever wrote them.
+    apps.get_model("accounts", "CartItem").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("accounts", "0019_review_fooditem_rating"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_legacy_cart_items, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="cartitem",
+            name="image_name",
+        ),
+        migrations.AddField(
+            model_name="cartitem",
+            name="food_item",
+            field=models.ForeignKey(
+                default=None,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="cart_items",
+                to="accounts.fooditem",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name="cartitem",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="cart_items",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                fields=("user", "food_item"), name="unique_cart_item"
+            ),
+        ),
+    ]
@@ -0,0 +1,205 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:32
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Rows of one user placed this close together (and to the same city) came from one checkout.
+CHECKOUT_GAP = timedelta(seconds=60)
+BATCH_SIZE = 1000
+
+
+def legacy_unit_price(price, quantity, food_price):
+    """
+    Unit price of an old order row. Orders placed on the site stored the unit price in
+    `price`, but seeded rows stored the line total (food price * quantity); a multi-quantity
+    row whose price is nearer the line total than the unit price is read as a total.
+    """
+    if price is None:
+        return food_price
+    if quantity > 1 and abs(price - food_price * quantity) < abs(price - food_price):
+        return (price / quantity).quantize(Decimal("0.01"))
+    return price
+
+
+def group_orders_into_lines(apps, schema_editor):
+    """
+    Turn the old one-row-per-item orders into headers with lines: consecutive rows of
+    the same user within CHECKOUT_GAP become one Order (the earliest row) whose OrderLines
+    carry the food, quantity and unit price; the other rows of the group are deleted.
+    """
+    Order = apps.get_model("accounts", "Order")
+    OrderLine = apps.get_model("accounts", "OrderLine")
+    FoodItem = apps.get_model("accounts", "FoodItem")
+    food_prices = dict(FoodItem.objects.values_list("id", "price"))
+
+    lines, merged, totals = [], [], {}
+    header = last_timestamp = None
+    rows = Order.objects.order_by("user_id", "timestamp", "id").iterator(
+        chunk_size=BATCH_SIZE
+    )
+    for row in rows:
+        if (
+            header is None
+            or row.user_id != header.user_id
+            or row.city != header.city
+            or row.timestamp - last_timestamp > CHECKOUT_GAP
+        ):
+            header = row
+            totals[header.id] = Decimal("0")
+        else:
+            merged.append(row.id)
+        last_timestamp = row.timestamp
+
+        if row.food_item_id not in food_prices:
+            continue
+        unit_price = legacy_unit_price(
+            row.price, row.quantity, food_prices[row.food_item_id]
+        )
+        lines.append(
+            OrderLine(
+                order_id=header.id,
+                food_item_id=row.food_item_id,
+                quantity=row.quantity,
+                unit_price=unit_price,
+            )
+        )
+        totals[header.id] += unit_price * row.quantity
+        if len(lines) >= BATCH_SIZE:
+            OrderLine.objects.bulk_create(lines)
+            lines = []
+
+    OrderLine.objects.bulk_create(lines)
+    for start in range(0, len(merged), BATCH_SIZE):
+        Order.objects.filter(id__in=merged[start : start + BATCH_SIZE]).delete()
+    for order_id, total in totals.items():
+        Order.objects.filter(id=order_id).update(total_price=total)
+
+
+def split_lines_into_orders(apps, schema_editor):
+    """
+    Reverse of group_orders_into_lines: one Order row per line again. The first line of
+    an order goes onto the order itself, every further line onto a copy of it. Fields the
+    headers no longer keep (description, image, gender, name) come back empty.
+    """
+    Order = apps.get_model("accounts", "Order")
+    OrderLine = apps.get_model("accounts", "OrderLine")
+    # Copies keep the placed_at of their order instead of getting the current time
+    Order._meta.get_field("placed_at").auto_now_add = False
+
+    copied = [
+        "user_id",
+        "address",
+        "placed_at",
+        "delivery_time",
+        "payment_method",
+        "estimated_delivery_minutes",
+        "timestamp",
+        "city",
+    ]
+    copies, last_order_id = [], None
+    lines = OrderLine.objects.select_related("order__user", "food_item").order_by(
+        "order_id", "id"
+    )
+    for line in lines.iterator(chunk_size=BATCH_SIZE):
+        order = line.order
+        fields = {
+            "food_item_id": line.food_item_id,
+            "item_name": line.food_item.name,
+            "quantity": line.quantity,
+            "price": line.unit_price,
+            "total_price": line.unit_price * line.quantity,
+            "username": order.user.username,
+        }
+        if line.order_id != last_order_id:
+            Order.objects.filter(id=order.id).update(**fields)
+            last_order_id = line.order_id
+        else:
+            copies.append(
+                Order(**{name: getattr(order, name) for name in copied}, **fields)
+            )
+        if len(copies) >= BATCH_SIZE:
+            Order.objects.bulk_create(copies)
+            copies = []
+    Order.objects.bulk_create(copies)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0020_cartitem_food_item"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderLine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.PositiveIntegerField(default=1)),
+                ("unit_price", models.DecimalField(decimal_places=2, max_digits=8)),
+                (
+                    "food_item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="order_lines",
+                        to="accounts.fooditem",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lines",
+                        to="accounts.order",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(group_orders_into_lines, split_lines_into_orders),
+        migrations.RemoveField(
+            model_name="order",
+            name="description",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="food_item",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="gender",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="image",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="item_name",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="name",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="price",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="quantity",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="username",
+        ),
+    ]
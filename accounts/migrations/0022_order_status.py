@@ -0,0 +1,87 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:34
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Same as accounts.delivery.DISPATCH_AFTER when this migration was written.
+DISPATCH_AFTER = timedelta(minutes=5)
+BATCH_SIZE = 1000
+
+
+def backfill_status(apps, schema_editor):
+    """Derive delivery_due_at and the status each existing order would have reached by now."""
+    Order = apps.get_model("accounts", "Order")
+    now = timezone.now()
+    batch = []
+    for order in Order.objects.order_by("id").iterator(chunk_size=BATCH_SIZE):
+        order.delivery_due_at = order.timestamp + timedelta(
+            minutes=order.estimated_delivery_minutes
+        )
+        dispatch_at = order.timestamp + DISPATCH_AFTER
+        if order.delivery_due_at <= now:
+            order.status = "delivered"
+            order.dispatched_at = dispatch_at
+            order.delivered_at = order.delivery_due_at
+        elif dispatch_at <= now:
+            order.status = "dispatched"
+            order.dispatched_at = dispatch_at
+        batch.append(order)
+        if len(batch) >= BATCH_SIZE:
+            Order.objects.bulk_update(
+                batch, ["delivery_due_at", "status", "dispatched_at", "delivered_at"]
+            )
+            batch = []
+    Order.objects.bulk_update(
+        batch, ["delivery_due_at", "status", "dispatched_at", "delivered_at"]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0021_order_lines"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="delivered_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="delivery_due_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="dispatched_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("placed", "Preparing"),
+                    ("dispatched", "Delivering"),
+                    ("delivered", "Delivered"),
+                ],
+                default="placed",
+                max_length=12,
+            ),
+        ),
+        migrations.RunPython(backfill_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["user", "status"], name="order_user_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["status", "delivery_due_at"], name="order_status_due_idx"
+            ),
+        ),
+    ]
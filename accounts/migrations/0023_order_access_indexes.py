@@ -0,0 +1,42 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0022_order_status"),
+    ]
+
+    # Add the wider user index before dropping the old one: on MySQL/InnoDB an index
+    # leading with user_id must exist at all times for the foreign key.
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "status", "-timestamp", "-id"],
+                name="order_user_status_time_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "-timestamp"], name="order_user_time_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["city"], name="order_city_idx"),
+        ),
+        migrations.RemoveIndex(
+            model_name="order",
+            name="order_user_status_idx",
+        ),
+        migrations.AddIndex(
+            model_name="orderline",
+            index=models.Index(
+                fields=["food_item", "order"], name="orderline_food_order_idx"
+            ),
+        ),
+    ]
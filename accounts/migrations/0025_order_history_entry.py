@@ -0,0 +1,123 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:43
+
+import accounts.storage
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def backfill_history(apps, schema_editor):
+    """One OrderHistoryEntry per existing order, as accounts.history.history_entry builds them."""
+    Order = apps.get_model("accounts", "Order")
+    OrderLine = apps.get_model("accounts", "OrderLine")
+    OrderHistoryEntry = apps.get_model("accounts", "OrderHistoryEntry")
+    last_id = 0
+    while True:
+        orders = list(Order.objects.filter(id__gt=last_id).order_by("id")[:BATCH_SIZE])
+        if not orders:
+            return
+        lines = {}
+        for line in (
+            OrderLine.objects.filter(order__in=orders)
+            .select_related("food_item")
+            .order_by("id")
+        ):
+            lines.setdefault(line.order_id, []).append(line)
+        entries = []
+        for order in orders:
+            order_lines = lines.get(order.id, [])
+            first_food = order_lines[0].food_item if order_lines else None
+            entries.append(
+                OrderHistoryEntry(
+                    order=order,
+                    user_id=order.user_id,
+                    status=order.status,
+                    placed_at=order.timestamp,
+                    delivery_due_at=order.delivery_due_at,
+                    delivered_at=order.delivered_at,
+                    total_price=order.total_price or 0,
+                    image=(
+                        first_food.image.name if first_food and first_food.image else ""
+                    ),
+                    lines=[
+                        {
+                            "name": line.food_item.name,
+                            "quantity": line.quantity,
+                            "unit_price": str(line.unit_price),
+                        }
+                        for line in order_lines
+                    ],
+                )
+            )
+        OrderHistoryEntry.objects.bulk_create(entries)
+        last_id = orders[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("accounts", "0024_order_ingest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderHistoryEntry",
+            fields=[
+                (
+                    "order",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="history_entry",
+                        serialize=False,
+                        to="accounts.order",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("placed", "Preparing"),
+                            ("dispatched", "Delivering"),
+                            ("delivered", "Delivered"),
+                        ],
+                        default="placed",
+                        max_length=12,
+                    ),
+                ),
+                ("placed_at", models.DateTimeField()),
+                ("delivery_due_at", models.DateTimeField(blank=True, null=True)),
+                ("delivered_at", models.DateTimeField(blank=True, null=True)),
+                ("total_price", models.DecimalField(decimal_places=2, max_digits=10)),
+                (
+                    "image",
+                    models.ImageField(
+                        blank=True,
+                        storage=accounts.storage.ContentAddressedStorage(),
+                        upload_to="food_images/",
+                    ),
+                ),
+                ("lines", models.JSONField(default=list)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "status", "-placed_at", "-order"],
+                        name="orderhistory_user_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+# Same as accounts.rollups.ALL_CITIES when this migration was written.
+ALL_CITIES = "*"
+
+
+def backfill_counts(apps, schema_editor):
+    """Per-city and per-user order counts, as accounts.rollups.rebuild computes them."""
+    Order = apps.get_model("accounts", "Order")
+    CityOrderCount = apps.get_model("accounts", "CityOrderCount")
+    UserOrderCount = apps.get_model("accounts", "UserOrderCount")
+
+    city_counts, labels = {}, {}
+    for row in (
+        Order.objects.values("city").annotate(total=Count("id")).order_by("city")
+    ):
+        key = (row["city"] or "").strip().lower()
+        for city in (key, ALL_CITIES):
+            city_counts[city] = city_counts.get(city, 0) + row["total"]
+        labels.setdefault(key, (row["city"] or "").strip())
+    CityOrderCount.objects.bulk_create(
+        [
+            CityOrderCount(city=city, label=labels.get(city, ""), order_count=count)
+            for city, count in city_counts.items()
+        ],
+        batch_size=1000,
+    )
+    UserOrderCount.objects.bulk_create(
+        [
+            UserOrderCount(user_id=row["user"], order_count=row["total"])
+            for row in Order.objects.values("user")
+            .annotate(total=Count("id"))
+            .order_by()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("accounts", "0025_order_history_entry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserOrderCount",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="order_count",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("order_count", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["-order_count"], name="userorder_count_idx")
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="CityOrderCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("city", models.CharField(max_length=100, unique=True)),
+                ("label", models.CharField(blank=True, max_length=100)),
+                ("order_count", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["-order_count"], name="cityorder_count_idx")
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,137 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:47
+
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+# Same as accounts.rollups.ALL_CITIES when this migration was written.
+ALL_CITIES = "*"
+GRANULARITIES = ("hour", "day")
+
+
+def bucket_start(moment, granularity):
+    """Same as accounts.rollups.bucket_start when this migration was written."""
+    start = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    return start.replace(hour=0) if granularity == "day" else start
+
+
+def backfill_buckets(apps, schema_editor):
+    Order = apps.get_model("accounts", "Order")
+    OrderLine = apps.get_model("accounts", "OrderLine")
+    CityOrderBucket = apps.get_model("accounts", "CityOrderBucket")
+    FoodOrderBucket = apps.get_model("accounts", "FoodOrderBucket")
+
+    city_buckets, food_buckets = Counter(), Counter()
+    orders = Order.objects.values_list("timestamp", "city")
+    for timestamp, city in orders.iterator(chunk_size=2000):
+        for granularity in GRANULARITIES:
+            start = bucket_start(timestamp, granularity)
+            city_buckets[(granularity, start, (city or "").strip().lower())] += 1
+            city_buckets[(granularity, start, ALL_CITIES)] += 1
+    lines = OrderLine.objects.values_list("order__timestamp", "food_item")
+    for timestamp, food_id in lines.iterator(chunk_size=2000):
+        for granularity in GRANULARITIES:
+            food_buckets[
+                (granularity, bucket_start(timestamp, granularity), food_id)
+            ] += 1
+
+    CityOrderBucket.objects.bulk_create(
+        [
+            CityOrderBucket(
+                granularity=granularity, start=start, city=city, order_count=count
+            )
+            for (granularity, start, city), count in city_buckets.items()
+        ],
+        batch_size=1000,
+    )
+    FoodOrderBucket.objects.bulk_create(
+        [
+            FoodOrderBucket(
+                granularity=granularity,
+                start=start,
+                food_item_id=food_id,
+                order_count=count,
+            )
+            for (granularity, start, food_id), count in food_buckets.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0026_order_count_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CityOrderBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[("hour", "Hourly"), ("day", "Daily")], max_length=4
+                    ),
+                ),
+                ("start", models.DateTimeField()),
+                ("city", models.CharField(max_length=100)),
+                ("order_count", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="FoodOrderBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[("hour", "Hourly"), ("day", "Daily")], max_length=4
+                    ),
+                ),
+                ("start", models.DateTimeField()),
+                ("order_count", models.PositiveIntegerField(default=0)),
+                (
+                    "food_item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="order_buckets",
+                        to="accounts.fooditem",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="cityorderbucket",
+            constraint=models.UniqueConstraint(
+                fields=("granularity", "start", "city"), name="unique_city_order_bucket"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="foodorderbucket",
+            constraint=models.UniqueConstraint(
+                fields=("granularity", "start", "food_item"),
+                name="unique_food_order_bucket",
+            ),
+        ),
+        migrations.RunPython(backfill_buckets, migrations.RunPython.noop),
+    ]
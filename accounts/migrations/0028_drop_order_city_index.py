@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:08
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0027_order_buckets"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="order",
+            name="order_city_idx",
+        ),
+    ]
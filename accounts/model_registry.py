@@ -0,0 +1,125 @@
+# model_registry.py
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# How often (seconds) get() looks at the file for a newer model. Between checks it costs nothing.
+CHECK_INTERVAL = 5.0
+
+
+def model_path():
+    """The one place the order price model lives: settings.ORDER_MODEL_PATH."""
+    return getattr(settings, 'ORDER_MODEL_PATH', os.path.join(settings.BASE_DIR, 'order_predictor_model.pkl'))
+
+
+def _file_version(path):
+    """Cheap identity of the file on disk (mtime + size), or None if there is no file."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+class LoadedModel:
+    """An unpickled model bundle ({'model', 'user_encoder', ...}) and where it came from."""
+
+    def __init__(self, bundle, path, version, load_seconds):
+        self.bundle = bundle
+        self.path = path
+        self.version = version
+        self.load_seconds = load_seconds
+        self.loaded_at = timezone.now()
+
+    def __getitem__(self, key):
+        return self.bundle[key]
+
+
+class ModelRegistry:
+    """
+    Process-wide holder of the order price model. The file is unpickled once and reused;
+    get() stats it at most every CHECK_INTERVAL seconds and, when a newer file is there,
+    loads it and swaps it in with a single reference assignment, so readers always see
+    either the old or the new model whole. A broken file is logged and the old model kept.
+    """
+
+    def __init__(self):
+        self._current = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The current LoadedModel, or None if no model has been trained yet."""
+        current = self._current
+        now = time.monotonic()
+        if current is not None and self._checked_at is not None and now - self._checked_at < CHECK_INTERVAL:
+            return current
+        path = model_path()
+        version = _file_version(path)
+        if version is None or (current is not None and current.path == path and current.version == version):
+            self._checked_at = now
+            return current
+        with self._lock:
+            # Another thread may have loaded this version while we waited for the lock
+            current = self._current
+            if current is None or current.path != path or current.version != version:
+                loaded = self._load(path, version)
+                if loaded is not None:
+                    self._current = current = loaded
+            self._checked_at = now
+        return current
+
+    def _load(self, path, version):
+        start = time.perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                bundle = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as exc:
+            logger.error("Could not load order model %s: %s", path, exc)
+            return None
+        loaded = LoadedModel(bundle, path, version, time.perf_counter() - start)
+        logger.info("Loaded order model %s (version %s) in %.1f ms", path, version, loaded.load_seconds * 1000)
+        return loaded
+
+    def save(self, bundle):
+        """
+        Write a model bundle to model_path() atomically (temporary file + rename), so a
+        process reloading at the same moment never reads half a file. Returns the path.
+        """
+        path = model_path()
+        directory = os.path.dirname(path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.order_model-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(bundle, f)
+            os.chmod(tmp_path, 0o644)  # mkstemp creates it private
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._checked_at = None  # pick the new file up on the next get() in this process
+        return path
+
+    def info(self):
+        """Path, active version, load time and freshness, for the staff pages."""
+        current = self._current
+        path = model_path()
+        return {
+            'path': path,
+            'available': current is not None,
+            'version': current.version if current else None,
+            'loaded_at': current.loaded_at.isoformat() if current else None,
+            'load_ms': round(current.load_seconds * 1000, 2) if current else None,
+            'stale': current is not None and _file_version(path) not in (None, current.version),
+        }
+
+
+registry = ModelRegistry()
@@ -1,26 +1,112 @@
+import math
+import re
+from datetime import timedelta
+from decimal import Decimal
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
 
+from .storage import content_addressed_storage
+
+class Cuisine(models.TextChoices):
+    INDIAN = 'Indian', 'Indian'
+    CHINESE = 'Chinese', 'Chinese'
+    ITALIAN = 'Italian', 'Italian'
+    CONTINENTAL = 'Continental', 'Continental'
+    THAI = 'Thai', 'Thai'
+    SOUTH_INDIAN = 'South Indian', 'South Indian'
+    NORTH_INDIAN = 'North Indian', 'North Indian'
+
+class Diet(models.TextChoices):
+    VEG = 'veg', 'Vegetarian'
+    NONVEG = 'nonveg', 'Non-Vegetarian'
+
+NONVEG_RE = re.compile(r'\bnon[\s-]?veg', re.IGNORECASE)
+VEG_RE = re.compile(r'\bveg(etarian|gie|an)?\b', re.IGNORECASE)
+
+def infer_cuisine(text):
+    """Best-effort cuisine from free text; longer names first so 'South Indian' beats 'Indian'."""
+    text = (text or '').lower()
+    for value in sorted(Cuisine.values, key=len, reverse=True):
+        if value.lower() in text:
+            return value
+    return ''
+
+def infer_diet(text):
+    """Best-effort diet from free text. 'nonveg' is checked first since it contains 'veg'."""
+    text = text or ''
+    if NONVEG_RE.search(text):
+        return Diet.NONVEG
+    if VEG_RE.search(text):
+        return Diet.VEG
+    return ''
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    def __str__(self):
+        return self.name
+
 class FoodItem(models.Model):
     name = models.CharField(max_length=200)
     price = models.DecimalField(max_digits=7, decimal_places=2)
-    image = models.ImageField(upload_to='food_images/')
+    image = models.ImageField(upload_to='food_images/', storage=content_addressed_storage)
     description = models.TextField(default="Delicious food item from DYNO.")
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
     added_by = models.ForeignKey(User, on_delete=models.CASCADE)
     city = models.CharField(max_length=100, null=True, blank=True)
+    cuisine = models.CharField(max_length=30, choices=Cuisine.choices, blank=True, default='')
+    diet = models.CharField(max_length=10, choices=Diet.choices, blank=True, default='', db_index=True)
+    tags = models.ManyToManyField(Tag, blank=True, related_name='food_items')
+    # Denormalized from Review by accounts.ratings; never aggregated per request
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Serves cuisine-only and cuisine + diet filters from the home category chips.
+            models.Index(fields=['cuisine', 'diet'], name='fooditem_cuisine_diet_idx'),
+            # Keyset order of the "rating" sort (see feed.SORT_KEYS).
+            models.Index(fields=['-rating_avg', '-rating_count', '-id'], name='fooditem_rating_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
-class CartItem(models.Model):
+class Review(models.Model):
+    food_item = models.ForeignKey(FoodItem, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    image_name = models.CharField(max_length=255)
+    rating = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
+    comment = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['food_item', 'user'], name='unique_review_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['food_item', '-created_at'], name='review_food_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} rated {self.food_item_id}: {self.rating}"
+
+class CartItem(models.Model):
+    """One line of a signed-in user's cart; written with F() upserts by accounts.cart."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart_items')
+    food_item = models.ForeignKey(FoodItem, on_delete=models.CASCADE, related_name='cart_items')
     quantity = models.PositiveIntegerField(default=1)
-    def image_url(self):
-        return f"/static/accounts/images/{self.image_name}"
+
+    class Meta:
+        constraints = [
+            # Also the (user, ...) index every cart read and upsert goes through.
+            models.UniqueConstraint(fields=['user', 'food_item'], name='unique_cart_item'),
+        ]
+
     def __str__(self):
-        return f"{self.image_name} x {self.quantity}"
+        return f"{self.user.username}: {self.food_item_id} x {self.quantity}"
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -33,24 +119,251 @@ class Profile(models.Model):
     def __str__(self):
         return f"{self.user.username}'s profile"
 
+class OrderStatus(models.TextChoices):
+    PLACED = 'placed', 'Preparing'
+    DISPATCHED = 'dispatched', 'Delivering'
+    DELIVERED = 'delivered', 'Delivered'
+
+ACTIVE_ORDER_STATUSES = (OrderStatus.PLACED, OrderStatus.DISPATCHED)
+
 class Order(models.Model):
+    """
+    One checkout. The items live in OrderLine; customer details are read from User/Profile.
+    `city` is the delivery city at the time of ordering, kept because the rollups key on it.
+    `status` only moves forward (placed -> dispatched -> delivered); see accounts.delivery.
+    """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    food_item = models.ForeignKey(FoodItem, on_delete=models.CASCADE, default=1)
-    quantity = models.PositiveIntegerField(default=1)
     address = models.TextField()
     delivery_time = models.TimeField(null=True, blank=True)
     payment_method = models.CharField(max_length=50, default='Cash on Delivery')
     placed_at = models.DateTimeField(auto_now_add=True)
-    item_name = models.CharField(max_length=100, null=True, blank=True)
-    description = models.TextField(null=True, blank=True)
-    image = models.ImageField(upload_to='orders/', null=True, blank=True)
-    price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
-    total_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # price × quantity
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # sum of line totals
     timestamp = models.DateTimeField(default=timezone.now)
     estimated_delivery_minutes = models.IntegerField(default=30)
-    name = models.CharField(max_length=255, null=True, blank=True)    # User's name
-    gender = models.CharField(max_length=10, null=True, blank=True)   # User's gender
-    city = models.CharField(max_length=100, null=True, blank=True)    # User's city
-    username = models.CharField(max_length=150, null=True, blank=True)  # User's username
+    city = models.CharField(max_length=100, null=True, blank=True)
+    status = models.CharField(max_length=12, choices=OrderStatus.choices, default=OrderStatus.PLACED)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    # timestamp + estimated_delivery_minutes, stored so the transition job can range-scan it
+    delivery_due_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Checked by the benchmark_order_indexes command against EXPLAIN on SQLite and MySQL.
+        indexes = [
+            # Active orders (status IN ...) per user: tracking snapshots and due orders of one user
+            models.Index(fields=['user', 'status', '-timestamp', '-id'], name='order_user_status_time_idx'),
+            # Latest order of a user regardless of status (order_now tracking)
+            models.Index(fields=['user', '-timestamp'], name='order_user_time_idx'),
+            # Transition job: orders of a status whose deadline has passed
+            models.Index(fields=['status', 'delivery_due_at'], name='order_status_due_idx'),
+        ]
+
+    is_provisional = False
+
+    def __str__(self):
+        return f"Order #{self.pk} by {self.user.username}"
+
+    @property
+    def is_active(self):
+        return self.status in ACTIVE_ORDER_STATUSES
+
+    @property
+    def remaining_minutes(self):
+        """Whole minutes until delivery_due_at, 0 once delivered or overdue."""
+        if not self.is_active or self.delivery_due_at is None:
+            return 0
+        return max(0, math.ceil((self.delivery_due_at - timezone.now()).total_seconds() / 60))
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    food_item = models.ForeignKey(FoodItem, on_delete=models.CASCADE, related_name='order_lines')
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=8, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            # "Has this user ordered food X": food -> orders without touching the line rows,
+            # and the (food, order) pairs for per-city food aggregates
+            models.Index(fields=['food_item', 'order'], name='orderline_food_order_idx'),
+        ]
+
+    @property
+    def total(self):
+        return self.unit_price * self.quantity
+
+    def __str__(self):
+        return f"{self.food_item_id} x {self.quantity}"
+
+class OrderHistoryEntry(models.Model):
+    """
+    Read model for the orders page: one row per Order with everything a card shows, so a page
+    of history is one indexed query with no joins. Written next to the Order (checkout,
+    ingest flush) and on status changes (delivery); accounts.history.rebuild() recreates it.
+    `lines` is [{'name', 'quantity', 'unit_price'}] as ordered; `image` is the first line's food image.
+    """
+    order = models.OneToOneField(Order, primary_key=True, on_delete=models.CASCADE, related_name='history_entry')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=12, choices=OrderStatus.choices, default=OrderStatus.PLACED)
+    placed_at = models.DateTimeField()
+    delivery_due_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    image = models.ImageField(upload_to='food_images/', storage=content_addressed_storage, blank=True)
+    lines = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [
+            # Active cards and delivered history of a user, newest first (keyset on placed_at, order)
+            models.Index(fields=['user', 'status', '-placed_at', '-order'], name='orderhistory_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"History of order #{self.order_id}"
+
+    # Same rules as the Order itself
+    is_active = Order.is_active
+    remaining_minutes = Order.remaining_minutes
+
+class OrderIngest(models.Model):
+    """
+    An order accepted while ORDER_INGEST_MODE is 'queue': one small INSERT at request time,
+    turned into an Order with its lines by the flush_order_ingest worker (accounts.ingest).
+    `payload` is {'items': [{'food', 'quantity', 'unit_price'}], 'address', 'payment_method', 'city'}.
+    A row is pending while `order` is empty and `error` is blank.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='order_ingests')
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    # Claim token and time of the flush run working on the row; stale claims are taken over
+    batch = models.CharField(max_length=32, null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    # Unique: an entry materializes into at most one Order. Its index (which carries the pk)
+    # also serves the flush scan, pending rows (order IS NULL) oldest first.
+    order = models.OneToOneField(Order, null=True, blank=True, on_delete=models.CASCADE, related_name='ingest')
+    error = models.CharField(max_length=255, blank=True)
+
+    is_provisional = True
+    is_active = True
+
+    class Meta:
+        indexes = [
+            # Provisional orders of a user (orders page, live tracking)
+            models.Index(fields=['user', 'order'], name='orderingest_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order {self.provisional_id} by {self.user_id} (queued)"
+
+    @property
+    def provisional_id(self):
+        return f"P{self.pk}"
+
+    @property
+    def total_price(self):
+        return sum((Decimal(item['unit_price']) * item['quantity'] for item in self.payload['items']), Decimal('0.00'))
+
+    @property
+    def status(self):
+        return 'queued'
+
+    def get_status_display(self):
+        return 'Received'
+
+    @property
+    def timestamp(self):
+        return self.created_at
+
+    @property
+    def remaining_minutes(self):
+        """Counted from created_at, which the flushed Order keeps as its timestamp."""
+        minutes = Order._meta.get_field('estimated_delivery_minutes').default
+        remaining = self.created_at + timedelta(minutes=minutes) - timezone.now()
+        return max(0, math.ceil(remaining.total_seconds() / 60))
+
+class CityFoodCount(models.Model):
+    """
+    Materialized order count per (city, food), maintained by accounts.rollups.
+    `city` is the normalized key (see rollups.city_key); rollups.ALL_CITIES holds the global totals.
+    """
+    city = models.CharField(max_length=100)
+    food_item = models.ForeignKey(FoodItem, on_delete=models.CASCADE, related_name='city_counts')
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['city', 'food_item'], name='unique_city_food_count'),
+        ]
+        indexes = [
+            models.Index(fields=['city', '-order_count'], name='cityfood_city_count_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.city}: {self.food_item_id} x {self.order_count}"
+
+class CityOrderCount(models.Model):
+    """
+    Materialized order count per city, maintained by accounts.rollups like CityFoodCount.
+    `city` is the normalized key (ALL_CITIES holds the total); `label` is the spelling first seen, for display.
+    """
+    city = models.CharField(max_length=100, unique=True)
+    label = models.CharField(max_length=100, blank=True)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-order_count'], name='cityorder_count_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.city}: {self.order_count}"
+
+class UserOrderCount(models.Model):
+    """Materialized order count per user, maintained by accounts.rollups."""
+    user = models.OneToOneField(User, primary_key=True, on_delete=models.CASCADE, related_name='order_count')
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-order_count'], name='userorder_count_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.order_count}"
+
+class BucketGranularity(models.TextChoices):
+    HOUR = 'hour', 'Hourly'
+    DAY = 'day', 'Daily'
+
+class CityOrderBucket(models.Model):
+    """
+    Orders per city and hour/day, maintained by accounts.rollups; `start` is the bucket's
+    first instant in TIME_ZONE. ALL_CITIES rows hold the volume across every city.
+    """
+    granularity = models.CharField(max_length=4, choices=BucketGranularity.choices)
+    start = models.DateTimeField()
+    city = models.CharField(max_length=100)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the range-scan index: (granularity, start) prefix, cities per bucket after it
+            models.UniqueConstraint(fields=['granularity', 'start', 'city'], name='unique_city_order_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.city} {self.granularity} {self.start:%Y-%m-%d %H:%M}: {self.order_count}"
+
+class FoodOrderBucket(models.Model):
+    """Order lines per food and hour/day, maintained by accounts.rollups."""
+    granularity = models.CharField(max_length=4, choices=BucketGranularity.choices)
+    start = models.DateTimeField()
+    food_item = models.ForeignKey(FoodItem, on_delete=models.CASCADE, related_name='order_buckets')
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['granularity', 'start', 'food_item'], name='unique_food_order_bucket'),
+        ]
+
     def __str__(self):
-        return f"{self.user.username} ordered {self.food_item.name}"
\ No newline at end of file
+        return f"{self.food_item_id} {self.granularity} {self.start:%Y-%m-%d %H:%M}: {self.order_count}"
@@ -0,0 +1,80 @@
+# predictor.py
+import threading
+
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+from .ai_encoding import CATEGORICAL_FEATURES, FEATURE_COLUMNS, encode_features, vocabularies
+from .model_registry import registry
+
+# Batches at least this large go through pandas/scikit-learn; smaller ones through the
+# pure-Python path, which has no per-call DataFrame overhead.
+VECTORIZED_BATCH_SIZE = 500
+
+
+class PricePredictor:
+    """
+    Online price predictions from one trained model bundle. For a LinearRegression whose
+    inputs are FEATURE_COLUMNS, a prediction is three dict lookups and a dot product in
+    plain Python (microseconds); any other model is called through scikit-learn.
+    """
+
+    def __init__(self, bundle, version=None):
+        self.version = version
+        self.model = bundle['model']
+        self.vocabularies = vocabularies(bundle)
+        self._lookups = [(self.vocabularies[column].index, self.vocabularies[column].unknown_index)
+                         for column, _ in CATEGORICAL_FEATURES]
+        names = list(getattr(self.model, 'feature_names_in_', FEATURE_COLUMNS))
+        if isinstance(self.model, LinearRegression) and names == FEATURE_COLUMNS and self.model.coef_.ndim == 1:
+            self._intercept = float(self.model.intercept_)
+            self._coef = [float(c) for c in self.model.coef_]
+        else:
+            self._coef = None
+
+    def _encode(self, user, city, item):
+        codes, unknown = [], False
+        for value, (index, unknown_index) in zip((user, city, item), self._lookups):
+            code = index.get(value)
+            if code is None:
+                code, unknown = unknown_index, True
+            codes.append(code)
+        return codes, unknown
+
+    def predict_row(self, user, city, item, quantity):
+        """(predicted price, True if user/city/item was not seen in training)."""
+        if self._coef is None:
+            return self.predict_rows([(user, city, item, quantity)])[0]
+        codes, unknown = self._encode(user, city, item)
+        price = self._intercept + sum(c * x for c, x in zip(self._coef, (*codes, float(quantity))))
+        return price, unknown
+
+    def predict(self, user, city, item, quantity):
+        return self.predict_row(user, city, item, quantity)[0]
+
+    def predict_rows(self, rows):
+        """[(price, unknown)] for (user, city, item, quantity) tuples, vectorized when the batch is large."""
+        if self._coef is not None and len(rows) < VECTORIZED_BATCH_SIZE:
+            return [self.predict_row(*row) for row in rows]
+        df = pd.DataFrame(rows, columns=['username', 'city', 'item_name', 'quantity'])
+        X, unknown = encode_features(df, self.vocabularies)
+        return list(zip(self.model.predict(X).tolist(), unknown.tolist()))
+
+
+_cache = (None, None)  # (LoadedModel, PricePredictor), replaced as a whole
+_cache_lock = threading.Lock()
+
+
+def get_predictor():
+    """PricePredictor for the registry's current model, built once per model version; None without a model."""
+    global _cache
+    loaded = registry.get()
+    if loaded is None:
+        return None
+    cached_model, predictor = _cache
+    if cached_model is loaded:
+        return predictor
+    with _cache_lock:
+        if _cache[0] is not loaded:
+            _cache = (loaded, PricePredictor(loaded.bundle, version=loaded.version))
+        return _cache[1]
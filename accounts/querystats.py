@@ -0,0 +1,158 @@
+# querystats.py
+import heapq
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_KEPT = 5
+SQL_PREVIEW_CHARS = 300
+
+
+def query_budget(max_queries):
+    """
+    Declare how many SQL queries a view may issue per request.
+    QueryStatsMiddleware reports overruns and assert_within_query_budget() fails tests on them.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+class QueryStats:
+    """Execute wrapper that counts and times every statement run while it is installed."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest = []  # min-heap of (duration, sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.total_time += duration
+            entry = (duration, sql[:SQL_PREVIEW_CHARS])
+            if len(self.slowest) < SLOWEST_KEPT:
+                heapq.heappush(self.slowest, entry)
+            else:
+                heapq.heappushpop(self.slowest, entry)
+
+    def slowest_first(self):
+        return sorted(self.slowest, reverse=True)
+
+
+class ViewReport:
+    """Running per-view totals for the staff report."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.over_budget = 0
+        self.slowest = []
+
+    def add(self, stats):
+        self.requests += 1
+        self.queries += stats.count
+        self.max_queries = max(self.max_queries, stats.count)
+        self.db_time += stats.total_time
+        if self.budget is not None and stats.count > self.budget:
+            self.over_budget += 1
+        self.slowest = heapq.nlargest(SLOWEST_KEPT, self.slowest + stats.slowest)
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'avg_queries': round(self.queries / self.requests, 2) if self.requests else 0,
+            'max_queries': self.max_queries,
+            'avg_db_ms': round(self.db_time * 1000 / self.requests, 2) if self.requests else 0,
+            'budget': self.budget,
+            'over_budget': self.over_budget,
+            'slowest': [{'ms': round(d * 1000, 2), 'sql': sql} for d, sql in sorted(self.slowest, reverse=True)],
+        }
+
+
+_reports = {}
+_reports_lock = threading.Lock()
+
+
+def report():
+    """Snapshot of per-view query statistics collected by this process."""
+    with _reports_lock:
+        return {name: view_report.as_dict() for name, view_report in sorted(_reports.items())}
+
+
+class QueryStatsMiddleware:
+    """
+    Records query count, total DB time and the slowest statements of every request.
+    Exposed as X-DB-Query-Count / X-DB-Time-Ms (and X-DB-Query-Budget when the view declares one),
+    and aggregated per view for the staff report at /staff/queries/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+
+        budget = getattr(request, '_query_budget', None)
+        response['X-DB-Query-Count'] = str(stats.count)
+        response['X-DB-Time-Ms'] = f"{stats.total_time * 1000:.2f}"
+        if budget is not None:
+            response['X-DB-Query-Budget'] = str(budget)
+            if stats.count > budget:
+                logger.warning("%s issued %d queries (budget %d): %s",
+                               request.path, stats.count, budget, request._view_name)
+
+        view_name = getattr(request, '_view_name', None)
+        if view_name:
+            with _reports_lock:
+                view_report = _reports.get(view_name)
+                if view_report is None:
+                    view_report = _reports[view_name] = ViewReport(budget)
+                view_report.add(stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_name = f"{view_func.__module__}.{view_func.__name__}"
+        request._query_budget = getattr(view_func, 'query_budget', None)
+
+
+def assert_within_query_budget(response):
+    """
+    Test helper: fail when the view behind `response` ran more queries than its
+    @query_budget. Use with the Django test client, e.g.
+        assert_within_query_budget(self.client.get('/cart/'))
+    """
+    if 'X-DB-Query-Count' not in response:
+        raise AssertionError("Response has no query stats; is QueryStatsMiddleware installed?")
+    if 'X-DB-Query-Budget' not in response:
+        raise AssertionError("The view does not declare a @query_budget")
+    count, budget = int(response['X-DB-Query-Count']), int(response['X-DB-Query-Budget'])
+    if count > budget:
+        raise AssertionError(f"View issued {count} queries, over its budget of {budget}")
+
+
+class QueryBudgetTestMixin:
+    """TestCase mixin exposing assert_within_query_budget as an assertion method."""
+
+    def assertWithinQueryBudget(self, response):
+        try:
+            assert_within_query_budget(response)
+        except AssertionError as exc:
+            self.fail(str(exc))
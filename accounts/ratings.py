@@ -0,0 +1,38 @@
+# ratings.py
+from django.db.models import Avg, Count, DecimalField, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .catalog_cache import bump_catalog_version
+from .models import FoodItem, Review
+
+
+def refresh_rating(food_id):
+    """
+    Recompute FoodItem.rating_avg / rating_count from its reviews in a single UPDATE,
+    so concurrent review writes can never leave the two columns out of step.
+    """
+    reviews = Review.objects.filter(food_item=OuterRef('pk')).order_by().values('food_item')
+    FoodItem.objects.filter(pk=food_id).update(
+        rating_avg=Coalesce(
+            Subquery(reviews.annotate(avg=Avg('rating')).values('avg'),
+                     output_field=DecimalField(max_digits=3, decimal_places=2)),
+            Value(0), output_field=DecimalField(max_digits=3, decimal_places=2),
+        ),
+        rating_count=Coalesce(
+            Subquery(reviews.annotate(count=Count('id')).values('count'), output_field=IntegerField()),
+            Value(0),
+        ),
+        updated_at=timezone.now(),
+    )
+    # update() skips FoodItem signals; cached cards show the rating
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_rating(instance.food_item_id)
@@ -0,0 +1,193 @@
+# rollups.py
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import BucketGranularity, CityFoodCount, CityOrderBucket, CityOrderCount, FoodOrderBucket, Order, OrderLine, UserOrderCount
+
+# City key under which CityFoodCount and CityOrderCount keep totals across every city.
+ALL_CITIES = '*'
+
+
+def city_key(city):
+    """Normalized city used as rollup key, so 'Delhi ' and 'delhi' share a row."""
+    return (city or '').strip().lower()
+
+
+def _bump(model, deltas, field, defaults=None):
+    """
+    Upsert `field += delta` for every `{keys_tuple: delta}` in `deltas`, where each keys
+    tuple is a tuple of (field, value) pairs identifying one row. `defaults` optionally maps
+    a keys tuple to extra values for the row when it has to be inserted.
+    Missing rows are inserted in one INSERT that ignores existing keys, then one UPDATE
+    is issued per distinct delta, so the cost does not grow with the number of keys.
+    A single key tries its UPDATE first and only inserts when no row matched.
+    """
+    defaults = defaults or {}
+    by_delta = defaultdict(list)
+    for keys, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(keys)
+    if not by_delta:
+        return
+
+    if len(deltas) == 1:
+        (keys, delta), = deltas.items()
+        queryset = model.objects.filter(**dict(keys))
+        if delta < 0:
+            queryset = queryset.filter(**{f'{field}__gte': -delta})
+        if queryset.update(**{field: F(field) + delta}) or delta < 0:
+            return
+
+    created = [model(**dict(keys), **defaults.get(keys, {}), **{field: 0})
+               for delta, rows in by_delta.items() if delta > 0 for keys in rows]
+    if created:
+        model.objects.bulk_create(created, ignore_conflicts=True)
+    for delta, rows in by_delta.items():
+        match = Q()
+        for keys in rows:
+            match |= Q(**dict(keys))
+        queryset = model.objects.filter(match)
+        if delta < 0:
+            queryset = queryset.filter(**{f'{field}__gte': -delta})
+        queryset.update(**{field: F(field) + delta})
+
+
+def bucket_start(moment, granularity):
+    """First instant (in TIME_ZONE) of the hour or day bucket that `moment` falls in."""
+    start = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    return start.replace(hour=0) if granularity == BucketGranularity.DAY else start
+
+
+def record_lines(lines, sign=1):
+    """
+    Apply newly inserted (sign=1) or deleted (sign=-1) order lines to the rollup tables.
+    Called from the OrderLine signals below; bulk_create callers must call it themselves.
+    """
+    food_counts, food_buckets = Counter(), Counter()
+    for line in lines:
+        food_counts[(city_key(line.order.city), line.food_item_id)] += 1
+        food_counts[(ALL_CITIES, line.food_item_id)] += 1
+        for granularity in BucketGranularity.values:
+            food_buckets[(granularity, bucket_start(line.order.timestamp, granularity), line.food_item_id)] += 1
+
+    _bump(CityFoodCount, {(('city', city), ('food_item_id', food_id)): sign * count
+                          for (city, food_id), count in food_counts.items()}, 'order_count')
+    _bump(FoodOrderBucket, {(('granularity', granularity), ('start', start), ('food_item_id', food_id)): sign * count
+                            for (granularity, start, food_id), count in food_buckets.items()}, 'order_count')
+
+
+def record_orders(orders, sign=1):
+    """
+    Apply inserted (sign=1) or deleted (sign=-1) orders to the per-city and per-user counts.
+    Called from the Order signals below; bulk_create callers must call it themselves.
+    """
+    city_counts, user_counts, city_buckets, labels = Counter(), Counter(), Counter(), {}
+    for order in orders:
+        key = city_key(order.city)
+        city_counts[key] += 1
+        city_counts[ALL_CITIES] += 1
+        user_counts[order.user_id] += 1
+        labels.setdefault((('city', key),), {'label': (order.city or '').strip()})
+        for granularity in BucketGranularity.values:
+            start = bucket_start(order.timestamp, granularity)
+            city_buckets[(granularity, start, key)] += 1
+            city_buckets[(granularity, start, ALL_CITIES)] += 1
+
+    _bump(CityOrderCount, {(('city', city),): sign * count for city, count in city_counts.items()},
+          'order_count', defaults=labels)
+    _bump(UserOrderCount, {(('user_id', user_id),): sign * count for user_id, count in user_counts.items()},
+          'order_count')
+    _bump(CityOrderBucket, {(('granularity', granularity), ('start', start), ('city', city)): sign * count
+                            for (granularity, start, city), count in city_buckets.items()}, 'order_count')
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute every rollup table from the orders. Used by the rebuild_rollups command for repair."""
+    food_counts = Counter()
+    rows = OrderLine.objects.values('order__city', 'food_item').annotate(total=Count('id')).order_by()
+    for row in rows:
+        food_counts[(city_key(row['order__city']), row['food_item'])] += row['total']
+        food_counts[(ALL_CITIES, row['food_item'])] += row['total']
+
+    city_counts, labels = Counter(), {}
+    for row in Order.objects.values('city').annotate(total=Count('id')).order_by('city'):
+        key = city_key(row['city'])
+        city_counts[key] += row['total']
+        city_counts[ALL_CITIES] += row['total']
+        labels.setdefault(key, (row['city'] or '').strip())
+    user_counts = list(Order.objects.values('user').annotate(total=Count('id')).order_by())
+
+    # Buckets depend on TIME_ZONE, so they are cut here rather than with database date functions
+    city_buckets, food_buckets = Counter(), Counter()
+    for timestamp, city in Order.objects.values_list('timestamp', 'city').iterator(chunk_size=2000):
+        for granularity in BucketGranularity.values:
+            start = bucket_start(timestamp, granularity)
+            city_buckets[(granularity, start, city_key(city))] += 1
+            city_buckets[(granularity, start, ALL_CITIES)] += 1
+    lines = OrderLine.objects.values_list('order__timestamp', 'food_item')
+    for timestamp, food_id in lines.iterator(chunk_size=2000):
+        for granularity in BucketGranularity.values:
+            food_buckets[(granularity, bucket_start(timestamp, granularity), food_id)] += 1
+
+    CityFoodCount.objects.all().delete()
+    CityFoodCount.objects.bulk_create(
+        [CityFoodCount(city=city, food_item_id=food_id, order_count=count)
+         for (city, food_id), count in food_counts.items()],
+        batch_size=1000,
+    )
+    CityOrderCount.objects.all().delete()
+    CityOrderCount.objects.bulk_create(
+        [CityOrderCount(city=city, label=labels.get(city, ''), order_count=count)
+         for city, count in city_counts.items()],
+        batch_size=1000,
+    )
+    UserOrderCount.objects.all().delete()
+    UserOrderCount.objects.bulk_create(
+        [UserOrderCount(user_id=row['user'], order_count=row['total']) for row in user_counts],
+        batch_size=1000,
+    )
+    CityOrderBucket.objects.all().delete()
+    CityOrderBucket.objects.bulk_create(
+        [CityOrderBucket(granularity=granularity, start=start, city=city, order_count=count)
+         for (granularity, start, city), count in city_buckets.items()],
+        batch_size=1000,
+    )
+    FoodOrderBucket.objects.all().delete()
+    FoodOrderBucket.objects.bulk_create(
+        [FoodOrderBucket(granularity=granularity, start=start, food_item_id=food_id, order_count=count)
+         for (granularity, start, food_id), count in food_buckets.items()],
+        batch_size=1000,
+    )
+    return {'city_food_counts': len(food_counts), 'city_order_counts': len(city_counts),
+            'user_order_counts': len(user_counts), 'city_order_buckets': len(city_buckets),
+            'food_order_buckets': len(food_buckets)}
+
+
+@receiver(post_save, sender=Order)
+def order_created(sender, instance, created, raw=False, **kwargs):
+    # Batch writers (accounts.ingest.flush) mark their orders and call record_orders() once
+    if created and not raw and not getattr(instance, 'rollups_deferred', False):
+        record_orders([instance])
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    record_orders([instance], sign=-1)
+
+
+@receiver(post_save, sender=OrderLine)
+def order_line_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_lines([instance])
+
+
+@receiver(post_delete, sender=OrderLine)
+def order_line_deleted(sender, instance, **kwargs):
+    # Cascaded deletes run before the Order row itself goes, so instance.order still loads
+    record_lines([instance], sign=-1)
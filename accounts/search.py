@@ -0,0 +1,210 @@
+# search.py
+import re
+
+from django.db import connection, DatabaseError
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FoodItem
+
+# SQLite keeps a standalone FTS5 table whose rowid is the FoodItem id.
+# MySQL uses FULLTEXT indexes on accounts_fooditem itself (maintained by InnoDB).
+# Both are created by migration 0013.
+FTS_TABLE = 'accounts_fooditem_fts'
+
+# Ranked ids returned per search; the listing never shows more than this.
+SEARCH_RESULT_LIMIT = 500
+MAX_QUERY_TERMS = 8
+
+TOKEN_RE = re.compile(r'(-?)"([^"]*)"|(-?)(\w+)', re.UNICODE)
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class ParsedQuery:
+    """
+    Search box input split into required words, quoted phrases and excluded words.
+    Bare words are matched as prefixes so "bir" finds "Biryani".
+    """
+
+    def __init__(self, terms=None, phrases=None, excluded=None):
+        self.terms = terms or []
+        self.phrases = phrases or []
+        self.excluded = excluded or []
+
+    def __bool__(self):
+        return bool(self.terms or self.phrases or self.excluded)
+
+    @property
+    def required(self):
+        """True if some word or phrase must match; exclusions alone cannot drive an index lookup."""
+        return bool(self.terms or self.phrases)
+
+    def __repr__(self):
+        return f"ParsedQuery(terms={self.terms}, phrases={self.phrases}, excluded={self.excluded})"
+
+
+def parse_query(raw: str) -> ParsedQuery:
+    """
+    Parse `q` into a ParsedQuery.
+    Supports bare words, "quoted phrases" and -excluded words; everything else is dropped,
+    so the result is always safe to splice into an FTS5 / MySQL boolean expression.
+    """
+    parsed = ParsedQuery()
+    count = 0
+    for match in TOKEN_RE.finditer((raw or '').lower()):
+        if count >= MAX_QUERY_TERMS:
+            break
+        negate_phrase, phrase, negate_word, word = match.groups()
+        if phrase is not None:
+            words = WORD_RE.findall(phrase)
+            if not words:
+                continue
+            if negate_phrase:
+                parsed.excluded.append(' '.join(words))
+            elif len(words) == 1:
+                parsed.terms.append(words[0])
+            else:
+                parsed.phrases.append(' '.join(words))
+        elif negate_word:
+            parsed.excluded.append(word)
+        else:
+            parsed.terms.append(word)
+        count += 1
+    return parsed
+
+
+def _fts5_expression(parsed):
+    required = [f'"{term}"*' for term in parsed.terms]
+    required += [f'"{phrase}"' for phrase in parsed.phrases]
+    expression = ' AND '.join(required)
+    for excluded in parsed.excluded:
+        expression = f'({expression}) NOT "{excluded}"'
+    return expression
+
+
+def _mysql_expression(parsed):
+    parts = [f'+{term}*' for term in parsed.terms]
+    parts += [f'+"{phrase}"' for phrase in parsed.phrases]
+    parts += [f'-"{excluded}"' for excluded in parsed.excluded]
+    return ' '.join(parts)
+
+
+def search_food_ids(parsed: ParsedQuery, limit: int = SEARCH_RESULT_LIMIT):
+    """
+    Return FoodItem ids matching `parsed`, best match first.
+    Name matches outrank description matches. Returns None when the current
+    database has no full-text index, so callers can fall back to LIKE filtering.
+    """
+    if not parsed.required:
+        return []
+    vendor = connection.vendor
+    try:
+        with connection.cursor() as cursor:
+            if vendor == 'sqlite':
+                # bm25() is lower-is-better; weight the name column 10x over description.
+                cursor.execute(
+                    f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                    f"ORDER BY bm25({FTS_TABLE}, 10.0, 1.0) LIMIT %s",
+                    [_fts5_expression(parsed), limit],
+                )
+            elif vendor == 'mysql':
+                expression = _mysql_expression(parsed)
+                cursor.execute(
+                    "SELECT id FROM accounts_fooditem "
+                    "WHERE MATCH(name, description) AGAINST (%s IN BOOLEAN MODE) "
+                    "ORDER BY 2 * MATCH(name) AGAINST (%s IN BOOLEAN MODE) "
+                    "+ MATCH(name, description) AGAINST (%s IN BOOLEAN MODE) DESC, id "
+                    "LIMIT %s",
+                    [expression, expression, expression, limit],
+                )
+            else:
+                return None
+            return [row[0] for row in cursor.fetchall()]
+    except DatabaseError:
+        # Index not built on this database (e.g. FTS5 unavailable); use the slow path.
+        return None
+
+
+def _fallback_filter(queryset, parsed):
+    for term in parsed.terms + parsed.phrases:
+        queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+    for excluded in parsed.excluded:
+        queryset = queryset.exclude(Q(name__icontains=excluded) | Q(description__icontains=excluded))
+    return queryset
+
+
+def apply_search(queryset, raw_query: str):
+    """
+    Restrict a FoodItem queryset to search matches for `raw_query`, ordered by relevance
+    (annotated as `search_rank`, 0 = best). Callers may re-order afterwards for explicit sorts.
+    """
+    parsed = parse_query(raw_query)
+    if not parsed:
+        return queryset
+    if not parsed.required:
+        # Only -excluded words: keep the listing's order and drop the matching rows
+        return _fallback_filter(queryset, parsed)
+    ids = search_food_ids(parsed)
+    if ids is None:
+        return _fallback_filter(queryset, parsed)
+    if not ids:
+        return queryset.none()
+    ranking = Case(
+        *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).annotate(search_rank=ranking).order_by('search_rank')
+
+
+# -----------------------------
+# Index maintenance
+# -----------------------------
+def rebuild_index(conn=connection):
+    """
+    Repopulate the SQLite FTS table from accounts_fooditem.
+    MySQL FULLTEXT indexes are maintained by the server, so there is nothing to do there.
+    Returns the number of indexed rows, or None when the backend needs no rebuild.
+    """
+    if conn.vendor != 'sqlite':
+        return None
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+            f"SELECT id, name, COALESCE(description, '') FROM accounts_fooditem"
+        )
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def _sqlite_index_ready():
+    return connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+
+
+@receiver(post_save, sender=FoodItem)
+def index_food_item(sender, instance, raw=False, **kwargs):
+    if raw or connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [instance.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+                [instance.pk, instance.name, instance.description or ''],
+            )
+    except DatabaseError:
+        if _sqlite_index_ready():
+            raise
+
+
+@receiver(post_delete, sender=FoodItem)
+def unindex_food_item(sender, instance, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [instance.pk])
+    except DatabaseError:
+        if _sqlite_index_ready():
+            raise
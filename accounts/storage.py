@@ -0,0 +1,52 @@
+# storage.py
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Basename of a content-addressed file or one of its derivatives (see accounts.images)
+CONTENT_ADDRESSED_RE = re.compile(r'^[0-9a-f]{64}(_\d+w)?\.\w+$')
+
+
+def content_digest(content):
+    """SHA-256 hex digest of a Django File, read in chunks and rewound afterwards."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def content_name(name, digest):
+    """`food_images/pizza.JPG` + digest -> `food_images/<digest>.jpg`."""
+    dirname = os.path.dirname(name)
+    ext = os.path.splitext(name)[1].lower()
+    return f"{dirname}/{digest}{ext}" if dirname else f"{digest}{ext}"
+
+
+def is_content_addressed(name):
+    return bool(CONTENT_ADDRESSED_RE.match(os.path.basename(name)))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File storage that names every upload after the SHA-256 of its bytes.
+    Re-uploading an identical picture reuses the existing file instead of writing a
+    `_AbC123` copy, and since a name can never change content it may be cached forever.
+    """
+
+    def _save(self, name, content):
+        target = content_name(name, content_digest(content))
+        if self.exists(target):
+            return target
+        # Write under a unique temporary name, then move into place atomically;
+        # a concurrent upload of the same bytes just replaces it with identical content.
+        temporary = super()._save(self.get_available_name(name), content)
+        os.replace(self.path(temporary), self.path(target))
+        return target
+
+
+content_addressed_storage = ContentAddressedStorage()
@@ -0,0 +1,26 @@
+from django import template
+
+from accounts.images import existing_derivatives
+
+register = template.Library()
+
+
+def _srcset(pairs):
+    return ', '.join(f"{url} {width}w" for url, width in pairs)
+
+
+@register.inclusion_tag('accounts/partials/food_picture.html')
+def food_picture(image, alt='', sizes='100vw', css_class='', style=''):
+    """
+    <picture> for a food image: WebP and JPEG srcsets from the derivative pipeline,
+    with the original upload as the fallback src.
+    """
+    return {
+        'src': image.url if image else '',
+        'webp_srcset': _srcset(existing_derivatives(image, 'webp')),
+        'jpeg_srcset': _srcset(existing_derivatives(image, 'jpg')),
+        'alt': alt,
+        'sizes': sizes,
+        'css_class': css_class,
+        'style': style,
+    }
@@ -0,0 +1,18 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def star_icons(rating):
+    """Font Awesome classes for five stars: full, half (>= .5) or empty."""
+    rating = float(rating or 0)
+    icons = []
+    for position in range(1, 6):
+        if rating >= position:
+            icons.append('fas fa-star')
+        elif rating >= position - 0.5:
+            icons.append('fas fa-star-half-alt')
+        else:
+            icons.append('far fa-star')
+    return icons
@@ -1,3 +1,1326 @@
-from django.test import TestCase
+# tests.py
+import base64
+import io
+import json
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+import numpy as np
+import pandas as pd
+from PIL import Image
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.preprocessing import LabelEncoder
+
+from . import checkout, delivery, history, images, ingest, rollups, tracking
+from .ai_encoding import FEATURE_COLUMNS, Vocabulary, encode_features, fit_price_model, vocabularies
+from .ai_utils import get_order_data, overall_stats, suggest_top_food_for_state, train_price_model
+from .analytics import order_series, parse_range
+from .cart import SESSION_CART_KEY, add_item, cart_quantities, change_quantity, price_cart, remove_item
+from .catalog_cache import catalog_version
+from .model_registry import ModelRegistry, registry
+from .models import (
+    BucketGranularity, CartItem, CityFoodCount, CityOrderBucket, CityOrderCount, Cuisine, Diet, FoodItem, FoodOrderBucket,
+    Order, OrderHistoryEntry, OrderIngest, OrderLine, OrderStatus, Review, Tag, UserOrderCount, infer_cuisine, infer_diet,
+)
+from .predictor import VECTORIZED_BATCH_SIZE, PricePredictor, get_predictor
+from .querystats import QueryBudgetTestMixin
+from .search import apply_search
+from .storage import content_addressed_storage, content_digest, is_content_addressed
+
+
+def make_food(owner, name, price='100.00', description=''):
+    # An image name with no file behind it: derivatives are only scheduled on commit,
+    # which never happens inside a TestCase
+    return FoodItem.objects.create(name=name, description=description, price=Decimal(price),
+                                   image='food_images/test.jpg', added_by=owner)
+
+
+def image_bytes(size=(400, 300), color='red', fmt='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def b64_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def listed_names(html):
+    """Food names on rendered food cards, in listing order."""
+    return re.findall(r'<h5 class="card-title mb-2">([^<]*)</h5>', html)
+
+
+class MediaRootMixin:
+    """Runs each test against an empty temporary MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+
+class OrderDataMixin:
+    """A staff user, a customer with a city and a small menu."""
+
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user('staff', 'staff@dyno.com', 'pw', is_staff=True)
+        self.user = User.objects.create_user('asha', 'asha@example.com', 'pw')
+        self.user.profile.city = 'Pune'
+        self.user.profile.save()
+        self.foods = [make_food(self.staff, f'Dish {i}', price=f'{100 + 10 * i}.00') for i in range(6)]
+
+    def order(self, user=None, foods=None, quantity=1):
+        user = user or self.user
+        return checkout.create_order(user, [(food, quantity, food.price) for food in (foods or self.foods[:2])])
+
+
+class QueryBudgetTests(OrderDataMixin, QueryBudgetTestMixin, TransactionTestCase):
+    """
+    The @query_budget of the busiest views holds with realistic data. Not a TestCase: its
+    wrapping transaction turns each request's transaction into savepoint queries production never runs.
+    """
+
+    def setUp(self):
+        # Transactions commit here, so uploads would reach the image worker pool; there are no files
+        patcher = mock.patch('accounts.images.schedule_derivatives')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+        self.client.login(username='asha', password='pw')
+
+    def test_home(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('home')))
+        self.assertWithinQueryBudget(self.client.get(reverse('home'), {'q': 'dish', 'sort': 'price_low'}))
+
+    def test_home_feed(self):
+        for i in range(20):
+            make_food(self.staff, f'Extra {i}')
+        response = self.client.get(reverse('home_feed'), {'sort': 'price_low'})
+        self.assertWithinQueryBudget(response)
+        cursor = response.json()['next_cursor']
+        self.assertIsNotNone(cursor)
+        self.assertWithinQueryBudget(self.client.get(reverse('home_feed'), {'sort': 'price_low', 'cursor': cursor}))
+
+    def test_orders_view(self):
+        for _ in range(25):
+            self.order()
+        yesterday = timezone.now() - timedelta(days=1)
+        Order.objects.update(timestamp=yesterday, delivery_due_at=yesterday + timedelta(minutes=30))
+        response = self.client.get(reverse('orders'))
+        self.assertWithinQueryBudget(response)
+        self.assertIsNotNone(response.context['next_cursor'])
+        self.assertWithinQueryBudget(self.client.get(reverse('orders'), {'cursor': response.context['next_cursor']}))
+
+    def test_order_all_first_and_repeat_order(self):
+        for food in self.foods:
+            add_item(self.user, food.id, 2)
+        self.assertWithinQueryBudget(self.client.post(reverse('order_all')))
+        for food in self.foods[:3]:
+            add_item(self.user, food.id)
+        self.assertWithinQueryBudget(self.client.post(reverse('order_all')))
+        self.assertEqual(UserOrderCount.objects.get(user=self.user).order_count, 2)
+
+
+class SearchTests(OrderDataMixin, TestCase):
+
+    def search(self, raw):
+        return list(apply_search(FoodItem.objects.order_by('id'), raw).values_list('name', flat=True))
+
+    def test_prefix_match_follows_edits(self):
+        biryani = make_food(self.staff, 'Chicken Biryani')
+        self.assertEqual(self.search('bir'), ['Chicken Biryani'])
+        biryani.name = 'Chicken Pulao'
+        biryani.save()
+        self.assertEqual(self.search('bir'), [])
+        self.assertEqual(self.search('pulao'), ['Chicken Pulao'])
+        biryani.delete()
+        self.assertEqual(self.search('pulao'), [])
+
+    def test_exclusion_only_query(self):
+        make_food(self.staff, 'Pizza Margherita')
+        make_food(self.staff, 'Paneer Pizza')
+        self.assertEqual(set(self.search('-pizza')), {food.name for food in self.foods})
+
+    def test_terms_with_exclusion(self):
+        make_food(self.staff, 'Pizza Margherita')
+        make_food(self.staff, 'Paneer Pizza')
+        self.assertEqual(self.search('pizza -paneer'), ['Pizza Margherita'])
+
+
+class DietTests(OrderDataMixin, TestCase):
+
+    def test_inferred_diet_and_cuisine(self):
+        cases = [
+            ('Paneer Tikka (veg)', Diet.VEG),
+            ('Vegetarian thali', Diet.VEG),
+            ('Veggie burger', Diet.VEG),
+            ('Non-veg platter', Diet.NONVEG),
+            ('Chicken curry, nonveg', Diet.NONVEG),
+            ('Non veg biryani', Diet.NONVEG),
+            ('Vegetable soup', ''),
+            ('Chicken curry', ''),
+        ]
+        for text, diet in cases:
+            self.assertEqual(infer_diet(text), diet, text)
+        self.assertEqual(infer_cuisine('Authentic South Indian dosa'), Cuisine.SOUTH_INDIAN)
+        self.assertEqual(infer_cuisine('indian curry'), Cuisine.INDIAN)
+        self.assertEqual(infer_cuisine('Fish and chips'), '')
+
+    def test_diet_filters_on_home_and_feed(self):
+        FoodItem.objects.filter(id__in=[f.id for f in self.foods[:2]]).update(diet=Diet.VEG)
+        FoodItem.objects.filter(id=self.foods[2].id).update(diet=Diet.NONVEG, cuisine=Cuisine.CHINESE)
+        veg = {f.name for f in self.foods[:2]}
+        everything = {f.name for f in self.foods}
+        cases = [
+            ({'veg': '1'}, veg),
+            ({'nonveg': '1'}, {self.foods[2].name}),
+            ({'veg': '1', 'nonveg': '1'}, everything),
+            ({'nonveg': '1', 'cuisine': 'Chinese'}, {self.foods[2].name}),
+            ({'veg': '1', 'cuisine': 'Chinese'}, set()),
+            ({}, everything),
+        ]
+        for params, expected in cases:
+            home = self.client.get(reverse('home'), params)
+            self.assertEqual(set(listed_names(home.context['listing']['html'])), expected, params)
+            feed = self.client.get(reverse('home_feed'), params)
+            self.assertEqual(set(listed_names(feed.json()['html'])), expected, params)
+
+
+class CursorTests(OrderDataMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(username='asha', password='pw')
+
+    def test_feed_pages_cover_the_listing_once(self):
+        for i in range(30):
+            make_food(self.staff, f'Extra {i}', price=f'{50 + i % 7}.00')
+        for sort in ('price_low', 'price_high', 'rating', ''):
+            names, cursor = [], None
+            while True:
+                params = {'sort': sort, 'cursor': cursor} if cursor else {'sort': sort}
+                page = self.client.get(reverse('home_feed'), params).json()
+                names += listed_names(page['html'])
+                cursor = page['next_cursor']
+                if not cursor:
+                    break
+            self.assertEqual(sorted(names), sorted(FoodItem.objects.values_list('name', flat=True)), sort)
+
+    def test_home_feed_ignores_bad_cursors(self):
+        first_page = listed_names(self.client.get(reverse('home_feed'), {'sort': 'price_low'}).json()['html'])
+        for values in (['abc', 1], [{'a': 1}], [{'a': 1}, 2], [None, 2], [[1], 2]):
+            response = self.client.get(reverse('home_feed'), {'sort': 'price_low', 'cursor': b64_cursor(values)})
+            self.assertEqual(response.status_code, 200, values)
+            self.assertEqual(listed_names(response.json()['html']), first_page, values)
+        response = self.client.get(reverse('home_feed'), {'sort': 'price_low', 'cursor': 'not base64!'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_orders_view_ignores_bad_cursors(self):
+        for cursor in ('WyJ4IiwxXQ', b64_cursor(['2024-01-01', 'x']), b64_cursor([1])):
+            self.assertEqual(self.client.get(reverse('orders'), {'cursor': cursor}).status_code, 200)
+
+
+class SuggestionTests(OrderDataMixin, TestCase):
+    """suggest_top_food_for_state reads the CityFoodCount rollup kept up to date by orders."""
+
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+        self.other.profile.city = 'Delhi'
+        self.other.profile.save()
+        for count, food in zip((3, 1, 2), self.foods[:3]):
+            for _ in range(count):
+                self.order(foods=[food])
+        for _ in range(5):
+            self.order(user=self.other, foods=[self.foods[4]])
+
+    def test_city_match_ignores_case_and_whitespace(self):
+        expected = [self.foods[0], self.foods[2], self.foods[1]]
+        for city in ('Pune', ' pune ', 'PUNE'):
+            self.assertEqual(suggest_top_food_for_state(city), expected, city)
+
+    def test_limit(self):
+        self.assertEqual(suggest_top_food_for_state('Pune', limit=2), [self.foods[0], self.foods[2]])
+        self.assertEqual(len(suggest_top_food_for_state('', limit=3)), 3)
+
+    def test_empty_or_unknown_city_falls_back_to_global_counts(self):
+        expected = [self.foods[4], self.foods[0], self.foods[2], self.foods[1]]
+        self.assertEqual(suggest_top_food_for_state(''), expected)
+        self.assertEqual(suggest_top_food_for_state('Goa'), expected)
+
+    def test_deleted_orders_drop_out(self):
+        Order.objects.filter(user=self.other).delete()
+        self.assertEqual(suggest_top_food_for_state('Delhi'), [self.foods[0], self.foods[2], self.foods[1]])
+
+    def test_home_shows_the_users_city(self):
+        self.client.login(username='asha', password='pw')
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['suggested_foods'], [self.foods[0], self.foods[2], self.foods[1]])
+
+
+class CatalogCacheTests(OrderDataMixin, TestCase):
+    """Cached home listings are keyed by normalized filters and dropped on every catalog change."""
+
+    def listed(self, params=None, view='home_feed'):
+        response = self.client.get(reverse(view), params or {})
+        if view == 'home':
+            return listed_names(response.context['listing']['html'])
+        return listed_names(response.json()['html'])
+
+    def assert_bumps_version(self, change):
+        before = catalog_version()
+        change()
+        self.assertGreater(catalog_version(), before)
+
+    def test_food_review_and_tag_changes_bump_the_version(self):
+        food = self.foods[0]
+        spicy = Tag.objects.create(name='spicy')
+        self.assert_bumps_version(lambda: make_food(self.staff, 'New dish'))
+        self.assert_bumps_version(lambda: FoodItem.objects.get(name='New dish').delete())
+        self.assert_bumps_version(lambda: setattr(food, 'name', 'Renamed') or food.save())
+        self.assert_bumps_version(lambda: Review.objects.create(food_item=food, user=self.user, rating=4))
+        self.assert_bumps_version(lambda: Review.objects.get(food_item=food).delete())
+        self.assert_bumps_version(lambda: food.tags.add(spicy))
+        self.assert_bumps_version(lambda: food.tags.remove(spicy))
+        self.assert_bumps_version(lambda: spicy.food_items.add(food))
+        self.assert_bumps_version(lambda: spicy.food_items.clear())
+
+    def test_cached_listings_follow_catalog_changes(self):
+        names = self.listed()
+        self.assertEqual(names, [food.name for food in self.foods])
+        food = self.foods[0]
+        food.name = 'Renamed dish'
+        food.save()
+        self.assertEqual(self.listed()[0], 'Renamed dish')
+        make_food(self.staff, 'Brand new dish')
+        self.assertIn('Brand new dish', self.listed())
+        food.delete()
+        self.assertNotIn('Renamed dish', self.listed())
+
+        spicy = Tag.objects.create(name='spicy')
+        self.assertEqual(self.listed({'tag': 'spicy'}), [])
+        self.foods[1].tags.add(spicy)
+        self.assertEqual(self.listed({'tag': 'spicy'}), [self.foods[1].name])
+        Review.objects.create(food_item=self.foods[2], user=self.user, rating=5)
+        self.assertEqual(self.listed({'sort': 'rating'})[0], self.foods[2].name)
+
+    def test_unknown_filter_values_cannot_poison_the_unfiltered_listing(self):
+        everything = [food.name for food in self.foods]
+        self.assertEqual(self.listed({'cuisine': 'bogus'}), everything)
+        self.assertEqual(self.listed({'cuisine': 'bogus'}, view='home'), everything)
+        self.assertEqual(self.listed(view='home'), everything)
+        self.assertEqual(self.listed({'sort': 'bogus'}), everything)
+        self.assertEqual(self.listed(), everything)
+
+    def test_tag_filter_ignores_case(self):
+        self.foods[3].tags.add(Tag.objects.create(name='spicy'))
+        self.assertEqual(self.listed({'tag': 'Spicy'}), [self.foods[3].name])
+        self.assertEqual(self.listed({'tag': ' spicy '}), [self.foods[3].name])
+        self.assertEqual(self.listed({'tag': 'SPICY'}, view='home'), [self.foods[3].name])
+
+
+class FoodDetailJsonTests(OrderDataMixin, TestCase):
+    """food_detail_json revalidates cheaply and its ETag moves with anything it renders."""
+
+    def setUp(self):
+        super().setUp()
+        self.food = self.foods[0]
+        self.url = reverse('food_detail_json', args=[self.food.id])
+        self.client.login(username='asha', password='pw')
+
+    def assert_changed(self, etag):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def test_matching_validators_answer_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertEqual(response.json()['name'], self.food.name)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_reviews_and_tags_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(reverse('submit_review', args=[self.food.id]), {'rating': 4, 'comment': 'Good'})
+        response = self.assert_changed(etag)
+        self.assertEqual(response.json()['rating_count'], 1)
+        self.assertEqual(response.json()['reviews'][0]['comment'], 'Good')
+
+        spicy = Tag.objects.create(name='spicy')
+        etag = response['ETag']
+        self.food.tags.add(spicy)
+        etag = self.assert_changed(etag)['ETag']
+        spicy.food_items.clear()
+        response = self.assert_changed(etag)
+        self.assertEqual(response.json()['tags'], [])
+
+    def test_missing_food(self):
+        self.assertEqual(self.client.get(reverse('food_detail_json', args=[999999])).status_code, 404)
+
+
+class ImageDerivativeTests(MediaRootMixin, OrderDataMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.name = 'food_images/test.jpg'
+        os.makedirs(os.path.join(self.media_root, 'food_images'))
+        with open(os.path.join(self.media_root, self.name), 'wb') as f:
+            f.write(image_bytes())
+        images._pending.clear()
+        self.addCleanup(images._pending.clear)
+
+    def test_render_writes_every_smaller_width_in_both_formats(self):
+        written = images.render_derivatives(self.media_root, self.name)
+        expected = [images.derivative_name(self.name, width, ext) for width in (160, 320) for ext in ('jpg', 'webp')]
+        self.assertEqual(written, expected)
+        for derived in written:
+            with Image.open(os.path.join(self.media_root, derived)) as image:
+                self.assertEqual(image.width, int(derived.rsplit('_', 1)[1].split('w')[0]))
+        directory = os.path.dirname(os.path.join(self.media_root, written[0]))
+        self.assertFalse([entry for entry in os.listdir(directory) if entry.endswith('.part')])
+
+        self.assertEqual(images.render_derivatives(self.media_root, self.name), [])
+        self.assertEqual(images.render_derivatives(self.media_root, self.name, force=True), expected)
+        urls = images.existing_derivatives(self.foods[0].image, 'webp')
+        self.assertEqual([width for _, width in urls], [160, 320])
+
+    def test_jobs_are_shared_per_image(self):
+        pending = Future()
+        executor = mock.Mock(**{'submit.return_value': pending})
+        with mock.patch('accounts.images._get_executor', return_value=executor):
+            self.assertIs(images.schedule_derivatives(self.name), pending)
+            self.assertIs(images.schedule_derivatives(self.name), pending)
+        self.assertEqual(executor.submit.call_count, 1)
+        pending.set_result([])
+        self.assertEqual(images._pending, {})
+
+    def test_finished_job_touches_foods_without_closing_the_request_connection(self):
+        done = Future()
+        done.set_result(['derived/food_images/test_160w.webp'])
+        FoodItem.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        executor = mock.Mock(**{'submit.return_value': done})
+        with mock.patch('accounts.images._get_executor', return_value=executor), \
+                mock.patch('accounts.images.close_old_connections') as close:
+            images.schedule_derivatives(self.name)
+        close.assert_not_called()
+        self.assertFalse(FoodItem.objects.filter(updated_at__lt=timezone.now() - timedelta(hours=1)).exists())
+        self.assertEqual(images._pending, {})
+
+    def test_pool_thread_callback_manages_its_own_connection(self):
+        done = Future()
+        done.set_result(['derived/food_images/test_160w.webp'])
+        other_thread = threading.get_ident() + 1
+        with mock.patch('accounts.images.close_old_connections') as close:
+            images._derivatives_done(self.name, other_thread, done)
+        self.assertEqual(close.call_count, 2)
+
+    def test_failed_job_is_logged_and_forgotten(self):
+        failed = Future()
+        failed.set_exception(OSError('cannot identify image file'))
+        images._pending[self.name] = failed
+        with self.assertLogs('accounts.images', 'ERROR'):
+            images._derivatives_done(self.name, threading.get_ident(), failed)
+        self.assertEqual(images._pending, {})
+
+
+class ContentAddressedStorageTests(MediaRootMixin, TestCase):
+
+    def stored_files(self):
+        return sorted(os.listdir(os.path.join(self.media_root, 'food_images')))
+
+    def test_identical_uploads_share_one_file(self):
+        data = image_bytes()
+        first = content_addressed_storage.save('food_images/pizza.JPG', ContentFile(data))
+        second = content_addressed_storage.save('food_images/other name.jpg', ContentFile(data))
+        self.assertEqual(first, second)
+        self.assertEqual(first, f'food_images/{content_digest(ContentFile(data))}.jpg')
+        self.assertTrue(is_content_addressed(first))
+        self.assertEqual(self.stored_files(), [os.path.basename(first)])
+
+    def test_different_content_gets_different_names(self):
+        red = content_addressed_storage.save('food_images/dish.jpg', ContentFile(image_bytes(color='red')))
+        blue = content_addressed_storage.save('food_images/dish.jpg', ContentFile(image_bytes(color='blue')))
+        self.assertNotEqual(red, blue)
+        self.assertEqual(self.stored_files(), sorted(os.path.basename(name) for name in (red, blue)))
+        with content_addressed_storage.open(blue) as f:
+            self.assertEqual(f.read(), image_bytes(color='blue'))
+
+    def test_food_uploads_are_deduplicated(self):
+        owner = User.objects.create_user('staff', 'staff@dyno.com', 'pw', is_staff=True)
+        foods = [
+            FoodItem.objects.create(name=f'Dish {i}', price=Decimal('100.00'), added_by=owner,
+                                    image=SimpleUploadedFile(f'upload{i}.jpg', image_bytes(), 'image/jpeg'))
+            for i in range(2)
+        ]
+        self.assertEqual(foods[0].image.name, foods[1].image.name)
+        self.assertEqual(len(self.stored_files()), 1)
+        self.assertFalse(is_content_addressed('food_images/pizza_AbC123.jpg'))
+
+
+class RatingTests(OrderDataMixin, TestCase):
+    """FoodItem.rating_avg / rating_count follow review writes through accounts.ratings."""
+
+    def assert_rating(self, avg, count):
+        food = FoodItem.objects.get(id=self.food.id)
+        self.assertEqual((food.rating_avg, food.rating_count), (Decimal(avg), count))
+
+    def setUp(self):
+        super().setUp()
+        self.food = self.foods[0]
+        self.others = [User.objects.create_user(f'critic{i}', f'c{i}@example.com', 'pw') for i in range(2)]
+
+    def test_create_update_and_delete(self):
+        self.assert_rating('0', 0)
+        mine = Review.objects.create(food_item=self.food, user=self.user, rating=5)
+        self.assert_rating('5', 1)
+        Review.objects.create(food_item=self.food, user=self.others[0], rating=4)
+        Review.objects.create(food_item=self.food, user=self.others[1], rating=4)
+        self.assert_rating('4.33', 3)
+        mine.rating = 1
+        mine.save()
+        self.assert_rating('3', 3)
+        mine.delete()
+        self.assert_rating('4', 2)
+        Review.objects.filter(food_item=self.food).delete()
+        self.assert_rating('0', 0)
+        self.assertEqual(FoodItem.objects.get(id=self.foods[1].id).rating_count, 0)
+
+    def test_submit_review_replaces_the_users_review(self):
+        self.client.login(username='asha', password='pw')
+        url = reverse('submit_review', args=[self.food.id])
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        self.assertEqual(self.client.post(url, {'rating': 2}, **headers).json()['rating_count'], 1)
+        response = self.client.post(url, {'rating': 4}, **headers).json()
+        self.assertEqual((response['rating_avg'], response['rating_count']), ('4.00', 1))
+        self.assertEqual(self.client.post(url, {'rating': 6}, **headers).status_code, 400)
+        self.assert_rating('4', 1)
+
+
+class CheckoutTests(OrderDataMixin, TestCase):
+
+    def test_checkout_writes_order_lines_and_empties_cart(self):
+        add_item(self.user, self.foods[0].id, 2)
+        add_item(self.user, self.foods[1].id)
+        result = checkout.checkout_cart(self.user)
+        self.assertEqual(result.order.total_price, Decimal('310.00'))
+        self.assertEqual(result.order.city, 'Pune')
+        self.assertEqual(result.order.lines.count(), 2)
+        self.assertEqual(OrderHistoryEntry.objects.get(order=result.order).total_price, Decimal('310.00'))
+        self.assertEqual(cart_quantities(self.user), {})
+
+    def test_failed_checkout_leaves_nothing_behind(self):
+        add_item(self.user, self.foods[0].id, 2)
+        with mock.patch('accounts.checkout.record_orders', side_effect=RuntimeError("history down")):
+            with self.assertRaises(RuntimeError):
+                checkout.checkout_cart(self.user)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderLine.objects.exists())
+        self.assertFalse(CityOrderCount.objects.filter(order_count__gt=0).exists())
+        self.assertEqual(cart_quantities(self.user), {self.foods[0].id: 2})
+
+    def test_items_added_during_checkout_stay_in_the_cart(self):
+        add_item(self.user, self.foods[0].id, 2)
+
+        def add_meanwhile(*args, **kwargs):
+            add_item(self.user, self.foods[3].id)
+            return price_cart(*args, **kwargs)
+
+        with mock.patch('accounts.checkout.price_cart', side_effect=add_meanwhile):
+            result = checkout.checkout_cart(self.user)
+        self.assertEqual([line.food_item_id for line in result.order.lines.all()], [self.foods[0].id])
+        self.assertEqual(cart_quantities(self.user), {self.foods[3].id: 1})
+
+    def test_cart_rows_are_read_for_update(self):
+        add_item(self.user, self.foods[0].id)
+        with mock.patch.object(CartItem.objects, 'select_for_update', wraps=CartItem.objects.select_for_update) as lock:
+            checkout.checkout_cart(self.user)
+        lock.assert_called_once_with()
+
+    def test_double_submit_places_one_order(self):
+        add_item(self.user, self.foods[0].id)
+        self.client.login(username='asha', password='pw')
+        self.assertRedirects(self.client.post(reverse('order_all')), reverse('orders'))
+        self.assertRedirects(self.client.post(reverse('order_all')), reverse('cart'), fetch_redirect_response=False)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class CartPricingTests(OrderDataMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(username='asha', password='pw')
+
+    def update(self, food, action):
+        return self.client.post(reverse('update_quantity'), json.dumps({'item_name': str(food.id), 'action': action}),
+                                content_type='application/json')
+
+    def test_price_cart_totals_in_decimal_and_reports_bad_lines(self):
+        FoodItem.objects.filter(id=self.foods[0].id).update(price=Decimal('0.10'))
+        cart = {str(self.foods[0].id): {'quantity': 3}, str(self.foods[1].id): 2, 'x': 1,
+                str(self.foods[2].id): 0, '999999': 1}
+        with self.assertNumQueries(1):
+            priced = price_cart(cart, fresh=True)
+        self.assertEqual(priced.total, Decimal('0.30') + Decimal('220.00'))
+        self.assertEqual(priced.line(self.foods[0].id).total, Decimal('0.30'))
+        self.assertEqual(priced.line(self.foods[1].id).food, self.foods[1])
+        self.assertEqual(sorted(str(food_id) for food_id, _ in priced.rejected),
+                         sorted(['x', str(self.foods[2].id), '999999']))
+
+    def test_cached_prices_follow_catalog_changes(self):
+        cart = {self.foods[0].id: 1}
+        price_cart(cart)
+        with self.assertNumQueries(0):
+            self.assertEqual(price_cart(cart).total, Decimal('100.00'))
+        self.foods[0].price = Decimal('120.50')
+        self.foods[0].save()
+        self.assertEqual(price_cart(cart).total, Decimal('120.50'))
+
+    def test_update_quantity_returns_subtotals(self):
+        add_item(self.user, self.foods[0].id, 2)
+        add_item(self.user, self.foods[1].id)
+        response = self.update(self.foods[0], 'increase').json()
+        self.assertEqual((response['quantity'], response['subtotal'], response['total_price']), (3, '300.00', '410.00'))
+        for _ in range(3):
+            response = self.update(self.foods[0], 'decrease').json()
+        self.assertEqual((response['quantity'], response['subtotal'], response['total_price']), (1, '100.00', '210.00'))
+        self.assertEqual(self.update(self.foods[4], 'increase').status_code, 404)
+        response = self.client.post(reverse('update_quantity'), json.dumps({'item_name': 'abc', 'action': 'increase'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cart_page_totals(self):
+        add_item(self.user, self.foods[2].id, 3)
+        add_item(self.user, self.foods[5].id)
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['total_price'], Decimal('510.00'))
+        self.assertEqual({line.id: line.total for line in response.context['cart_items']},
+                         {self.foods[2].id: Decimal('360.00'), self.foods[5].id: Decimal('150.00')})
+
+
+class StoredCartTests(OrderDataMixin, TestCase):
+
+    def test_quantities_are_upserted_in_place(self):
+        add_item(self.user, self.foods[0].id)
+        add_item(self.user, self.foods[0].id, 2)
+        with self.assertNumQueries(1):
+            add_item(self.user, self.foods[0].id)
+        self.assertEqual(CartItem.objects.get(user=self.user, food_item=self.foods[0]).quantity, 4)
+        self.assertTrue(change_quantity(self.user, self.foods[0].id, -3))
+        self.assertFalse(change_quantity(self.user, self.foods[0].id, -1))
+        self.assertFalse(change_quantity(self.user, self.foods[1].id, 1))
+        self.assertEqual(cart_quantities(self.user), {self.foods[0].id: 1})
+        remove_item(self.user, self.foods[0].id)
+        self.assertEqual(cart_quantities(self.user), {})
+
+    def test_insert_race_falls_back_to_an_update(self):
+        CartItem.objects.create(user=self.user, food_item=self.foods[0], quantity=2)
+        update = QuerySet.update
+        calls = []
+
+        def first_update_misses(queryset, **kwargs):
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', first_update_misses):
+            add_item(self.user, self.foods[0].id, 3)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cart_quantities(self.user), {self.foods[0].id: 5})
+
+    def test_session_cart_is_merged_on_login(self):
+        add_item(self.user, self.foods[0].id)
+        for food in (self.foods[0], self.foods[0], self.foods[1], self.foods[5]):
+            self.assertRedirects(self.client.get(reverse('add_to_cart', args=[food.id])), reverse('home'))
+        self.assertEqual(self.client.session[SESSION_CART_KEY][str(self.foods[0].id)]['quantity'], 2)
+        self.foods[5].delete()
+        self.client.post(reverse('login'), {'username': 'asha', 'password': 'pw'})
+        self.assertEqual(cart_quantities(self.user), {self.foods[0].id: 3, self.foods[1].id: 1})
+        self.assertNotIn(SESSION_CART_KEY, self.client.session)
+        add_item(self.user, self.foods[1].id)
+        self.assertEqual(cart_quantities(self.user)[self.foods[1].id], 2)
+
+    def test_signed_in_adds_go_to_the_stored_cart(self):
+        self.client.login(username='asha', password='pw')
+        self.client.get(reverse('add_to_cart', args=[self.foods[2].id]), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.client.get(reverse('add_to_cart', args=[self.foods[2].id]), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(cart_quantities(self.user), {self.foods[2].id: 2})
+        self.assertNotIn(SESSION_CART_KEY, self.client.session)
+
+
+class OrderLinesMigrationTests(TransactionTestCase):
+    """Migration 0021 turns legacy one-row-per-item orders into headers with lines."""
+
+    migrate_from = [('accounts', '0020_cartitem_food_item')]
+    migrate_to = [('accounts', '0021_order_lines')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_legacy_line_totals_become_unit_prices(self):
+        apps = self.migrate(self.migrate_from)
+        User = apps.get_model('auth', 'User')
+        FoodItem = apps.get_model('accounts', 'FoodItem')
+        Order = apps.get_model('accounts', 'Order')
+        owner = User.objects.create(username='staff', is_staff=True)
+        user = User.objects.create(username='asha')
+        noodles = FoodItem.objects.create(name='Noodles', price=Decimal('80.00'), image='food_images/n.jpg', added_by=owner)
+        tacos = FoodItem.objects.create(name='Tacos', price=Decimal('150.00'), image='food_images/t.jpg', added_by=owner)
+        start = timezone.now() - timedelta(days=30)
+
+        def legacy(food, quantity, price, seconds):
+            Order.objects.create(user=user, food_item=food, quantity=quantity, price=price, address='x',
+                                 city='Pune', timestamp=start + timedelta(seconds=seconds))
+
+        # One checkout from the seed data, which stored line totals in `price`
+        legacy(noodles, 3, Decimal('240.00'), 0)
+        legacy(tacos, 1, Decimal('150.00'), 5)
+        legacy(tacos, 2, Decimal('300.00'), 10)
+        # Later orders placed on the site, which stored unit prices (or none)
+        legacy(tacos, 2, Decimal('150.00'), 3600)
+        legacy(noodles, 2, None, 7200)
+        # Price changed since: still closer to the line total than to a unit price
+        legacy(noodles, 4, Decimal('300.00'), 10800)
+
+        apps = self.migrate(self.migrate_to)
+        Order = apps.get_model('accounts', 'Order')
+        OrderLine = apps.get_model('accounts', 'OrderLine')
+        orders = list(Order.objects.order_by('timestamp'))
+        self.assertEqual([order.total_price for order in orders],
+                         [Decimal('690.00'), Decimal('300.00'), Decimal('160.00'), Decimal('300.00')])
+        lines = [(line.food_item.name, line.quantity, line.unit_price)
+                 for line in OrderLine.objects.select_related('food_item').order_by('order__timestamp', 'id')]
+        self.assertEqual(lines, [
+            ('Noodles', 3, Decimal('80.00')),
+            ('Tacos', 1, Decimal('150.00')),
+            ('Tacos', 2, Decimal('150.00')),
+            ('Tacos', 2, Decimal('150.00')),
+            ('Noodles', 2, Decimal('80.00')),
+            ('Noodles', 4, Decimal('75.00')),
+        ])
+
+
+class DeliveryStatusTests(OrderDataMixin, TestCase):
+    """Orders move placed -> dispatched -> delivered as their times come (accounts.delivery)."""
+
+    def placed_minutes_ago(self, minutes):
+        order = self.order()
+        placed = timezone.now() - timedelta(minutes=minutes)
+        Order.objects.filter(id=order.id).update(
+            timestamp=placed, delivery_due_at=placed + timedelta(minutes=checkout.DELIVERY_MINUTES))
+        return order
+
+    def statuses(self, *orders):
+        return [(Order.objects.get(id=order.id).status, OrderHistoryEntry.objects.get(order=order).status)
+                for order in orders]
+
+    def test_transitions(self):
+        fresh, cooked, due = self.placed_minutes_ago(1), self.placed_minutes_ago(10), self.placed_minutes_ago(40)
+        self.assertEqual(delivery.advance_orders(), {'dispatched': 1, 'delivered': 1})
+        self.assertEqual(self.statuses(fresh, cooked, due), [
+            (OrderStatus.PLACED, OrderStatus.PLACED),
+            (OrderStatus.DISPATCHED, OrderStatus.DISPATCHED),
+            (OrderStatus.DELIVERED, OrderStatus.DELIVERED),
+        ])
+        due = Order.objects.get(id=due.id)
+        # Delivered straight from placed: the dispatch time is filled in from the schedule
+        self.assertEqual(due.dispatched_at, due.timestamp + delivery.DISPATCH_AFTER)
+        self.assertEqual(due.delivered_at, due.delivery_due_at)
+        self.assertEqual(due.remaining_minutes, 0)
+
+        Order.objects.filter(id=cooked.id).update(delivery_due_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(delivery.advance_orders(), {'dispatched': 0, 'delivered': 1})
+        self.assertEqual(self.statuses(cooked), [(OrderStatus.DELIVERED, OrderStatus.DELIVERED)])
+
+    def test_nothing_due_writes_nothing(self):
+        self.placed_minutes_ago(1)
+        with self.assertNumQueries(2):
+            self.assertEqual(delivery.advance_orders(), {'dispatched': 0, 'delivered': 0})
+
+    def test_large_backlogs_are_advanced_in_chunks(self):
+        orders = [self.placed_minutes_ago(40) for _ in range(5)]
+        with mock.patch('accounts.delivery.ADVANCE_BATCH_SIZE', 2), \
+                mock.patch('accounts.delivery.publish_order_change') as publish:
+            self.assertEqual(delivery.advance_orders(), {'dispatched': 0, 'delivered': 5})
+        self.assertEqual(publish.call_count, 3)
+        self.assertEqual(set(status for status, _ in self.statuses(*orders)), {OrderStatus.DELIVERED})
+
+    def test_user_orders_advance_on_request_unless_the_job_does_it(self):
+        other = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+        mine = self.placed_minutes_ago(40)
+        theirs = self.order(user=other)
+        Order.objects.filter(id=theirs.id).update(delivery_due_at=timezone.now() - timedelta(minutes=1))
+        with override_settings(ORDER_STATUS_ON_REQUEST=False):
+            delivery.advance_user_orders(self.user)
+        self.assertEqual(self.statuses(mine), [(OrderStatus.PLACED, OrderStatus.PLACED)])
+
+        self.client.login(username='asha', password='pw')
+        response = self.client.get(reverse('orders'))
+        self.assertEqual([entry.order_id for entry in response.context['orders']], [mine.id])
+        self.assertEqual(self.statuses(mine, theirs)[1], (OrderStatus.PLACED, OrderStatus.PLACED))
+
+
+class OrderEventStreamTests(OrderDataMixin, TestCase):
+    """The SSE feed of active orders (accounts.tracking)."""
+
+    def payload(self, message):
+        data = [line[len('data: '):] for line in message.splitlines() if line.startswith('data: ')]
+        return json.loads(data[0])['orders']
+
+    def test_snapshot_response(self):
+        self.assertEqual(self.client.get(reverse('order_events')).status_code, 204)
+        order = self.order()
+        self.client.login(username='asha', password='pw')
+        response = self.client.get(reverse('order_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(response.content.decode().startswith(f'retry: {tracking.RETRY_MS}\n'))
+        self.assertEqual(self.payload(response.content.decode()), [{
+            'id': order.id, 'status': OrderStatus.PLACED, 'status_display': 'Preparing',
+            'eta': checkout.DELIVERY_MINUTES,
+        }])
+
+    @mock.patch('accounts.tracking.HEARTBEAT_SECONDS', 0.01)
+    def test_stream_pushes_transitions_without_the_advance_job(self):
+        order = self.order()
+
+        def make_due():
+            placed = timezone.now() - timedelta(minutes=10)
+            Order.objects.filter(id=order.id).update(timestamp=placed, delivery_due_at=placed + timedelta(minutes=30))
+
+        async def read():
+            snapshot = await sync_to_async(tracking.active_orders_snapshot)(self.user)
+            stream = tracking.order_event_stream(self.user, snapshot)
+            try:
+                messages = [await stream.__anext__(), await stream.__anext__()]
+                await sync_to_async(make_due)()
+                messages.append(await stream.__anext__())
+            finally:
+                await stream.aclose()
+            return messages
+
+        first, keep_alive, changed = async_to_sync(read)()
+        self.assertEqual(self.payload(first)[0]['status'], OrderStatus.PLACED)
+        self.assertEqual(keep_alive, ': keep-alive\n\n')
+        self.assertEqual(self.payload(changed)[0]['status'], OrderStatus.DISPATCHED)
+        self.assertEqual(self.payload(changed)[0]['eta'], 20)
+
+    @mock.patch('accounts.tracking.HEARTBEAT_SECONDS', 0.01)
+    def test_stream_follows_new_orders(self):
+        async def read():
+            stream = tracking.order_event_stream(self.user, [])
+            try:
+                messages = [await stream.__anext__()]
+                await sync_to_async(self.order)()
+                messages.append(await stream.__anext__())
+            finally:
+                await stream.aclose()
+            return messages
+
+        first, changed = async_to_sync(read)()
+        self.assertEqual(self.payload(first), [])
+        self.assertEqual(len(self.payload(changed)), 1)
+
+
+@override_settings(ORDER_INGEST_MODE=ingest.INGEST_MODE_QUEUE, ORDER_INGEST_MAX_PENDING=100)
+class IngestTests(OrderDataMixin, TestCase):
+
+    def enqueue(self, foods=None):
+        entry = checkout.submit_order(self.user, [(food, 1, food.price) for food in (foods or self.foods[:2])])
+        self.assertIsInstance(entry, OrderIngest)
+        return entry
+
+    def test_flush_writes_each_entry_exactly_once(self):
+        entries = [self.enqueue() for _ in range(5)]
+        self.assertEqual(ingest.flush(batch_size=3), {'written': 3, 'rejected': 0})
+        self.assertEqual(ingest.flush_all(), {'written': 2, 'rejected': 0})
+        self.assertEqual(ingest.flush_all(), {'written': 0, 'rejected': 0})
+        self.assertEqual(Order.objects.count(), 5)
+        self.assertEqual(OrderLine.objects.count(), 10)
+        self.assertEqual(OrderHistoryEntry.objects.count(), 5)
+        linked = set(OrderIngest.objects.filter(id__in=[e.id for e in entries]).values_list('order_id', flat=True))
+        self.assertEqual(linked, set(Order.objects.values_list('id', flat=True)))
+
+    def test_flush_counts_each_order_once_in_the_rollups(self):
+        for _ in range(3):
+            self.enqueue()
+        with mock.patch('accounts.rollups.record_orders', wraps=rollups.record_orders) as record:
+            ingest.flush_all()
+        self.assertEqual(record.call_count, 1)
+        self.assertEqual(CityOrderCount.objects.get(city='pune').order_count, 3)
+        self.assertEqual(UserOrderCount.objects.get(user=self.user).order_count, 3)
+
+    def test_queue_depth_probe_does_not_count_the_queue(self):
+        self.enqueue()
+        with self.assertNumQueries(1) as queries:
+            self.assertFalse(ingest.queue_full())
+        self.assertNotIn('COUNT(', queries.captured_queries[0]['sql'].upper())
+
+    def test_live_claims_are_skipped_and_stale_claims_taken_over(self):
+        entry = self.enqueue()
+        OrderIngest.objects.filter(id=entry.id).update(batch='other-run', claimed_at=timezone.now())
+        self.assertEqual(ingest.flush(), {'written': 0, 'rejected': 0})
+        OrderIngest.objects.filter(id=entry.id).update(claimed_at=timezone.now() - ingest.CLAIM_TIMEOUT * 2)
+        self.assertEqual(ingest.flush(), {'written': 1, 'rejected': 0})
+
+    def test_lost_claim_rolls_back_the_batch(self):
+        entry = self.enqueue()
+        new_order = ingest.new_order
+
+        def taken_over(*args, **kwargs):
+            OrderIngest.objects.filter(id=entry.id).update(batch='other-run')
+            return new_order(*args, **kwargs)
+
+        with mock.patch('accounts.ingest.new_order', side_effect=taken_over):
+            with self.assertRaises(ingest.StaleClaim):
+                ingest.flush()
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(UserOrderCount.objects.filter(order_count__gt=0).exists())
+        self.assertIsNone(OrderIngest.objects.get(id=entry.id).order_id)
+
+    def test_entries_without_orderable_items_are_rejected(self):
+        entry = self.enqueue(foods=[self.foods[0]])
+        self.foods[0].delete()
+        self.assertEqual(ingest.flush(), {'written': 0, 'rejected': 1})
+        self.assertTrue(OrderIngest.objects.get(id=entry.id).error)
+
+    @override_settings(ORDER_INGEST_MAX_PENDING=2)
+    def test_full_queue_writes_synchronously(self):
+        self.enqueue()
+        self.enqueue()
+        self.assertTrue(ingest.queue_full())
+        order = checkout.submit_order(self.user, [(self.foods[0], 1, self.foods[0].price)])
+        self.assertIsInstance(order, Order)
+
+
+class OrderHistoryTests(OrderDataMixin, TestCase):
+    """OrderHistoryEntry, the read model behind the orders page, follows its Order."""
+
+    def entry_fields(self):
+        return sorted(OrderHistoryEntry.objects.values_list(
+            'order_id', 'user_id', 'status', 'placed_at', 'delivery_due_at', 'delivered_at', 'total_price', 'image', 'lines'))
+
+    def reschedule(self, order, **times):
+        # Order times only ever change through checkout; move the entry's copy along with them
+        Order.objects.filter(id=order.id).update(**times)
+        OrderHistoryEntry.objects.filter(order=order).update(
+            **{'placed_at' if field == 'timestamp' else field: value for field, value in times.items()})
+
+    def test_created_with_the_order(self):
+        order = self.order(foods=self.foods[1:3], quantity=2)
+        entry = OrderHistoryEntry.objects.get(order=order)
+        self.assertEqual((entry.user_id, entry.status, entry.placed_at, entry.total_price),
+                         (self.user.id, OrderStatus.PLACED, order.timestamp, Decimal('460.00')))
+        self.assertEqual(entry.lines, [
+            {'name': 'Dish 1', 'quantity': 2, 'unit_price': '110.00'},
+            {'name': 'Dish 2', 'quantity': 2, 'unit_price': '120.00'},
+        ])
+        self.assertEqual(entry.image, 'food_images/test.jpg')
+
+    def test_follows_status_changes_and_deletes(self):
+        order = self.order()
+        self.reschedule(order, timestamp=timezone.now() - timedelta(minutes=10))
+        delivery.advance_orders()
+        self.assertEqual(OrderHistoryEntry.objects.get(order=order).status, OrderStatus.DISPATCHED)
+        self.reschedule(order, delivery_due_at=timezone.now() - timedelta(minutes=1))
+        delivery.advance_orders()
+        entry = OrderHistoryEntry.objects.get(order=order)
+        self.assertEqual(entry.status, OrderStatus.DELIVERED)
+        self.assertEqual(entry.delivered_at, Order.objects.get(id=order.id).delivered_at)
+        Order.objects.filter(id=order.id).delete()
+        self.assertFalse(OrderHistoryEntry.objects.exists())
+
+    def test_rebuild_matches_incremental_entries(self):
+        for quantity in (1, 2, 3):
+            self.order(quantity=quantity)
+        order = self.order(foods=self.foods[3:])
+        self.reschedule(order, timestamp=timezone.now() - timedelta(minutes=45),
+                        delivery_due_at=timezone.now() - timedelta(minutes=15))
+        delivery.advance_orders()
+        incremental = self.entry_fields()
+        self.assertEqual(history.rebuild(), {'order_history_entries': 4})
+        self.assertEqual(self.entry_fields(), incremental)
+
+    def test_orders_page_reads_the_entries(self):
+        order = self.order()
+        OrderHistoryEntry.objects.filter(order=order).update(lines=[{'name': 'From the read model', 'quantity': 1,
+                                                                     'unit_price': '1.00'}])
+        self.client.login(username='asha', password='pw')
+        response = self.client.get(reverse('orders'))
+        self.assertEqual([entry.order_id for entry in response.context['active_orders']], [order.id])
+        self.assertContains(response, 'From the read model')
+
+
+class RollupTests(OrderDataMixin, TestCase):
+
+    def snapshot(self):
+        models = (CityOrderCount, UserOrderCount, CityFoodCount, CityOrderBucket, FoodOrderBucket)
+        return {
+            model.__name__: sorted(
+                row for row in model.objects.values_list(
+                    *[f.attname for f in model._meta.concrete_fields if not f.primary_key or f.is_relation])
+                if row[-1]  # rows a rebuild would not create are those counted down to zero
+            )
+            for model in models
+        }
+
+    def test_incremental_rollups_match_a_rebuild(self):
+        other = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+        other.profile.city = ' delhi '
+        other.profile.save()
+        self.order()
+        self.order(user=other, foods=self.foods[2:5])
+        with override_settings(ORDER_INGEST_MODE=ingest.INGEST_MODE_QUEUE):
+            checkout.submit_order(other, [(self.foods[0], 3, self.foods[0].price)])
+            ingest.flush_all()
+        self.order().delete()
+
+        incremental = self.snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+        self.assertEqual(CityOrderCount.objects.get(city=rollups.ALL_CITIES).order_count, 3)
+        self.assertEqual(CityOrderCount.objects.get(city='delhi').order_count, 2)
+        self.assertEqual(UserOrderCount.objects.get(user=self.user).order_count, 1)
+
+    def test_overall_stats_read_the_rollups(self):
+        other = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+        other.profile.city = 'Delhi'
+        other.profile.save()
+        for _ in range(3):
+            self.order(foods=[self.foods[1]])
+        self.order(user=other, foods=[self.foods[2]])
+        with mock.patch('accounts.ai_utils.get_ai_predictions', return_value=[]):
+            stats = overall_stats()
+        self.assertEqual((stats['orders_by_state_labels'], stats['orders_by_state_counts']), (['Pune', 'Delhi'], [3, 1]))
+        self.assertEqual(stats['most_ordered_state'], 'Pune')
+        self.assertEqual(stats['top_users'], [('asha', 3), ('ravi', 1)])
+        self.assertEqual((stats['total_orders'], stats['total_users']), (4, 2))
+        self.assertEqual(stats['city_food'], {'Delhi': {'food': 'Dish 2', 'orders': 1}, 'Pune': {'food': 'Dish 1', 'orders': 3}})
+
+
+class OrderSeriesTests(OrderDataMixin, TestCase):
+    """Staff order volume per hour/day bucket, read from the bucket rollups."""
+
+    def test_series_counts_orders_per_bucket(self):
+        self.order()
+        self.order(foods=[self.foods[3]])
+        series = order_series(*parse_range({'range': '24h'}))
+        self.assertEqual(series['granularity'], BucketGranularity.HOUR)
+        self.assertEqual(len(series['buckets']), 25)
+        self.assertEqual(sum(series['total']), 2)
+        self.assertEqual(series['cities'][0]['city'], 'Pune')
+        self.assertEqual({row['food']: row['total'] for row in series['foods']}, {'Dish 0': 1, 'Dish 1': 1, 'Dish 3': 1})
+
+    def test_buckets_off_the_current_grid_are_counted_in_their_enclosing_bucket(self):
+        # Rows written while TIME_ZONE was half an hour off from today's setting
+        start, end, granularity = parse_range({'range': '24h'})
+        shifted = start + timedelta(hours=3, minutes=30)
+        for city in (rollups.ALL_CITIES, 'goa'):
+            CityOrderBucket.objects.create(granularity=granularity, start=shifted, city=city, order_count=4)
+        FoodOrderBucket.objects.create(granularity=granularity, start=shifted, food_item=self.foods[0], order_count=4)
+        day = parse_range({'range': '7d', 'granularity': 'day'})
+        CityOrderBucket.objects.create(granularity=BucketGranularity.DAY, start=day[0] + timedelta(days=2, hours=5, minutes=30),
+                                       city=rollups.ALL_CITIES, order_count=2)
+
+        series = order_series(start, end, granularity)
+        self.assertEqual(series['total'][3], 4)
+        self.assertEqual(series['cities'], [{'city': 'goa', 'total': 4, 'counts': series['total']}])
+        self.assertEqual(series['foods'][0]['counts'][3], 4)
+        self.assertEqual(order_series(*day)['total'][2], 2)
+
+        self.client.login(username='staff', password='pw')
+        self.assertEqual(self.client.get(reverse('staff_stats_series'), {'range': '24h'}).status_code, 200)
+        self.assertEqual(self.client.get(reverse('staff_stats_series'), {'range': 'x'}).status_code, 400)
+
+
+class ModelRegistryTests(SimpleTestCase):
+    """The process-wide order model is loaded once and swapped when the file changes."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'model.pkl')
+        path_override = override_settings(ORDER_MODEL_PATH=self.path)
+        path_override.enable()
+        self.addCleanup(path_override.disable)
+        self.registry = ModelRegistry()
+
+    def write(self, bundle):
+        # Written by another process (e.g. the training job), so this registry is not told
+        with open(self.path, 'wb') as f:
+            pickle.dump(bundle, f)
+
+    def test_no_model_yet(self):
+        self.assertIsNone(self.registry.get())
+        self.assertFalse(self.registry.info()['available'])
+
+    def test_loaded_once_and_reloaded_when_the_file_changes(self):
+        self.registry.save({'model': 'first'})
+        loaded = self.registry.get()
+        self.assertEqual(loaded['model'], 'first')
+        self.assertIs(self.registry.get(), loaded)
+
+        self.write({'model': 'second version'})
+        # Within CHECK_INTERVAL the file is not even looked at
+        self.assertIs(self.registry.get(), loaded)
+        self.assertTrue(self.registry.info()['stale'])
+        with mock.patch('accounts.model_registry.CHECK_INTERVAL', 0):
+            reloaded = self.registry.get()
+            self.assertEqual(reloaded['model'], 'second version')
+            self.assertNotEqual(reloaded.version, loaded.version)
+            self.assertIs(self.registry.get(), reloaded)
+        self.assertFalse(self.registry.info()['stale'])
+
+    def test_save_is_picked_up_at_once(self):
+        self.registry.save({'model': 'first'})
+        self.registry.get()
+        self.registry.save({'model': 'retrained'})
+        self.assertEqual(self.registry.get()['model'], 'retrained')
+        self.assertEqual([name for name in os.listdir(os.path.dirname(self.path))], ['model.pkl'])
+
+    def test_broken_file_keeps_the_current_model(self):
+        self.registry.save({'model': 'good'})
+        loaded = self.registry.get()
+        with open(self.path, 'wb') as f:
+            f.write(b'not a pickle at all')
+        with mock.patch('accounts.model_registry.CHECK_INTERVAL', 0), \
+                self.assertLogs('accounts.model_registry', 'ERROR'):
+            self.assertIs(self.registry.get(), loaded)
+
+
+class FeatureEncodingTests(SimpleTestCase):
+    """Column-wise Vocabulary encoding agrees with the per-row encoding it replaced."""
+
+    def frame(self, rows):
+        return pd.DataFrame(rows, columns=['username', 'city', 'item_name', 'quantity'])
+
+    def test_vocabulary_codes_and_unknown_values(self):
+        vocab = Vocabulary(['pizza', 'momos'])
+        codes, unknown = vocab.encode(pd.Series(['momos', 'tacos', 'pizza', None]))
+        self.assertEqual(codes.tolist(), [2, Vocabulary.UNKNOWN, 1, Vocabulary.UNKNOWN])
+        self.assertEqual(unknown.tolist(), [False, True, False, True])
+        vocab.extend(['tacos', 'pizza'])
+        self.assertEqual(vocab.encode(pd.Series(['tacos', 'pizza']))[0].tolist(), [3, 1])
+
+    def test_label_encoder_models_encode_as_before(self):
+        encoders = {}
+        for key, values in (('user_encoder', ['asha', 'ravi', 'zoe']), ('city_encoder', ['Delhi', 'Pune']),
+                            ('item_encoder', ['Momos', 'Noodles', 'Tacos'])):
+            encoders[key] = LabelEncoder().fit(values)
+        df = self.frame([('ravi', 'Pune', 'Tacos', 2), ('nobody', 'Pune', 'Momos', 1),
+                         ('zoe', 'Goa', 'Pizza', 3), ('asha', 'Delhi', 'Noodles', 1)])
+        X, unknown = encode_features(df, vocabularies(encoders))
+
+        def per_row(encoder, value):
+            return encoder.transform([value])[0] if value in encoder.classes_ else 0
+        expected = pd.DataFrame({
+            'user_encoded': df['username'].map(lambda x: per_row(encoders['user_encoder'], x)),
+            'city_encoded': df['city'].map(lambda x: per_row(encoders['city_encoder'], x)),
+            'item_encoded': df['item_name'].map(lambda x: per_row(encoders['item_encoder'], x)),
+            'quantity': df['quantity'].astype(float),
+        })
+        self.assertEqual(X.to_numpy().tolist(), expected[FEATURE_COLUMNS].to_numpy().tolist())
+        self.assertEqual(unknown.tolist(), [False, True, True, False])
+
+    def test_scalar_and_vectorized_predictions_agree(self):
+        rng = np.random.default_rng(7)
+        users, cities, items = ['asha', 'ravi', 'zoe'], ['Pune', 'Delhi'], ['Momos', 'Tacos', 'Cake']
+        training = self.frame([(rng.choice(users), rng.choice(cities), rng.choice(items), int(rng.integers(1, 4)))
+                               for _ in range(200)])
+        training['price'] = training['quantity'] * 50 + training['item_name'].map({'Momos': 0, 'Tacos': 40, 'Cake': 90})
+        training['id'] = range(1, len(training) + 1)
+        predictor = PricePredictor(fit_price_model(training))
+
+        rows = [(users[i % 3], cities[i % 2], items[i % 3], 1 + i % 3) for i in range(VECTORIZED_BATCH_SIZE)]
+        rows[1] = ('stranger', 'Goa', 'Pizza', 2)
+        vectorized = predictor.predict_rows(rows)
+        for row, (price, unknown) in zip(rows[:20], vectorized):
+            scalar_price, scalar_unknown = predictor.predict_row(*row)
+            self.assertAlmostEqual(scalar_price, price, places=6)
+            self.assertEqual(scalar_unknown, unknown)
+        self.assertEqual([unknown for _, unknown in vectorized[:3]], [False, True, False])
+
+        # Models the pure-Python path cannot evaluate go through scikit-learn row by row too
+        X, _ = encode_features(training, predictor.vocabularies)
+        other = PricePredictor({'model': Ridge().fit(X, training['price']),
+                                'vocabularies': predictor.vocabularies})
+        self.assertAlmostEqual(other.predict(*rows[0]), other.predict_rows(rows)[0][0], places=6)
+
+
+class PriceEstimateTests(OrderDataMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(username='asha', password='pw')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path_override = override_settings(ORDER_MODEL_PATH=os.path.join(directory, 'model.pkl'))
+        path_override.enable()
+        self.addCleanup(path_override.disable)
+        self.reset_registry()
+        self.addCleanup(self.reset_registry)
+
+    def reset_registry(self):
+        registry._current = None
+        registry._checked_at = None
+
+    def estimate(self, items):
+        return self.client.post(reverse('price_estimate'), json.dumps({'items': items}), content_type='application/json')
+
+    def test_no_model_yet(self):
+        self.assertEqual(self.client.get(reverse('price_estimate'), {'item': 'Dish 1'}).status_code, 503)
+
+    def test_predictor_is_built_once_per_model_version(self):
+        for quantity in (1, 2, 3):
+            self.order(quantity=quantity)
+        registry.save(fit_price_model(get_order_data()))
+        predictor = get_predictor()
+        self.assertIs(get_predictor(), predictor)
+        response = self.estimate([{'item': 'Dish 1', 'quantity': 2}, {'item': 'Unheard of', 'city': 'Goa'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['model_version'], predictor.version)
+        self.assertEqual([row['unknown'] for row in response.json()['predictions']], [False, True])
+
+        self.order(quantity=4)
+        registry.save(fit_price_model(get_order_data()))
+        self.assertIsNot(get_predictor(), predictor)
+
+    def test_rejects_malformed_items(self):
+        predictor = mock.Mock(version='v1')
+        predictor.predict_rows.side_effect = lambda rows: [(1.0, False)] * len(rows)
+        with mock.patch('accounts.views.get_predictor', return_value=predictor):
+            for items in ([{'item': ['x']}], [{'item': 'Dish 1', 'city': {'a': 1}}], ['Dish 1'],
+                          [{'item': 'Dish 1', 'quantity': 0}], [{'quantity': 2}], [{'item': 'Dish 1', 'quantity': 'two'}]):
+                self.assertEqual(self.estimate(items).status_code, 400, items)
+            self.assertEqual(self.estimate([]).status_code, 400)
+            response = self.client.get(reverse('price_estimate'), {'item': 'Dish 1', 'quantity': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['predictions'][0]['city'], 'Pune')
+
+
+class IncrementalTrainingTests(OrderDataMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(ORDER_MODEL_PATH=os.path.join(directory, 'model.pkl'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.reset_registry()
+        self.addCleanup(self.reset_registry)
+        self.users = [self.user] + [User.objects.create_user(f'user{i}', f'u{i}@example.com', 'pw') for i in range(4)]
+        self.placed = 0
+
+    def reset_registry(self):
+        registry._current = None
+        registry._checked_at = None
+
+    def place(self, count):
+        for _ in range(count):
+            self.placed += 1
+            user = self.users[self.placed % len(self.users)]
+            foods = [self.foods[self.placed % 6], self.foods[(self.placed * 7) % 6]]
+            checkout.create_order(user, [(food, 1 + self.placed % 3, food.price + self.placed % 5) for food in foods])
+
+    def train(self, **kwargs):
+        bundle, summary = train_price_model(**kwargs)
+        if bundle is not None:
+            registry.save(bundle)
+        return bundle, summary
+
+    def assert_matches_full_fit(self, bundle):
+        df = get_order_data()
+        X, _ = encode_features(df, bundle['vocabularies'])
+        expected = LinearRegression().fit(X, df['price'].astype(float))
+        np.testing.assert_allclose(bundle['model'].coef_, expected.coef_, rtol=1e-6, atol=1e-9)
+        self.assertAlmostEqual(bundle['model'].intercept_, expected.intercept_, places=6)
+
+    def test_incremental_runs_read_only_new_lines_and_match_a_full_fit(self):
+        self.place(30)
+        bundle, summary = self.train()
+        self.assertEqual((summary['mode'], summary['rows']), ('full', OrderLine.objects.count()))
+
+        new_user = User.objects.create_user('newcomer', 'n@example.com', 'pw')
+        new_user.profile.city = 'Goa'
+        new_user.profile.save()
+        self.users.append(new_user)
+        lines_before = OrderLine.objects.count()
+        self.place(12)
+        bundle, summary = self.train(chunk_size=5)
+        self.assertEqual(summary['mode'], 'incremental')
+        self.assertEqual(summary['rows'], OrderLine.objects.count() - lines_before)
+        self.assertEqual(summary['watermark'], OrderLine.objects.latest('id').id)
+        self.assertIn('newcomer', bundle['vocabularies']['username'].index)
+        self.assert_matches_full_fit(bundle)
+
+    def test_no_new_lines_keeps_the_saved_model(self):
+        self.place(10)
+        self.train()
+        bundle, summary = self.train()
+        self.assertIsNone(bundle)
+        self.assertEqual(summary['mode'], 'incremental')
+
+    def test_full_rebuild_fallbacks(self):
+        self.place(10)
+        bundle, _ = self.train()
+
+        bundle['training']['vocabulary_limits']['city'] = 0
+        registry.save(bundle)
+        bundle, summary = self.train()
+        self.assertEqual(summary['mode'], 'full')
+        self.assertEqual(summary['reason'], 'city vocabulary overflow')
+
+        registry.save({key: bundle[key] for key in ('model', 'vocabularies', 'features')})
+        bundle, summary = self.train()
+        self.assertEqual(summary['reason'], 'model has no incremental training state')
+
+        OrderLine.objects.filter(id__gt=OrderLine.objects.order_by('id')[4].id).delete()
+        bundle, summary = self.train()
+        self.assertEqual(summary['mode'], 'full')
+        self.assert_matches_full_fit(bundle)
+
+    def test_train_command(self):
+        out = io.StringIO()
+        call_command('train_order_ai', stdout=out)
+        self.assertIn('No data to train the model.', out.getvalue())
+        self.place(10)
+        call_command('train_order_ai', stdout=out)
+        self.assertIn('in full (no model yet)', out.getvalue())
+        self.place(3)
+        call_command('train_order_ai', stdout=out)
+        self.assertIn('incrementally on 6 order lines', out.getvalue())
+        self.assertEqual(registry.get()['training']['watermark'], OrderLine.objects.latest('id').id)
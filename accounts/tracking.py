@@ -0,0 +1,150 @@
+# tracking.py
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import ACTIVE_ORDER_STATUSES, Order, OrderIngest
+
+# Seconds between keep-alive comments; also how often ETAs are re-sent while they tick down.
+HEARTBEAT_SECONDS = 15
+# EventSource reconnect delay. Under WSGI every connection is one-shot, so this is the poll rate.
+RETRY_MS = 15000
+# Streams are recycled after this long (the browser reconnects), so a client that vanished
+# without the server noticing cannot hold a subscription forever.
+MAX_STREAM_SECONDS = 300
+
+
+class InProcessBroker:
+    """
+    Fans order events out to the streams open in this process. Enough for runserver or a
+    single ASGI worker; with several workers set ORDER_EVENTS_BROKER to a broker shared
+    between them that implements the same publish()/subscribe() pair.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, user_id, event):
+        """Deliver `event` to every open stream of `user_id`. Safe to call from any thread."""
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def subscribe(self, user_id):
+        """Must be called from the event loop that will read the subscription."""
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+
+class Subscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+
+    def put(self, event):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+
+    async def get(self, timeout):
+        """Next event, or None if nothing arrived within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker._unsubscribe(self)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'ORDER_EVENTS_BROKER', 'accounts.tracking.InProcessBroker'))()
+
+
+def publish_order_change(user_ids):
+    """Tell the open streams of these users that their orders changed; they re-read the snapshot."""
+    broker = get_broker()
+    for user_id in set(user_ids):
+        broker.publish(user_id, {'type': 'orders_changed'})
+
+
+def active_orders_snapshot(user):
+    """
+    Status and ETA of the user's active orders, after advancing any that are due (see
+    delivery.advance_user_orders). Queued orders (ORDER_INGEST_MODE = 'queue')
+    appear under their provisional id "P<n>"; once written, the Order carries that id as
+    `provisional_id` so pages can follow it. Indexed queries on (user, status) only.
+    """
+    from .delivery import advance_user_orders  # delivery publishes through this module
+
+    advance_user_orders(user)
+    queued = OrderIngest.objects.filter(user=user, order__isnull=True, error='').order_by('-id')
+    orders = Order.objects.filter(user=user, status__in=ACTIVE_ORDER_STATUSES).order_by('-timestamp')
+    snapshot = [
+        {
+            'id': entry.provisional_id,
+            'status': entry.status,
+            'status_display': entry.get_status_display(),
+            'eta': entry.remaining_minutes,
+        }
+        for entry in queued.only('id', 'created_at')
+    ]
+    for order in orders.select_related('ingest').only('id', 'status', 'delivery_due_at', 'ingest__id', 'ingest__order'):
+        entry = {
+            'id': order.id,
+            'status': order.status,
+            'status_display': order.get_status_display(),
+            'eta': order.remaining_minutes,
+        }
+        ingest = getattr(order, 'ingest', None)
+        if ingest is not None:
+            entry['provisional_id'] = ingest.provisional_id
+        snapshot.append(entry)
+    return snapshot
+
+
+def sse_message(data, retry=None):
+    message = f"retry: {retry}\n" if retry else ""
+    return f"{message}data: {json.dumps({'orders': data}, separators=(',', ':'))}\n\n"
+
+
+async def order_event_stream(user, snapshot):
+    """
+    Body of the SSE response under ASGI: the current snapshot, then a new one whenever the
+    user's orders change (broker event) or an ETA ticks down, with keep-alive comments between.
+    """
+    subscription = get_broker().subscribe(user.id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + MAX_STREAM_SECONDS
+    try:
+        yield sse_message(snapshot, retry=RETRY_MS)
+        while loop.time() < deadline:
+            event = await subscription.get(HEARTBEAT_SECONDS)
+            # Advancing only writes when an order is due, so a quiet tick costs a few indexed selects
+            current = await sync_to_async(active_orders_snapshot)(user)
+            if current != snapshot:
+                snapshot = current
+                yield sse_message(snapshot)
+            elif event is None:
+                yield ": keep-alive\n\n"
+    finally:
+        subscription.close()
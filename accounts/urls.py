@@ -1,7 +1,6 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 from django.conf import settings
-from django.conf.urls.static import static
 from accounts.views import register_view, login_view, logout_view, dashboard, home, cart_view, about_view, contact_view, add_to_cart, remove_from_cart, update_quantity, orders_view, order_again_view, order_now, staff_dashboard, add_food
 from .views import chatbot_view
 
@@ -12,7 +11,10 @@ urlpatterns = [
     path('register/', views.register_view, name='register'),
     path('logout/', views.logout_view, name='logout'),
     path('home/', views.home, name='home'),
+    path('home/feed/', views.home_feed, name='home_feed'),
     path('food/<int:food_id>/', views.food_detail, name='food_detail'),  # New URL for food detail
+    path('food/<int:food_id>/json/', views.food_detail_json, name='food_detail_json'),
+    path('food/<int:food_id>/review/', views.submit_review, name='submit_review'),
     path('cart/', views.cart_view, name='cart'),
     path('about/', views.about_view, name='about'),
     path('contact/', views.contact_view, name='contact'),
@@ -20,6 +22,7 @@ urlpatterns = [
     path('update-quantity/', views.update_quantity, name='update_quantity'),
     path('remove-from-cart/', views.remove_from_cart, name='remove_from_cart'),
     path('orders/', views.orders_view, name='orders'),
+    path('orders/events/', views.order_events, name='order_events'),
     path('order-again/<int:order_id>/', views.order_again_view, name='order_again'),
     path('staff/add/', views.add_food, name='add_food'),
     path('delete-food/<int:food_id>/', views.delete_food, name='delete_food'),
@@ -27,9 +30,16 @@ urlpatterns = [
     path('order/all/', views.order_all, name='order_all'),
     path('place_order/', views.place_order, name='place_order'),
     path('order_success/', views.order_success, name='order_success'),
+    path('order/price-estimate/', views.price_estimate, name='price_estimate'),
     path("staff/details/", views.staff_stats, name="staff_stats"),
+    path("staff/details/series/", views.staff_stats_series, name="staff_stats_series"),
+    path("staff/queries/", views.query_stats_view, name="query_stats"),
     path("chatbot_view/", views.chatbot_view, name="chatbot_view"),
 ] 
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # In production the web server should serve MEDIA_ROOT with the same immutable
+    # Cache-Control for content-addressed names (64 hex chars).
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), views.serve_media, name='media'),
+    ]
\ No newline at end of file
@@ -6,20 +6,40 @@ from datetime import datetime, timedelta
 from decimal import Decimal, InvalidOperation
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, condition
+from django.views.static import serve
 from django.db.models import Count
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
-from .models import FoodItem, CartItem, Order, Profile
+from .models import ACTIVE_ORDER_STATUSES, FoodItem, CartItem, Order, OrderHistoryEntry, OrderStatus, BucketGranularity, Profile, Review, Tag, Cuisine, Diet, infer_cuisine, infer_diet
 from .ai_utils import overall_stats, suggest_top_food_for_state
+from .search import apply_search
+from .feed import order_for_feed, paginate
+from .catalog_cache import cached_listing
+from .images import existing_derivatives
+from .storage import is_content_addressed
+from .cart import add_item, add_to_session_cart, cart_quantities, change_quantity, price_cart, remove_item
+from .delivery import advance_user_orders
+from .tracking import RETRY_MS, active_orders_snapshot, order_event_stream, sse_message
+from .checkout import DEFAULT_ADDRESS, checkout_cart, submit_order
+from .ingest import pending_for_user
+from .querystats import query_budget, report as query_report
+from .analytics import RANGE_PRESETS, order_series, parse_range
+from .predictor import get_predictor
+from .model_registry import registry
 
 
 # Simulated cart storage (to be replaced with DB model in production)
@@ -118,39 +138,41 @@ def dashboard(request):
     return render(request, 'accounts/dashboard.html')
 
 # --- FILTERED FOOD LIST FOR HOME ---
-def get_filtered_food_items(request):
+def get_filtered_food_items(params):
+    """FoodItems for normalized listing params (catalog_cache.listing_params), in feed order."""
     food_items = FoodItem.objects.all()
-    query = request.GET.get('q', '')
-    cuisine = request.GET.get('cuisine', '')
-    veg = request.GET.get('veg')
-    nonveg = request.GET.get('nonveg')
-    sort = request.GET.get('sort')
-
-    # Search by name
-    if query:
-        food_items = food_items.filter(name__icontains=query)
-    # Cuisine filter (assume cuisine in description)
-    if cuisine and cuisine != 'All':
-        food_items = food_items.filter(description__icontains=cuisine)
-    # Veg filter (assume 'veg'/'nonveg' in description)
-    if veg and not nonveg:
-        food_items = food_items.filter(description__icontains='veg')
-    elif nonveg and not veg:
-        food_items = food_items.filter(description__icontains='nonveg')
-    # Sorting
-    if sort == 'price_low':
-        food_items = food_items.order_by('price')
-    elif sort == 'price_high':
-        food_items = food_items.order_by('-price')
-    elif sort == 'rating':
-        # For demo, skip actual rating sorting if not present in model
-        pass
-    return food_items
-
-
+    # Full-text search over name + description, ranked by relevance
+    if params['q']:
+        food_items = apply_search(food_items, params['q'])
+    # Cuisine / diet / tag filters are indexed equality lookups
+    if params['cuisine']:
+        food_items = food_items.filter(cuisine=params['cuisine'])
+    if params['diet']:
+        food_items = food_items.filter(diet=params['diet'])
+    if params['tag']:
+        food_items = food_items.filter(tags__name__iexact=params['tag'])
+    # Sorting (keyset-friendly: every ordering ends in a unique column)
+    return order_for_feed(food_items, params['sort'])
+
+
+def render_food_listing(request, cursor=None):
+    """
+    One page of rendered food cards plus the cursor for the next page.
+    Cached per normalized filters + catalog version, so it must not contain per-user markup
+    (the partial is rendered without the request; home.html fills in the CSRF token).
+    """
+    def build(params):
+        food_items, next_cursor = paginate(get_filtered_food_items(params), cursor)
+        html = render_to_string('accounts/partials/food_cards.html', {'food_items': food_items})
+        return {'html': html, 'next_cursor': next_cursor, 'empty': not food_items}
+    return cached_listing(request, cursor, build)
+
+
+@query_budget(7)  # uncached search listing (FTS lookup) + city suggestions falling back to global ones
 def home(request):
-    categories = "All,Indian,Chinese,Italian,Continental,Thai,South Indian,North Indian".split(',')
-    food_items = get_filtered_food_items(request)
+    categories = ['All'] + Cuisine.values
+    # Only the first page is rendered; the rest is fetched from home_feed on scroll
+    listing = render_food_listing(request)
     query = request.GET.get('q', '')
     cuisine = request.GET.get('cuisine', '')
     veg = request.GET.get('veg')
@@ -163,7 +185,7 @@ def home(request):
         suggested_foods = suggest_top_food_for_state(city)
 
     context = {
-        'food_items': food_items,
+        'listing': listing,
         'query': query,
         'categories': categories,
         'cuisine': cuisine,
@@ -175,23 +197,21 @@ def home(request):
 
     return render(request, "accounts/home.html", context)
 
+
+@query_budget(4)
+def home_feed(request):
+    """Next page of home food cards for infinite scroll, addressed by ?cursor= from the previous page."""
+    listing = render_food_listing(request, request.GET.get('cursor'))
+    return JsonResponse({'html': listing['html'], 'next_cursor': listing['next_cursor']})
+
     
 # --- CART LOGIC ---
-@login_required
 def add_to_cart(request, food_id):
     food = get_object_or_404(FoodItem, id=food_id)
-    cart = request.session.get('cart', {})
-    food_id = str(food_id)
-    if food_id in cart:
-        cart[food_id]['quantity'] += 1
+    if request.user.is_authenticated:
+        add_item(request.user, food.id)
     else:
-        cart[food_id] = {
-            'name': food.name,
-            'price': float(food.price),
-            'image': food.image.url if food.image else '',
-            'quantity': 1,
-        }
-    request.session['cart'] = cart
+        add_to_session_cart(request.session, food)
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
     messages.success(request, f"{food.name} added to cart.")
@@ -203,66 +223,49 @@ def add_to_cart_ajax(request, food_id):
     return add_to_cart(request, food_id)
 
 @login_required
+@query_budget(5)
 def cart_view(request):
-    cart = request.session.get('cart', {})
-    cart_items = []
-    total_price = 0
-
-    for food_id_str, item_data in cart.items():
-        try:
-            food_id = int(food_id_str)
-            food = FoodItem.objects.get(pk=food_id)
-        except (FoodItem.DoesNotExist, ValueError):
-            continue
-
-        # Handle both simple quantity or dict with quantity
-        quantity = item_data['quantity'] if isinstance(item_data, dict) else item_data
-
-        subtotal = float(food.price) * quantity  # convert Decimal to float for safety
-
-        cart_items.append({
-            'id': food.id,
-            'name': food.name,
-            'image': food.image.url,
-            'price': float(food.price),
-            'quantity': quantity,
-            'total': subtotal
-        })
-        total_price += subtotal
-
+    cart = price_cart(cart_quantities(request.user))
     return render(request, 'accounts/cart.html', {
-        'cart_items': cart_items,
-        'total_price': total_price
+        'cart_items': cart.lines,
+        'total_price': cart.total,
     })
 
 
 @require_POST
 @login_required
+@query_budget(5)
 def update_quantity(request):
     data = json.loads(request.body)
-    food_id = data.get('item_name')
     action = data.get('action')
-    cart = request.session.get('cart', {})
-    if food_id in cart:
-        if action == 'increase':
-            cart[food_id]['quantity'] += 1
-        elif action == 'decrease' and cart[food_id]['quantity'] > 1:
-            cart[food_id]['quantity'] -= 1
-    request.session['cart'] = cart
-    quantity = cart[food_id]['quantity']
-    subtotal = cart[food_id]['price'] * quantity
-    total_price = sum(item['price'] * item['quantity'] for item in cart.values())
-    return JsonResponse({'success': True, 'quantity': quantity, 'subtotal': subtotal, 'total_price': total_price})
+    try:
+        food_id = int(data.get('item_name'))
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Unknown item'}, status=400)
+    if action == 'increase':
+        change_quantity(request.user, food_id, 1)
+    elif action == 'decrease':
+        change_quantity(request.user, food_id, -1)
+
+    priced = price_cart(cart_quantities(request.user))
+    line = priced.line(food_id)
+    if line is None:
+        return JsonResponse({'success': False, 'error': 'Item is not in your cart'}, status=404)
+    return JsonResponse({
+        'success': True,
+        'quantity': line.quantity,
+        'subtotal': str(line.total),
+        'total_price': str(priced.total),
+    })
 
 
 @require_POST
 @login_required
 def remove_from_cart(request):
-    food_id = request.POST.get('item_name')
-    cart = request.session.get('cart', {})
-    if food_id in cart:
-        del cart[food_id]
-        request.session['cart'] = cart
+    try:
+        remove_item(request.user, int(request.POST.get('item_name')))
+    except (TypeError, ValueError):
+        pass
     return redirect('cart')
 
 
@@ -281,34 +284,6 @@ def contact_view(request):
 
     return render(request, 'accounts/contact.html')
 
-@login_required
-def orders_view(request):
-    orders = Order.objects.filter(user=request.user).order_by('-timestamp')
-    
-    for order in orders:
-        # Add delivery status dynamically
-        time_diff = timezone.now() - order.timestamp
-        order.status = 'Delivering' if time_diff < timedelta(minutes=order.estimated_delivery_minutes) else 'Delivered'
-        order.remaining_time = max(0, (order.estimated_delivery_minutes * 60 - time_diff.total_seconds()) // 60)
-
-    return render(request, 'accounts/orders.html', {'orders': orders})
-
-@login_required
-def order_again_view(request, order_id):
-    from .models import Order
-    original_order = Order.objects.get(id=order_id, user=request.user)
-    
-    # Create a duplicate order
-    Order.objects.create(
-        user=request.user,
-        item_name=original_order.item_name,
-        description=original_order.description,
-        image=original_order.image,
-        price=original_order.price,
-        
-    )
-    return redirect('orders')
-
 @login_required
 def staff_dashboard(request):
     if not request.user.is_authenticated:
@@ -327,6 +302,9 @@ def add_food(request):
         price_input = request.POST.get('price')
         image = request.FILES.get('image')
         description = request.POST.get('description')
+        cuisine = request.POST.get('cuisine', '')
+        diet = request.POST.get('diet', '')
+        tag_names = [t.strip().lower() for t in request.POST.get('tags', '').split(',') if t.strip()]
 
         try:
             price = Decimal(price_input)
@@ -334,20 +312,32 @@ def add_food(request):
             return render(request, 'accounts/add_food.html', {
                 'error': 'Please enter a valid price.',
                 'name': name,
-                'description': description
+                'description': description,
+                'cuisines': Cuisine.choices,
+                'diets': Diet.choices,
             })
 
-        FoodItem.objects.create(
+        # Fall back to guessing from the text when staff leave cuisine/diet unset
+        if cuisine not in Cuisine.values:
+            cuisine = infer_cuisine(f"{name} {description}")
+        if diet not in Diet.values:
+            diet = infer_diet(f"{name} {description}")
+
+        food = FoodItem.objects.create(
             name=name,
             price=price,
             image=image,
             description=description,
+            cuisine=cuisine,
+            diet=diet,
             added_by=request.user
         )
+        if tag_names:
+            food.tags.set([Tag.objects.get_or_create(name=t)[0] for t in tag_names])
 
         return redirect('staff_dashboard')
 
-    return render(request, 'accounts/add_food.html')
+    return render(request, 'accounts/add_food.html', {'cuisines': Cuisine.choices, 'diets': Diet.choices})
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -379,41 +369,23 @@ def delete_food(request, food_id):
 @login_required
 def order_now(request, food_id):
     food = get_object_or_404(FoodItem, id=food_id)
-    profile = getattr(request.user, 'profile', None)
     order_placed = False
     tracking = None
+    order = None
     if request.method == 'POST':
-        Order.objects.create(
-            user=request.user,
-            food_item=food,
-            quantity=1,
-            address="DYNO Default Address",
-            delivery_time=(timezone.now() + timedelta(minutes=30)).time(),
-            payment_method="Cash on Delivery",
-            price=food.price,
-            item_name=food.name,
-            description=food.description,
-            image=food.image if food.image else None,
-            name=profile.name if profile and profile.name else request.user.first_name,
-            gender=profile.gender if profile and profile.gender else '',
-            city=profile.city if profile and profile.city else '',
-            username=request.user.username,  # ✅ Always take from request.user
-        )
+        order = submit_order(request.user, [(food, 1, food.price)])
+    else:
+        advance_user_orders(request.user)
+        user_orders = Order.objects.filter(user=request.user)
+        order = user_orders.filter(lines__food_item=food).order_by('-timestamp').first()
+    if order:
         order_placed = True
         tracking = {
-            'status': 'Delivering',
-            'eta': 30
+            'order_id': order.provisional_id if order.is_provisional else order.id,
+            'status': order.get_status_display(),
+            'active': order.is_active,
+            'eta': order.remaining_minutes,
         }
-    else:
-        order = Order.objects.filter(user=request.user, food_item=food).order_by('-timestamp').first()
-        if order:
-            order_placed = True
-            time_diff = timezone.now() - order.timestamp
-            remaining = max(0, 30 - int(time_diff.total_seconds() // 60))
-            tracking = {
-                'status': 'Delivering' if remaining > 0 else 'Delivered',
-                'eta': remaining
-            }
     return render(request, 'accounts/order_now.html', {'food': food, 'order_placed': order_placed, 'tracking': tracking})
 
 
@@ -421,28 +393,11 @@ def order_now(request, food_id):
 def place_order(request):
     if request.method == 'POST':
         food_id = request.POST.get('food_id')
-        address = request.POST.get('address', 'DYNO Default Address')
+        address = request.POST.get('address', DEFAULT_ADDRESS)
         quantity = int(request.POST.get('quantity', 1))
 
         food = get_object_or_404(FoodItem, id=food_id)
-        profile = getattr(request.user, 'profile', None)
-
-        Order.objects.create(
-            user=request.user,
-            food_item=food,
-            quantity=quantity,
-            address=address,
-            delivery_time=(timezone.now() + timedelta(minutes=30)).time(),
-            payment_method="Cash on Delivery",
-            price=food.price,
-            item_name=food.name,
-            description=food.description,
-            image=food.image if food.image else None,
-            name=profile.name if profile and profile.name else request.user.first_name,
-            gender=profile.gender if profile and profile.gender else '',
-            city=profile.city if profile and profile.city else '',
-            username=request.user.username,  # ✅ Always take from request.user
-        )
+        submit_order(request.user, [(food, quantity, food.price)], address=address)
         return redirect('order_success')
     return redirect('home')
 
@@ -455,97 +410,229 @@ from datetime import datetime, timedelta
 delivery_time = (datetime.now() + timedelta(hours=1)).time()
 
 @login_required
+@query_budget(23)  # a user's first order also inserts their UserOrderCount row; 21 after that
 def order_all(request):
-    cart = request.session.get('cart', {})
-    if not cart:
+    result = checkout_cart(request.user)
+    if result.order is None and not result.rejected:
         return redirect('cart')
-    profile = getattr(request.user, 'profile', None)
-    for food_id_str, item in cart.items():
-        try:
-            food_id = int(food_id_str)
-            food = FoodItem.objects.get(pk=food_id)
-            Order.objects.create(
-                user=request.user,
-                food_item=food,
-                quantity=item['quantity'],
-                address="DYNO Default Address",
-                delivery_time=(timezone.now() + timedelta(minutes=30)).time(),
-                payment_method="Cash on Delivery",
-                price=food.price,
-                item_name=food.name,
-                description=food.description,
-                image=food.image if food.image else None,
-                name=profile.name if profile and profile.name else request.user.first_name,
-                gender=profile.gender if profile and profile.gender else '',
-                city=profile.city if profile and profile.city else '',
-                username=request.user.username,  # ✅ Always take from request.user
-            )
-        except (FoodItem.DoesNotExist, ValueError, AttributeError):
-            continue
-
-    request.session['cart'] = {}
-    request.session.modified = True
+    for food_id, reason in result.rejected:
+        messages.warning(request, f"Item {food_id} was not ordered: {reason}.")
+    if result.order and result.order.is_provisional:
+        messages.success(request, f"Order {result.order.provisional_id} received, totalling ₹{result.order.total_price}.")
+    elif result.order:
+        messages.success(request, f"Order #{result.order.id} placed, totalling ₹{result.order.total_price}.")
 
     return redirect('orders')
 
 
+ORDER_HISTORY_PAGE_SIZE = 10
+
+
 @login_required
+@query_budget(10)
 def orders_view(request):
-    orders = Order.objects.filter(user=request.user).order_by('-timestamp')
-    delivery_duration = timedelta(minutes=30)
-    for order in orders:
-        time_diff = timezone.now() - order.timestamp
-        if time_diff < delivery_duration:
-            order.status = "Delivering"
-            order.remaining_time = int((delivery_duration - time_diff).total_seconds() // 60)
-        else:
-            order.status = "Delivered"
-            order.remaining_time = 0
-    return render(request, 'accounts/orders.html', {'orders': orders})
+    """
+    Queued and active orders (first page only) plus delivered history, keyset-paginated by ?cursor=.
+    Cards are read from the OrderHistoryEntry read model: one indexed query per section, no joins.
+    """
+    advance_user_orders(request.user)
+    entries = OrderHistoryEntry.objects.filter(user=request.user)
+    cursor = request.GET.get('cursor')
+    queued_orders, active_orders = [], []
+    if not cursor:
+        queued_orders = pending_for_user(request.user)
+        active_orders = list(entries.filter(status__in=ACTIVE_ORDER_STATUSES).order_by('-placed_at', '-order_id'))
+    history, next_cursor = paginate(
+        entries.filter(status=OrderStatus.DELIVERED).order_by('-placed_at', '-order_id'),
+        cursor, ORDER_HISTORY_PAGE_SIZE,
+    )
+    return render(request, 'accounts/orders.html', {
+        'queued_orders': queued_orders,
+        'active_orders': active_orders,
+        'orders': history,
+        'next_cursor': next_cursor,
+    })
+
+async def order_events(request):
+    """
+    Server-Sent Events feed of the user's active orders (status + ETA) for orders.html and
+    order_now.html. Under ASGI it is one long-lived stream pushed on change; under WSGI it
+    answers once and EventSource's retry delay turns it into a cheap poll.
+    """
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return HttpResponse(status=204)  # tells EventSource to stop reconnecting
+    snapshot = await sync_to_async(active_orders_snapshot)(user)
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(order_event_stream(user, snapshot), content_type='text/event-stream')
+    else:
+        response = HttpResponse(sse_message(snapshot, retry=RETRY_MS), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
 
 @login_required
 def order_again_view(request, order_id):
     original_order = get_object_or_404(Order, id=order_id, user=request.user)
-    Order.objects.create(
+    # Re-order every line of the checkout at today's prices
+    lines = original_order.lines.select_related('food_item')
+    submit_order(request.user, [(line.food_item, line.quantity, line.food_item.price) for line in lines],
+                 address=original_order.address, payment_method=original_order.payment_method)
+    return redirect('orders')
+
+def food_detail(request, food_id):
+    food = get_object_or_404(FoodItem, id=food_id)
+    reviews = food.reviews.select_related('user').order_by('-created_at')[:RECENT_REVIEWS]
+    return render(request, 'accounts/food_detail.html', {'food': food, 'reviews': reviews})
+
+
+RECENT_REVIEWS = 5
+
+
+@require_POST
+@login_required
+def submit_review(request, food_id):
+    """Create or replace the user's review; FoodItem rating columns follow via accounts.ratings."""
+    food = get_object_or_404(FoodItem, id=food_id)
+    try:
+        rating = int(request.POST.get('rating', ''))
+    except ValueError:
+        rating = 0
+    if not 1 <= rating <= 5:
+        return JsonResponse({'success': False, 'error': 'Rating must be between 1 and 5.'}, status=400)
+
+    Review.objects.update_or_create(
+        food_item=food,
         user=request.user,
-        food_item=original_order.food_item,
-        quantity=original_order.quantity,
-        address=original_order.address,
-        delivery_time=(timezone.now() + timedelta(minutes=30)).time(),
-        payment_method=original_order.payment_method,
-        price=original_order.food_item.price
+        defaults={'rating': rating, 'comment': request.POST.get('comment', '').strip(), 'created_at': timezone.now()},
     )
-    return redirect('orders')
+    food.refresh_from_db(fields=['rating_avg', 'rating_count'])
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'success': True, 'rating_avg': str(food.rating_avg), 'rating_count': food.rating_count})
+    messages.success(request, "Thanks for your review!")
+    return redirect('home')
 
-def order_list_view(request):
-    orders = Order.objects.filter(user=request.user).order_by('-timestamp')
-    delivery_duration = timedelta(minutes=30)  # you can set as needed
 
-    for order in orders:
-        time_diff = timezone.now() - order.timestamp
-        if time_diff < delivery_duration:
-            order.status = "Delivering..."
-            order.remaining_time = int((delivery_duration - time_diff).total_seconds() // 60)
-        else:
-            order.status = "Delivered"
-            order.remaining_time = 0
+def _food_last_modified(request, food_id):
+    # condition() asks for both validators; look updated_at up once per request
+    if not hasattr(request, '_food_updated_at'):
+        request._food_updated_at = FoodItem.objects.filter(id=food_id).values_list('updated_at', flat=True).first()
+    return request._food_updated_at
 
-    return render(request, 'accounts/orders.html', {'orders': orders})
 
-def food_detail(request, food_id):
+def _food_etag(request, food_id):
+    updated_at = _food_last_modified(request, food_id)
+    if updated_at is None:
+        return None
+    return f"food-{food_id}-{int(updated_at.timestamp() * 1_000_000)}"
+
+
+def serve_media(request, path):
+    """
+    Development media server. Content-addressed files (and their derivatives) can never
+    change under the same name, so they are marked immutable for a year.
+    """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if response.status_code == 200 and is_content_addressed(path):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@condition(etag_func=_food_etag, last_modified_func=_food_last_modified)
+@query_budget(5)
+def food_detail_json(request, food_id):
+    """Compact food detail for the home modal; answers 304 when the client's copy is current."""
     food = get_object_or_404(FoodItem, id=food_id)
-    return render(request, 'accounts/food_detail.html', {'food': food})
+    response = JsonResponse({
+        'id': food.id,
+        'name': food.name,
+        'description': food.description,
+        'price': str(food.price),
+        'image': food.image.url if food.image else '',
+        'image_srcset': ', '.join(f"{url} {width}w" for url, width in existing_derivatives(food.image, 'jpg')),
+        'image_webp_srcset': ', '.join(f"{url} {width}w" for url, width in existing_derivatives(food.image, 'webp')),
+        'cuisine': food.cuisine,
+        'diet': food.get_diet_display() if food.diet else '',
+        'tags': [tag.name for tag in food.tags.all()],
+        'rating_avg': str(food.rating_avg),
+        'rating_count': food.rating_count,
+        'reviews': [
+            {'user': review.user.username, 'rating': review.rating, 'comment': review.comment,
+             'created_at': review.created_at.isoformat()}
+            for review in food.reviews.select_related('user').order_by('-created_at')[:RECENT_REVIEWS]
+        ],
+        'order_url': reverse('order_now', args=[food.id]),
+        'cart_url': reverse('add_to_cart', args=[food.id]),
+        'review_url': reverse('submit_review', args=[food.id]),
+    })
+    # Let the browser keep a copy but revalidate it (cheap 304) before reuse
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Most rows price_estimate answers in one request
+MAX_PRICE_ESTIMATE_ITEMS = 100
+
+
+@login_required
+@query_budget(3)
+def price_estimate(request):
+    """
+    JSON price predictions from the trained order model, for the order pages. One item via
+    GET (?item=<food name>&quantity=2&city=...) or several via POST ({"items": [{"item", "quantity",
+    "city"}, ...]}); city defaults to the user's. Answers 503 until a model has been trained.
+    """
+    if request.method == 'POST':
+        try:
+            items = json.loads(request.body or b'{}').get('items')
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'Body must be JSON like {"items": [...]}'}, status=400)
+        if not isinstance(items, list) or not items or len(items) > MAX_PRICE_ESTIMATE_ITEMS:
+            return JsonResponse({'error': f"'items' must be a list of 1 to {MAX_PRICE_ESTIMATE_ITEMS} items"},
+                                status=400)
+    else:
+        items = [request.GET]
+
+    predictor = get_predictor()
+    if predictor is None:
+        return JsonResponse({'error': 'No price model has been trained yet'}, status=503)
+
+    profile = getattr(request.user, 'profile', None)
+    default_city = profile.city if profile and profile.city else ''
+    rows = []
+    for item in items:
+        # Names and cities become vocabulary (dict) lookups: only strings may get that far
+        try:
+            name, city = item.get('item'), item.get('city') or default_city
+            if not name or not isinstance(name, str) or not isinstance(city, str):
+                raise ValueError
+            quantity = int(item.get('quantity', 1))
+            if quantity < 1:
+                raise ValueError
+        except (AttributeError, TypeError, ValueError):
+            return JsonResponse({'error': "Each item needs an 'item' name, optionally a 'city', "
+                                          "and a whole quantity of at least 1"}, status=400)
+        rows.append((request.user.username, city, name, quantity))
+
+    predictions = [
+        {'item': name, 'quantity': quantity, 'city': city, 'price': round(price, 2), 'unknown': unknown}
+        for (_, city, name, quantity), (price, unknown) in zip(rows, predictor.predict_rows(rows))
+    ]
+    return JsonResponse({'model_version': predictor.version, 'predictions': predictions})
+
+
+@login_required
+def query_stats_view(request):
+    """Staff-only JSON report of per-view query counts, DB time and slowest statements."""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    return JsonResponse({'views': query_report()})
 
-from .ai_utils import overall_stats, get_ai_predictions  # ✅ import prediction function
 
 @login_required
 def staff_stats(request):
-    # Use AI/ML-powered statistics
+    # Use AI/ML-powered statistics (includes the AI predictions for the last 10 ordered items)
     stats = overall_stats()
 
-    # Get AI predictions (overall last 10)
-    ai_predictions = get_ai_predictions()
-
     # Check if staff entered a state
     state_query = request.GET.get("state")  # from ?state=Delhi
     suggestion = None
@@ -554,6 +641,13 @@ def staff_stats(request):
     if state_query:
         suggestion = suggest_top_food_for_state(state_query)
 
+    # Orders over a chosen range, from the hourly/daily rollup buckets
+    try:
+        series = order_series(*parse_range(request.GET))
+        series_error = None
+    except ValueError as exc:
+        series, series_error = order_series(*parse_range({})), str(exc)
+
     context = {
         "orders_by_state_labels": stats["orders_by_state_labels"],
         "orders_by_state_counts": stats["orders_by_state_counts"],
@@ -562,13 +656,32 @@ def staff_stats(request):
         "total_orders": stats["total_orders"],
         "total_users": stats["total_users"],
         "city_food": stats["city_food"],          # city-wise top food analytics
-        "ai_predictions": ai_predictions,          # overall AI predictions
+        "predictions": stats["predictions"],      # overall AI predictions
+        "model_info": registry.info(),             # active model version and load time
         "state_query": state_query,                # keep entered state in the form
         "suggestion": suggestion,                  # AI top food suggestion for state
         "state_predictions": state_predictions,    # state-specific predictions
+        "series": series,                          # orders per bucket over the chosen range
+        "series_error": series_error,
+        "range_presets": RANGE_PRESETS,
+        "granularities": BucketGranularity.choices,
     }
     return render(request, "accounts/staff_stats.html", context)
 
+
+@login_required
+def staff_stats_series(request):
+    """
+    Staff-only JSON of order volume per bucket, in total, per city and for the top foods.
+    Same parameters as /staff/details/: range=24h|7d|30d|90d or from/to dates, granularity=hour|day.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    try:
+        return JsonResponse(order_series(*parse_range(request.GET)))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
 @login_required
 def chatbot_view(request):
     if request.method == "POST":
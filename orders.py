@@ -1,6 +1,7 @@
 import os
 import django
 import random
+from datetime import timedelta
 from django.utils import timezone
 
 # Setup Django
@@ -8,7 +9,8 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Dyno.settings")  # Replace 'Dyn
 django.setup()
 
 from django.contrib.auth.models import User
-from accounts.models import FoodItem, Order, Profile  # Make sure Profile is imported
+from accounts.history import record_orders
+from accounts.models import FoodItem, Order, OrderLine, Profile  # Make sure Profile is imported
 
 users = User.objects.all()
 foods = list(FoodItem.objects.all())
@@ -23,7 +25,6 @@ else:
 
         try:
             profile = user.profile  # 🔄 Fetch user’s profile
-            gender = profile.gender
             city = profile.city
             
         except Profile.DoesNotExist:
@@ -31,27 +32,25 @@ else:
             continue
 
         for _ in range(random.randint(4, 5)):
-            food = random.choice(foods)
-            quantity = random.randint(1, 3)
-            price = food.price * quantity
-
-            Order.objects.create(
+            minutes = random.randint(20, 60)
+            order = Order.objects.create(
                 user=user,
-                food_item=food,
-                item_name=food.name,
-                price=price,
-                quantity=quantity,
-                description=getattr(food, "description", "No description"),
-                image=getattr(food, "image", None),
+                address="DYNO Default Address",
                 timestamp=timezone.now(),
-                placed_at=timezone.now(),
-                estimated_delivery_minutes=random.randint(20, 60),
+                estimated_delivery_minutes=minutes,
+                delivery_due_at=timezone.now() + timedelta(minutes=minutes),
                 payment_method=random.choice(["COD", "Online"]),
-                gender=gender,
                 city=city,
-                name=profile.name,  # ✅ Always save name
-                username=user.username,  # ✅ Always save username
             )
+            total = 0
+            lines = []
+            for food in random.sample(foods, random.randint(1, min(3, len(foods)))):
+                quantity = random.randint(1, 3)
+                lines.append(OrderLine.objects.create(order=order, food_item=food, quantity=quantity, unit_price=food.price))
+                total += food.price * quantity
+            order.total_price = total
+            order.save(update_fields=["total_price"])
+            record_orders([(order, lines)])  # orders page reads the history read model
     print("✅ Successfully created orders.")
 
 